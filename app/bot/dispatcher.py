@@ -1,9 +1,31 @@
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.storage.memory import MemoryStorage
-from typing import Tuple
+from typing import Optional, Tuple
 
-def create_bot_and_dispatcher(token: str) -> Tuple[Bot, Dispatcher]:
+from app.bot.middlewares import DUPLICATE_PRESS_WINDOW, TelegramTracingMiddleware, setup_middlewares
+from app.bot.outbox import Outbox
+
+
+def create_fsm_storage(redis_url: str = "") -> BaseStorage:
+    """FSM state lives in Redis when several processes share the bot, else in memory."""
+    if redis_url:
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(redis_url)
+    return MemoryStorage()
+
+
+def create_bot_and_dispatcher(
+    token: str,
+    storage: Optional[BaseStorage] = None,
+    press_window: float = DUPLICATE_PRESS_WINDOW,
+) -> Tuple[Bot, Dispatcher]:
     bot = Bot(token=token)
-    dp = Dispatcher(storage=MemoryStorage())
+    bot.session.middleware(TelegramTracingMiddleware())
+    dp = Dispatcher(storage=storage or MemoryStorage())
     dp["bot"] = bot
+    # Handlers can take an `outbox` argument; it is started by the entry point.
+    dp["outbox"] = Outbox(bot)
+    setup_middlewares(dp, press_window)
     return bot, dp
@@ -1,22 +1,51 @@
+import asyncio
 import html
 import re
+import shlex
+import time
 from datetime import datetime
+from typing import Optional
 
 from aiogram import types, F, Dispatcher
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 
-from app.bot.keyboards import main_kb
+from app.bot.importer import MAX_IMPORT_BYTES, MAX_IMPORT_LINES, ImportRunner, dedupe, download_document, parse_import
+from app.bot.keyboards import TracksPage, main_kb, tracks_page_kb
+from app.bot.outbox import INTERACTIVE, Outbox
 from app.bot.states import States
-from app.spotify.client import SpotifyUserClient
+from app.spotify.client import SpotifyAPIError, SpotifyUserClient
+from app.spotify.library import LibraryTrack, get_library, peek_library
 from app.spotify.oauth import get_auth_url
 from app.spotify.oauth import ensure_token
+from app.spotify.pages import Page, get_page_cache
+from app.spotify.playlists import SyncFilter, parse_playlist_id, sync_user_playlist
+from app.stats import get_stats_engine
+from app.utils.text import MESSAGE_LIMIT, clip, clip_html, split_message
 from app.storage.memory import (
     USER_SPOTIFY,
     LAST_SHOWN,
     STATS,
-    ARTIST_COUNTER,
+    PLAYLIST_SYNC,
+    ensure_user,
 )
+from app.storage.session import ShownTrack
+
+ADD_SEARCH_CONCURRENCY = 5
+# Longer pasted lists are handed to the background importer.
+BULK_ADD_THRESHOLD = 25
+SYNC_PLAYLIST_NAME = "Мои треки (Telegram)"
+SYNC_USAGE = (
+    "🔁 <b>Синхронизация плейлиста</b>\n\n"
+    "Бот держит выбранный плейлист в точности как твою библиотеку (или её часть).\n\n"
+    "<code>/sync new</code> — создать новый плейлист\n"
+    "<code>/sync ссылка_на_плейлист</code> — использовать свой\n"
+    "<code>/sync off</code> — отключить\n\n"
+    "Фильтры: <code>artist=\"Daft Punk\" since=2023-01-01 until=2023-12-31</code>"
+)
+# Long enough for any real title, short enough that a page always fits one message.
+TRACK_LINE_WIDTH = 200
 
 
 def parse_numbers(text: str, max_n: int):
@@ -30,7 +59,9 @@ def human_time(dt: datetime | None):
     return dt.strftime("%d.%m.%Y %H:%M:%S")
 
 
-def stats_for(tg: str):
+async def stats_for(tg: str):
+    """The user's counters; change them and `STATS.touch` without awaiting in between."""
+    await STATS.ensure(tg)
     return STATS.setdefault(
         tg,
         {
@@ -44,38 +75,47 @@ def stats_for(tg: str):
 
 async def get_spotify_client(tg: str) -> SpotifyUserClient:
     access_token = await ensure_token(tg)
-    return SpotifyUserClient(access_token)
+    return SpotifyUserClient(access_token, user_id=tg)
+
+
+async def get_bulk_client(tg: str) -> SpotifyUserClient:
+    access_token = await ensure_token(tg)
+    return SpotifyUserClient(access_token, user_id=tg, bulk=True)
 
 
 async def collect_tracks(tg: str, limit: int = 15):
     sp = await get_spotify_client(tg)
-    meta = sp.get_saved_tracks(limit=1)
-    total = meta.get("total", 0) if meta else 0
-
-    tracks = []
-    if total:
-        offset = max(total - limit, 0)
-        data = sp.get_saved_tracks(limit=limit, offset=offset)
-        for item in data.get("items", []):
-            tr = item["track"]
-            tracks.append(
-                {
-                    "id": tr["id"],
-                    "title": tr["name"],
-                    "artist": ", ".join(a["name"] for a in tr["artists"]),
-                }
-            )
+    library = get_library(tg)
+    await library.sync(sp)
+
+    tracks = library.latest(limit)
+    LAST_SHOWN[tg] = [ShownTrack(t.id, t.title, t.artist) for t in tracks]
+    return tracks, len(library)
 
-    LAST_SHOWN[tg] = tracks
-    return tracks, total
 
+async def reply(m: types.Message, outbox: Optional[Outbox], text: str, **kwargs):
+    """
+    Answer `m` through the outbox at interactive priority, so replies share its
+    global rate limit and flood-wait handling with everything else the bot sends.
+    Without an outbox (tests, scripts) the message is answered directly.
+    """
+    if outbox is None:
+        return await m.answer(text, **kwargs)
+    return await outbox.send_text(m.chat.id, text, **kwargs)
 
-async def start_handler(m: types.Message, state: FSMContext):
+
+async def reply_photo(m: types.Message, outbox: Optional[Outbox], photo, **kwargs):
+    if outbox is None:
+        return await m.answer_photo(photo, **kwargs)
+    return await outbox.send_photo(m.chat.id, photo, **kwargs)
+
+
+async def start_handler(m: types.Message, state: FSMContext, outbox: Optional[Outbox] = None):
     await state.clear()
     tg = str(m.from_user.id)
     connected = "✅ подключён" if tg in USER_SPOTIFY else "❌ не подключён"
 
-    await m.answer(
+    await reply(m, outbox, 
         f"👋 <b>Привет, {html.escape(m.from_user.first_name)}!</b>\n\n"
         f"🎧 Spotify: {connected}\n\n"
         "Я помогу управлять твоей библиотекой Spotify прямо из Telegram.",
@@ -84,9 +124,9 @@ async def start_handler(m: types.Message, state: FSMContext):
     )
 
 
-async def connect_spotify(m: types.Message):
+async def connect_spotify(m: types.Message, outbox: Optional[Outbox] = None):
     url = get_auth_url(str(m.from_user.id))
-    await m.answer(
+    await reply(m, outbox, 
         f"🔐 <b>Авторизация Spotify</b>\n\n"
         f"<a href='{url}'>👉 Подключить Spotify</a>",
         parse_mode="HTML",
@@ -95,107 +135,290 @@ async def connect_spotify(m: types.Message):
 
 
 
-async def add_start(m: types.Message, state: FSMContext):
+async def add_start(m: types.Message, state: FSMContext, outbox: Optional[Outbox] = None):
     if str(m.from_user.id) not in USER_SPOTIFY:
-        await m.answer("❌ Сначала подключи Spotify")
+        await reply(m, outbox, "❌ Сначала подключи Spotify")
         return
 
     await state.set_state(States.waiting_add)
-    await m.answer("🎵 Введи название трека\nПример: Track Name / Artist - Track Name")
+    await reply(m, outbox, 
+        "🎵 Введи название трека\nПример: Track Name / Artist - Track Name\n\n"
+        "Можно сразу несколько — по одному на строку"
+    )
 
 
-async def add_track(m: types.Message, state: FSMContext):
-    tg = str(m.from_user.id)
-    sp = await get_spotify_client(tg)
-
-    track = sp.search_track_full(m.text)
-    if not track:
-        await m.answer("⚠️ Трек не найден")
-        await state.clear()
+async def record_added(tg: str, tracks: list[dict]):
+    if not tracks:
         return
 
-    if sp.is_track_saved(track["id"]):
-        await m.answer("ℹ️ Этот трек уже есть в библиотеке")
+    await ensure_user(tg)
+    s = await stats_for(tg)
+    now = datetime.now()
+    s["added"] += len(tracks)
+    s["last_add"] = now
+    s["first_add"] = s["first_add"] or now
+    STATS.touch(tg)
+
+
+def local_track(track: LibraryTrack) -> dict:
+    """Minimal search-result shape for a track found in the local library."""
+    names = track.artist_names or (track.artist,)
+    return {"id": track.id, "name": track.title, "artists": [{"name": n} for n in names]}
+
+
+def track_artist(track: dict) -> str:
+    return ", ".join(a["name"] for a in track["artists"])
+
+
+async def search_many(sp: SpotifyUserClient, queries: list[str]):
+    sem = asyncio.Semaphore(ADD_SEARCH_CONCURRENCY)
+
+    async def one(query: str):
+        async with sem:
+            try:
+                return await sp.search_track_full(query)
+            except SpotifyAPIError:
+                return None
+
+    return await asyncio.gather(*(one(q) for q in queries))
+
+
+async def add_track(
+    m: types.Message, state: FSMContext, importer: Optional[ImportRunner] = None, outbox: Optional[Outbox] = None
+):
+    tg = str(m.from_user.id)
+    queries = [q.strip() for q in (m.text or "").splitlines() if q.strip()]
+    if not queries:
+        await reply(m, outbox, "⚠️ Трек не найден")
         await state.clear()
         return
+    if importer is not None and len(queries) > BULK_ADD_THRESHOLD:
+        await run_import(m, state, importer, m.text, outbox=outbox)
+        return
 
-    sp.save_tracks([track["id"]])
+    # A loaded library answers "already saved" locally, without search or contains calls.
+    # Only for an exact artist and title: a near match ("Night" for "Nights") may be
+    # another song, so it goes through search and contains like any other query.
+    known = {}
+    library = peek_library(tg)
+    if library is not None and not library.stale:
+        for query in queries:
+            hit = library.find_exact(query)
+            if hit is not None:
+                known[query] = hit
+
+    remote = [q for q in queries if q not in known]
+    sp = await get_spotify_client(tg) if remote else None
+    searched = dict(zip(remote, await search_many(sp, remote))) if remote else {}
+    found = [local_track(known[q]) if q in known else searched[q] for q in queries]
+
+    candidates = {}
+    for track in searched.values():
+        if track and track["id"] not in candidates:
+            candidates[track["id"]] = track
+
+    saved = await sp.contains_tracks(list(candidates)) if candidates else []
+    already = {tid for tid, flag in zip(candidates, saved) if flag}
+    already.update(hit.id for hit in known.values())
+    to_save = [t for tid, t in candidates.items() if tid not in already]
+
+    if to_save:
+        await sp.save_tracks([t["id"] for t in to_save], tracks=to_save)
+        await record_added(tg, to_save)
 
-    s = stats_for(tg)
-    now = datetime.now()
-    s["added"] += 1
-    s["last_add"] = now
-    s["first_add"] = s["first_add"] or now
+    await state.clear()
 
-    artist = ", ".join(a["name"] for a in track["artists"])
-    ARTIST_COUNTER.setdefault(tg, {})
-    ARTIST_COUNTER[tg][artist] = ARTIST_COUNTER[tg].get(artist, 0) + 1
-
-    await m.answer_photo(
-        track["album"]["images"][0]["url"],
-        caption=(
-            "✅ <b>Трек добавлен</b>\n\n"
-            f"🎤 {html.escape(artist)}\n"
-            f"🎵 <b>{html.escape(track['name'])}</b>"
-        ),
+    if len(queries) == 1:
+        track = found[0]
+        if not track:
+            await reply(m, outbox, "⚠️ Трек не найден")
+        elif track["id"] in already:
+            await reply(m, outbox, "ℹ️ Этот трек уже есть в библиотеке")
+        else:
+            await reply_photo(m, outbox, 
+                track["album"]["images"][0]["url"],
+                caption=(
+                    "✅ <b>Трек добавлен</b>\n\n"
+                    f"🎤 {html.escape(track_artist(track))}\n"
+                    f"🎵 <b>{html.escape(track['name'])}</b>"
+                ),
+                parse_mode="HTML",
+            )
+        return
+
+    lines = []
+    reported = set()
+    for query, track in zip(queries, found):
+        if not track:
+            lines.append(f"⚠️ {html.escape(query)} — не найден")
+            continue
+        name = html.escape(f"{track_artist(track)} — {track['name']}")
+        if track["id"] in already:
+            lines.append(f"ℹ️ {name} — уже в библиотеке")
+        elif track["id"] in reported:
+            lines.append(f"ℹ️ {name} — повтор")
+        else:
+            lines.append(f"✅ {name}")
+        reported.add(track["id"])
+
+    await reply(m, outbox, 
+        f"<b>Добавлено треков: {len(to_save)} из {len(queries)}</b>\n\n" + "\n".join(lines),
         parse_mode="HTML",
     )
 
+
+async def import_start(
+    m: types.Message, state: FSMContext, importer: Optional[ImportRunner] = None, outbox: Optional[Outbox] = None
+):
+    tg = str(m.from_user.id)
+    if tg not in USER_SPOTIFY:
+        await reply(m, outbox, "❌ Сначала подключи Spotify")
+        return
+    if importer is not None and importer.resume(tg):
+        await reply(m, outbox, "▶️ Продолжаю прерванный импорт")
+        return
+
+    await state.set_state(States.waiting_import)
+    await reply(m, outbox, 
+        "📥 Пришли список треков — по одному на строку — или файл .txt / .csv\n"
+        "(подойдёт, например, экспорт плейлиста с колонками Artist и Track Name)"
+    )
+
+
+async def run_import(
+    m: types.Message,
+    state: FSMContext,
+    importer: ImportRunner,
+    text: str,
+    filename: str = "",
+    outbox: Optional[Outbox] = None,
+):
+    tg = str(m.from_user.id)
     await state.clear()
+    if importer.running(tg):
+        await reply(m, outbox, "⏳ Предыдущий импорт ещё идёт")
+        return
+
+    queries = dedupe(parse_import(text, filename))
+    if not queries:
+        await reply(m, outbox, "⚠️ В списке нет треков")
+        return
+    if len(queries) > MAX_IMPORT_LINES:
+        await reply(m, outbox, f"⚠️ Импортирую первые {MAX_IMPORT_LINES} треков из {len(queries)}")
+        queries = queries[:MAX_IMPORT_LINES]
+    await importer.start(tg, m.chat.id, queries)
 
 
-async def my_tracks(m: types.Message):
+async def import_receive(
+    m: types.Message, state: FSMContext, bot, importer: Optional[ImportRunner] = None, outbox: Optional[Outbox] = None
+):
+    if importer is None:
+        await add_track(m, state, outbox=outbox)
+        return
+    if m.document is not None:
+        if (m.document.file_size or 0) > MAX_IMPORT_BYTES:
+            await reply(m, outbox, "⚠️ Файл слишком большой")
+            await state.clear()
+            return
+        text = await download_document(bot, m.document)
+        await run_import(m, state, importer, text, m.document.file_name or "", outbox)
+    else:
+        await run_import(m, state, importer, m.text or "", outbox=outbox)
+
+
+def track_lines(tracks: list[dict], start: int = 1, escape: bool = True, width: int = TRACK_LINE_WIDTH) -> list[str]:
+    lines = []
+    for i, t in enumerate(tracks, start):
+        line = f"{i}. {t['artist']} — {t['title']}"
+        lines.append(clip_html(line, width) if escape else clip(line, width))
+    return lines
+
+
+def render_page(page: Page) -> str:
+    header = f"🎧 <b>Мои треки</b> ({page.total})\n\n"
+    # Pages are edited in place as one message, so every line gets an equal share
+    # of the limit (after escaping) and no track on the page is ever cut off.
+    share = (MESSAGE_LIMIT - len(header)) // max(len(page.tracks), 1) - 1
+    lines = track_lines(page.tracks, page.offset + 1, width=min(TRACK_LINE_WIDTH, share))
+    return header + "".join(f"{line}\n" for line in lines)
+
+
+async def my_tracks(m: types.Message, outbox: Optional[Outbox] = None):
     tg = str(m.from_user.id)
-    tracks, _ = await collect_tracks(tg)
+    sp = await get_spotify_client(tg)
+    page = await get_page_cache().get(tg, sp, 0)
 
-    if not tracks:
-        await m.answer("📭 У тебя нет сохранённых треков")
+    if not page.tracks:
+        await reply(m, outbox, "📭 У тебя нет сохранённых треков")
         return
 
-    text = "🎧 <b>Последние треки:</b>\n\n"
-    for i, t in enumerate(tracks, 1):
-        text += f"{i}. {t['artist']} — {t['title']}\n"
+    await reply(m, outbox, render_page(page), parse_mode="HTML", reply_markup=tracks_page_kb(page.number, page.pages))
+
+
+async def my_tracks_page(cb: types.CallbackQuery, callback_data: TracksPage, outbox: Optional[Outbox] = None):
+    tg = str(cb.from_user.id)
+    sp = await get_spotify_client(tg)
+    page = await get_page_cache().get(tg, sp, callback_data.page)
+
+    if not page.tracks:
+        await cb.answer("📭 У тебя нет сохранённых треков")
+        return
 
-    await m.answer(text, parse_mode="HTML")
+    text, markup = render_page(page), tracks_page_kb(page.number, page.pages)
+    try:
+        if outbox is None:
+            await cb.message.edit_text(text, parse_mode="HTML", reply_markup=markup)
+        else:
+            await outbox.edit_text(
+                cb.message.chat.id, cb.message.message_id, text, INTERACTIVE, parse_mode="HTML", reply_markup=markup
+            )
+    except TelegramBadRequest as e:
+        # Tapping the current page (or a fast double tap) re-renders identical content.
+        if "message is not modified" not in str(e):
+            raise
+    await cb.answer()
 
 
-async def delete_menu(m: types.Message, state: FSMContext):
+async def delete_menu(m: types.Message, state: FSMContext, outbox: Optional[Outbox] = None):
     tg = str(m.from_user.id)
     tracks, _ = await collect_tracks(tg)
 
     if not tracks:
-        await m.answer("📭 Удалять нечего")
+        await reply(m, outbox, "📭 Удалять нечего")
         return
 
-    text = "Введи номера треков для удаления:\n\n"
-    for i, t in enumerate(tracks, 1):
-        text += f"{i}. {t['artist']} — {t['title']}\n"
-
     await state.set_state(States.waiting_delete)
-    await m.answer(text)
+    lines = track_lines([t.as_dict() for t in tracks], escape=False)
+    chunks = split_message(lines, "Введи номера треков для удаления:\n\n")
+    if outbox is None:
+        for chunk in chunks:
+            await m.answer(chunk)
+        return
+    # A long library is many messages: the outbox paces them within the chat's limit
+    # instead of this handler running into 429s.
+    for chunk in chunks:
+        outbox.send_text(m.chat.id, chunk)
 
 
-async def delete_tracks(m: types.Message, state: FSMContext):
+async def delete_tracks(m: types.Message, state: FSMContext, outbox: Optional[Outbox] = None):
     tg = str(m.from_user.id)
     shown = LAST_SHOWN.get(tg, [])
     nums = parse_numbers(m.text, len(shown))
 
     if not nums:
-        await m.answer("❌ Неверный формат")
+        await reply(m, outbox, "❌ Неверный формат")
         return
 
+    picked = [shown[i - 1] for i in nums]
     sp = await get_spotify_client(tg)
-    deleted = []
-
-    for i in sorted(nums, reverse=True):
-        tr = shown[i - 1]
-        sp.remove_saved_tracks([tr["id"]])
-        stats_for(tg)["deleted"] += 1
-        deleted.append(f"{tr['artist']} — {tr['title']}")
+    await sp.remove_saved_tracks([tr.id for tr in picked])
+    LAST_SHOWN.pop(tg, None)
+    (await stats_for(tg))["deleted"] += len(picked)
+    STATS.touch(tg)
 
-    deleted.reverse()
+    deleted = [f"{tr.artist} — {tr.title}" for tr in picked]
 
-    await m.answer(
+    await reply(m, outbox, 
         "<b>Удалены треки:</b>\n\n" + "\n".join(deleted),
         parse_mode="HTML",
     )
@@ -203,24 +426,38 @@ async def delete_tracks(m: types.Message, state: FSMContext):
     await state.clear()
 
 
-async def statistics(m: types.Message):
+async def statistics(m: types.Message, outbox: Optional[Outbox] = None):
     tg = str(m.from_user.id)
-    s = stats_for(tg)
-    _, total_tracks = await collect_tracks(tg)
+    s = await stats_for(tg)
+    sp = await get_spotify_client(tg)
+    library = get_library(tg)
+    await library.sync(sp)
+    lib = get_stats_engine().stats(tg, library)
+
+    fav_artist = lib.top_artists[0][0] if lib.top_artists else "—"
+    top = "\n".join(
+        f"{i}. {html.escape(name)} — {count}" for i, (name, count) in enumerate(lib.top_artists[:3], 1)
+    ) or "—"
 
-    fav_artist = "—"
-    if ARTIST_COUNTER.get(tg):
-        fav_artist = max(ARTIST_COUNTER[tg], key=ARTIST_COUNTER[tg].get)
+    month_ago = time.time() - 30 * 86400
+    last_30 = sum(n for day, n in lib.per_day.items() if day >= month_ago)
+    hours = round(lib.duration_ms / 3_600_000, 1)
 
     days = max((datetime.now() - s["first_add"]).days, 1) if s["first_add"] else 1
     avg = round(s["added"] / days, 2)
 
-    await m.answer(
+    first_lib = datetime.fromtimestamp(lib.first_added) if lib.first_added else None
+
+    await reply(m, outbox, 
         "📊 <b>Твоя статистика</b>\n\n"
         f"➕ Добавлено через бота: {s['added']}\n"
-        f"🎶 Всего треков в Spotify: {total_tracks}\n"
+        f"🎶 Всего треков в Spotify: {lib.total}\n"
         f"🗑 Удалено: {s['deleted']}\n\n"
-        f"🎤 Любимый исполнитель: {fav_artist}\n\n"
+        f"🎤 Любимый исполнитель: {html.escape(fav_artist)}\n"
+        f"🏆 Топ исполнителей:\n{top}\n\n"
+        f"⏱ Длительность библиотеки: {hours} ч\n"
+        f"📈 Добавлено за 30 дней: {last_30}\n"
+        f"📚 Библиотека с: {human_time(first_lib)}\n\n"
         f"📅 Первый трек: {human_time(s['first_add'])}\n"
         f"🕒 Последний трек: {human_time(s['last_add'])}\n"
         f"⚡ Добавлений в день: {avg}",
@@ -228,6 +465,78 @@ async def statistics(m: types.Message):
     )
 
 
+async def run_playlist_sync(m: types.Message, sp: SpotifyUserClient, outbox: Optional[Outbox] = None):
+    tg = str(m.from_user.id)
+    try:
+        result = await sync_user_playlist(tg, sp)
+    except SpotifyAPIError as e:
+        if e.status == 404:
+            await reply(m, outbox, "⚠️ Плейлист не найден — настрой синхронизацию заново: /sync")
+        else:
+            await reply(m, outbox, "⚠️ Не удалось синхронизировать плейлист, попробуй позже")
+        return
+
+    if result is None:
+        await reply(m, outbox, SYNC_USAGE, parse_mode="HTML")
+    elif result.changed:
+        await reply(m, outbox, f"🔁 Плейлист синхронизирован: ➕ {result.added} · ➖ {result.removed}")
+    else:
+        await reply(m, outbox, "✅ Плейлист уже совпадает с библиотекой")
+
+
+async def playlist_sync(m: types.Message, outbox: Optional[Outbox] = None):
+    tg = str(m.from_user.id)
+    if tg not in USER_SPOTIFY:
+        await reply(m, outbox, "❌ Сначала подключи Spotify")
+        return
+    await PLAYLIST_SYNC.ensure(tg)
+    if tg not in PLAYLIST_SYNC:
+        await reply(m, outbox, SYNC_USAGE, parse_mode="HTML")
+        return
+    await run_playlist_sync(m, await get_spotify_client(tg), outbox)
+
+
+async def sync_command(m: types.Message, command: CommandObject, outbox: Optional[Outbox] = None):
+    tg = str(m.from_user.id)
+    if tg not in USER_SPOTIFY:
+        await reply(m, outbox, "❌ Сначала подключи Spotify")
+        return
+    try:
+        args = shlex.split(command.args or "")
+    except ValueError:
+        await reply(m, outbox, SYNC_USAGE, parse_mode="HTML")
+        return
+    if not args:
+        await playlist_sync(m, outbox)
+        return
+    if args[0] == "off":
+        await PLAYLIST_SYNC.ensure(tg)
+        PLAYLIST_SYNC.pop(tg, None)
+        await reply(m, outbox, "🔁 Синхронизация отключена, плейлист остался как есть")
+        return
+
+    target, *options = args
+    try:
+        flt = SyncFilter.from_args(options)
+    except ValueError:
+        await reply(m, outbox, SYNC_USAGE, parse_mode="HTML")
+        return
+
+    sp = await get_spotify_client(tg)
+    if target == "new":
+        owner = USER_SPOTIFY[tg].get("spotify_user_id") or (await sp.get_me())["id"]
+        playlist = await sp.create_playlist(owner, SYNC_PLAYLIST_NAME, description=f"Синхронизируется ботом: {flt.describe()}")
+        playlist_id = playlist["id"]
+    else:
+        playlist_id = parse_playlist_id(target)
+        if playlist_id is None:
+            await reply(m, outbox, SYNC_USAGE, parse_mode="HTML")
+            return
+
+    PLAYLIST_SYNC[tg] = {"playlist_id": playlist_id, "filter": flt.as_dict(), "snapshot_id": None, "tracks": None}
+    await run_playlist_sync(m, sp, outbox)
+
+
 def register_handlers(dp: Dispatcher):
     dp.message.register(start_handler, Command("start"))
 
@@ -236,9 +545,19 @@ def register_handlers(dp: Dispatcher):
     dp.message.register(add_start, F.text == "🎵 Добавить трек")
     dp.message.register(add_track, States.waiting_add)
 
+    dp.message.register(import_start, F.text == "📥 Импорт списка")
+    dp.message.register(import_receive, States.waiting_import)
+    outbox = dp.workflow_data.get("outbox")
+    if outbox is not None:
+        dp["importer"] = ImportRunner(outbox, get_bulk_client, on_saved=record_added)
+
     dp.message.register(my_tracks, F.text == "📂 Мои треки")
+    dp.callback_query.register(my_tracks_page, TracksPage.filter())
 
     dp.message.register(delete_menu, F.text == "🗑 Удалить треки")
     dp.message.register(delete_tracks, States.waiting_delete)
 
     dp.message.register(statistics, F.text == "📊 Статистика")
+
+    dp.message.register(sync_command, Command("sync"))
+    dp.message.register(playlist_sync, F.text == "🔁 Синхронизация")
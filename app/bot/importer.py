@@ -0,0 +1,345 @@
+import asyncio
+import csv
+import io
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError
+
+from app.bot.outbox import NOTIFY, Outbox
+from app.spotify.client import SpotifyAPIError, SpotifyUserClient
+from app.spotify.refresh import RefreshRevoked
+from app.spotify.search_cache import normalize_query
+from app.storage.memory import IMPORT_QUERIES, IMPORTS
+
+MAX_IMPORT_LINES = 5000
+MAX_IMPORT_BYTES = 512 * 1024
+IMPORT_WORKERS = 8
+# Saved tracks go to Spotify in batches of this size; each batch is a checkpoint.
+IMPORT_BATCH = 50
+PROGRESS_INTERVAL = 2.0
+
+_ARTIST_COLUMNS = ("artist name(s)", "artist name", "artist", "artists", "исполнитель")
+_TITLE_COLUMNS = ("track name", "title", "track", "name", "song", "трек", "название")
+_LIST_PREFIX = re.compile(r"^\s*(?:\d+\s*[.)]\s*|[-*•]\s+)")
+
+ClientFactory = Callable[[str], Awaitable[SpotifyUserClient]]
+SavedCallback = Callable[[str, List[dict]], Awaitable[None]]
+
+
+def _csv_queries(lines: List[str]) -> Optional[List[str]]:
+    try:
+        dialect = csv.Sniffer().sniff(lines[0], delimiters=",;\t")
+    except csv.Error:
+        return None
+    rows = list(csv.reader(lines, dialect))
+    header = [cell.strip().lower() for cell in rows[0]]
+    artist = next((header.index(c) for c in _ARTIST_COLUMNS if c in header), None)
+    title = next((header.index(c) for c in _TITLE_COLUMNS if c in header), None)
+    if artist is None or title is None:
+        return None
+    return [
+        f"{row[artist]} - {row[title]}"
+        for row in rows[1:]
+        if len(row) > max(artist, title) and row[title].strip()
+    ]
+
+
+def parse_import(text: str, filename: str = "") -> List[str]:
+    """
+    Queries from a pasted list or a .txt/.csv dump: one per line, list
+    numbering and bullets stripped, CSV exports reduced to "artist - title".
+    """
+    lines = [line for line in text.lstrip("\ufeff").splitlines() if line.strip()]
+    if not lines:
+        return []
+    if filename.lower().endswith(".csv") or ("," in lines[0] or ";" in lines[0] or "\t" in lines[0]):
+        queries = _csv_queries(lines)
+        if queries is not None:
+            return queries
+    return [_LIST_PREFIX.sub("", line).strip() for line in lines if not line.lstrip().startswith("#")]
+
+
+def dedupe(queries: List[str]) -> List[str]:
+    """Drop empty queries and repeats that normalize to the same search key."""
+    seen = set()
+    unique = []
+    for query in queries:
+        key = normalize_query(query)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(query)
+    return unique
+
+
+def progress_text(job: dict, finished: bool = False) -> str:
+    head = "✅ Импорт завершён" if finished else "⏳ Импорт"
+    text = (
+        f"{head}: {job['done']}/{job['total']}\n"
+        f"➕ добавлено: {job['added']} · ℹ️ уже было: {job['already']} · ⚠️ не найдено: {job['missing']}"
+    )
+    if finished and job["not_found"]:
+        text += "\n\nНе найдены:\n" + "\n".join(job["not_found"])
+    return text
+
+
+def pause_reason(error: BaseException) -> str:
+    """A short reason for the user; the error itself (with Spotify's response body) only goes to the log."""
+    status = error.status if isinstance(error, SpotifyAPIError) else None
+    if isinstance(error, RefreshRevoked) or status in (401, 403):
+        return "Spotify не принял авторизацию, переподключи аккаунт"
+    if status == 429:
+        return "Spotify ограничил число запросов"
+    if (status is not None and status >= 500) or isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+        return "Spotify временно недоступен"
+    return "ошибка при обращении к Spotify"
+
+
+def paused_text(job: dict, error: BaseException) -> str:
+    return (
+        f"⚠️ Импорт остановлен на {job['done']}/{job['total']}: {pause_reason(error)}\n"
+        "Нажми «📥 Импорт списка», чтобы продолжить с этого места."
+    )
+
+
+class ImportRunner:
+    """
+    Runs bulk imports as background tasks, at most one per user.
+
+    Stages: search with a bounded worker pool, then, in order and in
+    batches, one `contains` check and one `save_tracks` call. The job
+    state in the `IMPORTS` table advances only after a batch is saved,
+    so a restarted process picks up at the first unsaved batch. A job
+    that fails on a Spotify error stays there too, paused, until the
+    user resumes it. Messages go through the outbox.
+    """
+
+    def __init__(
+        self,
+        outbox: Outbox,
+        client_factory: ClientFactory,
+        on_saved: Optional[SavedCallback] = None,
+        workers: int = IMPORT_WORKERS,
+        batch: int = IMPORT_BATCH,
+        progress_interval: float = PROGRESS_INTERVAL,
+    ):
+        self.outbox = outbox
+        self.client_factory = client_factory
+        self.on_saved = on_saved
+        self.workers = workers
+        self.batch = batch
+        self.progress_interval = progress_interval
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._progress_sent: Dict[str, asyncio.Future] = {}
+
+    def running(self, tg: str) -> bool:
+        task = self._tasks.get(str(tg))
+        return task is not None and not task.done()
+
+    async def start(self, tg: str, chat_id: int, queries: List[str]) -> bool:
+        tg = str(tg)
+        if self.running(tg):
+            return False
+        job = {
+            "total": len(queries),
+            "done": 0,
+            "added": 0,
+            "already": 0,
+            "missing": 0,
+            "not_found": [],
+            "chat_id": chat_id,
+            "message_id": None,
+        }
+        # Its own message, not folded into a neighbour: it is edited as the import goes.
+        message = await self.outbox.send_text(chat_id, progress_text(job), merge=False)
+        job["message_id"] = message.message_id
+        IMPORT_QUERIES[tg] = queries
+        IMPORTS[tg] = job
+        self._spawn(tg)
+        return True
+
+    def paused(self, tg: str) -> bool:
+        return str(tg) in IMPORTS and not self.running(tg)
+
+    def resume(self, tg: str) -> bool:
+        """Continue a paused import from its checkpoint."""
+        tg = str(tg)
+        if not self.paused(tg):
+            return False
+        self._spawn(tg)
+        return True
+
+    def resume_all(self, owns: Optional[Callable[[str], bool]] = None) -> int:
+        """Restart every checkpointed import (that this process owns)."""
+        resumed = 0
+        for tg in list(IMPORTS):
+            if (owns is None or owns(tg)) and not self.running(tg):
+                self._spawn(tg)
+                resumed += 1
+        return resumed
+
+    def _spawn(self, tg: str) -> None:
+        task = asyncio.create_task(self._run(tg))
+        self._tasks[tg] = task
+        task.add_done_callback(lambda t: self._done(tg, t))
+
+    def _done(self, tg: str, task: asyncio.Task) -> None:
+        if self._tasks.get(tg) is task:
+            del self._tasks[tg]
+        self._progress_sent.pop(tg, None)
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        print(f"⚠️ Import for {tg} paused: {error!r}")
+        job = IMPORTS.get(tg)
+        if job is not None:
+            self.outbox.notify(job["chat_id"], paused_text(job, error))
+
+    async def wait(self, tg: str) -> None:
+        task = self._tasks.get(str(tg))
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _progress(self, tg: str, job: dict) -> None:
+        # One edit queued at a time; the next one carries the newer numbers anyway.
+        pending = self._progress_sent.get(tg)
+        if pending is None or pending.done():
+            self._progress_sent[tg] = self.outbox.edit_text(job["chat_id"], job["message_id"], progress_text(job))
+
+    async def _report(self, job: dict) -> None:
+        text = progress_text(job, finished=True)
+        try:
+            await self.outbox.edit_text(job["chat_id"], job["message_id"], text, priority=NOTIFY)
+        except TelegramAPIError:
+            # The progress message is gone or can't be edited: send the report on its own.
+            self.outbox.notify(job["chat_id"], text)
+
+    async def _run(self, tg: str) -> None:
+        job = IMPORTS[tg]
+        queries: Optional[List[str]] = IMPORT_QUERIES.get(tg)
+        if queries is None:
+            # The list never made it to storage: nothing to resume from.
+            IMPORTS.pop(tg, None)
+            return
+        # Imports outlast an access token: a fresh client per batch picks up
+        # refreshes, and a 401 gets one retry with a newly fetched one.
+        sp = await self.client_factory(tg)
+
+        async def search(query: str) -> Optional[dict]:
+            nonlocal sp
+            try:
+                return await sp.search_track_full(query)
+            except SpotifyAPIError as e:
+                if e.status != 401:
+                    raise
+            sp = await self.client_factory(tg)
+            return await sp.search_track_full(query)
+
+        start = job["done"]
+        results: Dict[int, Optional[dict]] = {}
+        ready = asyncio.Condition()
+        # Searches may run at most two batches ahead of what has been saved.
+        window = asyncio.Semaphore(2 * self.batch)
+        next_index = iter(range(start, len(queries)))
+        failures: List[BaseException] = []
+
+        async def search_worker() -> None:
+            try:
+                for index in next_index:
+                    await window.acquire()
+                    # Only an empty result is "not found"; errors pause the job.
+                    track = await search(queries[index])
+                    async with ready:
+                        results[index] = track
+                        ready.notify_all()
+            except Exception as e:
+                async with ready:
+                    failures.append(e)
+                    ready.notify_all()
+
+        workers = [asyncio.create_task(search_worker()) for _ in range(self.workers)]
+        last_progress = time.monotonic()
+        try:
+            position = start
+            while position < len(queries):
+                end = min(position + self.batch, len(queries))
+                async with ready:
+                    await ready.wait_for(lambda: failures or all(i in results for i in range(position, end)))
+                if failures:
+                    # The checkpoint still points at this batch; it is retried on resume.
+                    raise failures[0]
+                found = [results.pop(i) for i in range(position, end)]
+                for _ in range(position, end):
+                    window.release()
+
+                sp = await self.client_factory(tg)
+                counts = await self._save_batch(tg, sp, queries[position:end], found)
+                # Counters and checkpoint move together, only once the batch is saved.
+                for key in ("added", "already", "missing"):
+                    job[key] += counts[key]
+                job["not_found"].extend(counts["not_found"][: 20 - len(job["not_found"])])
+                position = job["done"] = end
+                IMPORTS.touch(tg)
+
+                if time.monotonic() - last_progress >= self.progress_interval:
+                    last_progress = time.monotonic()
+                    self._progress(tg, job)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        IMPORTS.pop(tg, None)
+        IMPORT_QUERIES.pop(tg, None)
+        await self._report(job)
+
+    async def _save_batch(
+        self, tg: str, sp: SpotifyUserClient, queries: List[str], found: List[Optional[dict]]
+    ) -> Dict[str, Any]:
+        counts: Dict[str, Any] = {"added": 0, "already": 0, "missing": 0, "not_found": []}
+        candidates: Dict[str, dict] = {}
+        for query, track in zip(queries, found):
+            if not track:
+                counts["missing"] += 1
+                counts["not_found"].append(query)
+            elif track["id"] in candidates:
+                counts["already"] += 1
+            else:
+                candidates[track["id"]] = track
+
+        if not candidates:
+            return counts
+        saved = await sp.contains_tracks(list(candidates))
+        to_save = [t for t, flag in zip(candidates.values(), saved) if not flag]
+        counts["already"] += len(candidates) - len(to_save)
+        if to_save:
+            await sp.save_tracks([t["id"] for t in to_save], tracks=to_save)
+            counts["added"] = len(to_save)
+            if self.on_saved is not None:
+                await self.on_saved(tg, to_save)
+        return counts
+
+
+def read_document(data: bytes) -> str:
+    raw = data[:MAX_IMPORT_BYTES]
+    for encoding in ("utf-8-sig", "cp1251"):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("utf-8", errors="replace")
+
+
+async def download_document(bot: Bot, document) -> str:
+    buffer = io.BytesIO()
+    await bot.download(document, destination=buffer)
+    return read_document(buffer.getvalue())
@@ -1,12 +1,41 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 
 def main_kb() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="🔐 Подключить Spotify")],
-            [KeyboardButton(text="🎵 Добавить трек")],
+            [KeyboardButton(text="🎵 Добавить трек"), KeyboardButton(text="📥 Импорт списка")],
             [KeyboardButton(text="📂 Мои треки"), KeyboardButton(text="🗑 Удалить треки")],
-            [KeyboardButton(text="📊 Статистика")],
+            [KeyboardButton(text="📊 Статистика"), KeyboardButton(text="🔁 Синхронизация")],
         ],
         resize_keyboard=True,
     )
+
+
+class TracksPage(CallbackData, prefix="tp"):
+    page: int
+
+
+JUMP = 10
+
+
+def tracks_page_kb(page: int, pages: int) -> InlineKeyboardMarkup:
+    """⏮ ◀ n/N ▶ ⏭, plus ±10 pages once the library is long enough to need it."""
+    def button(text: str, target: int) -> InlineKeyboardButton:
+        return InlineKeyboardButton(text=text, callback_data=TracksPage(page=target).pack())
+
+    last = pages - 1
+    rows = [[
+        button("⏮", 0),
+        button("◀", max(page - 1, 0)),
+        button(f"{page + 1}/{pages}", page),
+        button("▶", min(page + 1, last)),
+        button("⏭", last),
+    ]]
+    if pages > JUMP:
+        rows.append([
+            button(f"-{JUMP}", max(page - JUMP, 0)),
+            button(f"+{JUMP}", min(page + JUMP, last)),
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -0,0 +1,162 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional
+
+from aiogram import BaseMiddleware, Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from app.bot.keyboards import main_kb
+from app.monitoring.metrics import DUPLICATE_PRESSES, HANDLER_ERRORS, HANDLER_LATENCY
+from app.monitoring.tracing import get_tracer, span
+from app.storage.memory import ensure_user
+
+# Two taps on the same button within this many seconds count as one.
+DUPLICATE_PRESS_WINDOW = 1.0
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner middleware: records how long each matched handler takes, labelled by its name."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            with span("handler", handler=name):
+                return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(handler=name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(handler=name).observe(time.perf_counter() - started)
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Update-level outer middleware: opens the root span of each update while a tracer is set."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        tracer = get_tracer()
+        if tracer is None:
+            return await handler(event, data)
+
+        user = data.get("event_from_user")
+        root = tracer.start(
+            "update",
+            update_id=event.update_id if isinstance(event, Update) else None,
+            type=event.event_type if isinstance(event, Update) else type(event).__name__,
+            user=user.id if user is not None else None,
+        )
+        try:
+            with root:
+                return await handler(event, data)
+        finally:
+            tracer.finish(root)
+
+
+class TelegramTracingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: one span per Bot API call made inside a traced update."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        with span("telegram", method=method.__api_method__):
+            return await make_request(bot, method)
+
+
+class DuplicatePressMiddleware(BaseMiddleware):
+    """
+    Outer middleware: drops a menu-button press or an inline-button tap
+    that repeats the previous one from the same chat within `window`
+    seconds, before it reaches filters, FSM or handlers.
+    """
+
+    def __init__(self, window: float = DUPLICATE_PRESS_WINDOW, texts: Iterable[str] = (), clock=time.monotonic):
+        self.window = window
+        self.texts = frozenset(texts)
+        self._clock = clock
+        # Insertion order is time order: a key is never re-added while it is still in here.
+        self._seen: "OrderedDict[Hashable, float]" = OrderedDict()
+
+    def _key(self, event: TelegramObject) -> Optional[Hashable]:
+        if isinstance(event, Message):
+            if event.text in self.texts:
+                return event.chat.id, event.text
+        elif isinstance(event, CallbackQuery) and event.data is not None:
+            message_id = event.message.message_id if event.message is not None else None
+            return event.from_user.id, message_id, event.data
+        return None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        key = self._key(event)
+        if key is None:
+            return await handler(event, data)
+
+        now = self._clock()
+        while self._seen:
+            oldest, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.window:
+                break
+            del self._seen[oldest]
+
+        if key in self._seen:
+            DUPLICATE_PRESSES.inc()
+            if isinstance(event, CallbackQuery):
+                await event.answer()
+            return None
+        self._seen[key] = now
+        return await handler(event, data)
+
+
+class UserRowsMiddleware(BaseMiddleware):
+    """Outer middleware: pages in the sender's rows of the paged storage tables before any handler runs."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, "from_user", None)
+        if user is not None:
+            await ensure_user(str(user.id))
+        return await handler(event, data)
+
+
+def setup_middlewares(dp: Dispatcher, press_window: float = DUPLICATE_PRESS_WINDOW) -> None:
+    dp.update.outer_middleware(TracingMiddleware())
+
+    timing = HandlerTimingMiddleware()
+    dp.message.middleware(timing)
+    dp.callback_query.middleware(timing)
+
+    # Duplicates are dropped first, before they cost a storage read.
+    if press_window > 0:
+        buttons = [button.text for row in main_kb().keyboard for button in row]
+        presses = DuplicatePressMiddleware(press_window, buttons)
+        dp.message.outer_middleware(presses)
+        dp.callback_query.outer_middleware(presses)
+
+    rows = UserRowsMiddleware()
+    dp.message.outer_middleware(rows)
+    dp.callback_query.outer_middleware(rows)
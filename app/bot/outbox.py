@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.monitoring.metrics import OUTBOX_MERGED, OUTBOX_RETRY_AFTER, OUTBOX_SENT, REGISTRY
+from app.utils.ratelimit import TokenBucket
+from app.utils.text import MESSAGE_LIMIT
+
+# Lower sends first.
+INTERACTIVE = 0
+NOTIFY = 1
+BULK = 2
+
+MERGE_SEPARATOR = "\n\n"
+
+
+class _Outgoing:
+    __slots__ = ("priority", "seq", "method", "kwargs", "future", "merge")
+
+    def __init__(
+        self, priority: int, seq: int, method: str, kwargs: Dict[str, Any], future: asyncio.Future, merge: bool = True
+    ):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.merge = merge
+
+    @property
+    def mergeable(self) -> bool:
+        return self.merge and self.method == "send_message" and "reply_markup" not in self.kwargs
+
+
+def _options(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in kwargs.items() if k != "text"}
+
+
+class _Chat:
+    __slots__ = ("chat_id", "queue", "bucket", "blocked_until", "busy", "scheduled")
+
+    def __init__(self, chat_id: int, bucket: TokenBucket):
+        self.chat_id = chat_id
+        self.queue: Deque[_Outgoing] = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+        self.scheduled = False
+
+
+class Outbox:
+    """
+    Outbound message queue in front of a `Bot`.
+
+    Chats are served by priority of their oldest message, each limited by
+    its own token bucket and all of them by a global one. A flood-wait
+    (`TelegramRetryAfter`) parks only the chat that got it; messages stay
+    in order within a chat. Consecutive plain-text messages to the same
+    chat are merged while they fit into one Telegram message.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = 25.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        max_in_flight: int = 16,
+        clock=time.monotonic,
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_rate, clock)
+        self._chats: Dict[int, _Chat] = {}
+        self._ready: List[Tuple[int, int, int]] = []
+        self._seq = itertools.count()
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+        self._runner: Optional[asyncio.Task] = None
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._sweep_at = 1024
+        self.depth = 0
+
+    # -- enqueue -----------------------------------------------------------
+
+    def _enqueue(
+        self, chat_id: int, method: str, priority: int, kwargs: Dict[str, Any], merge: bool = True
+    ) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= self._sweep_at:
+                self._sweep()
+            chat = self._chats[chat_id] = _Chat(chat_id, TokenBucket(self.chat_rate, self.chat_burst, self._clock))
+        chat.queue.append(_Outgoing(priority, next(self._seq), method, kwargs, future, merge))
+        self.depth += 1
+        self._schedule(chat)
+        return future
+
+    def send_text(
+        self, chat_id: int, text: str, priority: int = INTERACTIVE, merge: bool = True, **kwargs
+    ) -> asyncio.Future:
+        """Queue a message; `merge=False` keeps it a message of its own (e.g. one that is edited later)."""
+        return self._enqueue(chat_id, "send_message", priority, {"chat_id": chat_id, "text": text, **kwargs}, merge)
+
+    def notify(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        """Unsolicited message (not a reply): queued behind interactive replies."""
+        return self.send_text(chat_id, text, priority=NOTIFY, **kwargs)
+
+    def send_photo(self, chat_id: int, photo, priority: int = INTERACTIVE, **kwargs) -> asyncio.Future:
+        return self._enqueue(chat_id, "send_photo", priority, {"chat_id": chat_id, "photo": photo, **kwargs})
+
+    def edit_text(self, chat_id: int, message_id: int, text: str, priority: int = BULK, **kwargs) -> asyncio.Future:
+        return self._enqueue(
+            chat_id, "edit_message_text", priority, {"chat_id": chat_id, "message_id": message_id, "text": text, **kwargs}
+        )
+
+    # -- scheduling --------------------------------------------------------
+
+    def _sweep(self) -> None:
+        """Forget chats with nothing queued whose limits have fully recovered."""
+        now = self._clock()
+        for chat_id, chat in list(self._chats.items()):
+            if not (chat.queue or chat.busy or chat.scheduled) and chat.bucket.idle and chat.blocked_until <= now:
+                del self._chats[chat_id]
+        self._sweep_at = max(1024, 2 * len(self._chats))
+
+    def _schedule(self, chat: _Chat) -> None:
+        if chat.busy or chat.scheduled or not chat.queue:
+            return
+
+        now = self._clock()
+        wait = max(chat.blocked_until - now, (1.0 - chat.bucket.available) / chat.bucket.rate, 0.0)
+        chat.scheduled = True
+        if wait > 0:
+            self._timers[chat.chat_id] = asyncio.get_running_loop().call_later(wait, self._release, chat)
+            return
+        head = chat.queue[0]
+        heapq.heappush(self._ready, (head.priority, head.seq, chat.chat_id))
+        self._wake.set()
+
+    def _release(self, chat: _Chat) -> None:
+        self._timers.pop(chat.chat_id, None)
+        chat.scheduled = False
+        self._schedule(chat)
+
+    def _take(self, chat: _Chat) -> List[_Outgoing]:
+        batch = [chat.queue.popleft()]
+        if not batch[0].mergeable:
+            return batch
+        first = batch[0].kwargs
+        options = _options(first)
+        size = len(first["text"])
+        while chat.queue:
+            nxt = chat.queue[0]
+            # Only texts sent the same way (parse mode, silence, link previews...) can share a message.
+            if not nxt.mergeable or _options(nxt.kwargs) != options:
+                break
+            size += len(MERGE_SEPARATOR) + len(nxt.kwargs["text"])
+            if size > MESSAGE_LIMIT:
+                break
+            batch.append(chat.queue.popleft())
+        return batch
+
+    # -- delivery ----------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            while not self._ready:
+                self._wake.clear()
+                await self._wake.wait()
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is None or not chat.queue:
+                continue
+
+            wait = self._global.reserve()
+            if wait:
+                await asyncio.sleep(wait)
+            await self._slots.acquire()
+
+            chat.scheduled = False
+            chat.busy = True
+            chat.bucket.reserve()
+            task = asyncio.create_task(self._deliver(chat, self._take(chat)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, chat: _Chat, batch: List[_Outgoing]) -> None:
+        kwargs = batch[0].kwargs
+        if len(batch) > 1:
+            kwargs = dict(kwargs, text=MERGE_SEPARATOR.join(item.kwargs["text"] for item in batch))
+            OUTBOX_MERGED.inc(len(batch) - 1)
+        try:
+            result = await getattr(self.bot, batch[0].method)(**kwargs)
+        except TelegramRetryAfter as e:
+            OUTBOX_RETRY_AFTER.inc()
+            chat.blocked_until = self._clock() + e.retry_after
+            chat.bucket.pause_until(chat.blocked_until)
+            chat.queue.extendleft(reversed(batch))
+            return
+        except Exception as e:
+            OUTBOX_SENT.labels(result="error").inc()
+            self._settle(batch, error=e)
+        else:
+            OUTBOX_SENT.labels(result="ok").inc()
+            self._settle(batch, result=result)
+        finally:
+            chat.busy = False
+            self._slots.release()
+            self._schedule(chat)
+
+    def _settle(self, batch: List[_Outgoing], result: Any = None, error: Optional[BaseException] = None) -> None:
+        self.depth -= len(batch)
+        for item in batch:
+            if item.future.done():
+                continue
+            if error is not None:
+                item.future.set_exception(error)
+                # Fire-and-forget senders never look at the future.
+                item.future.exception()
+            else:
+                item.future.set_result(result)
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+        REGISTRY.gauge("bot_outbox_depth", "Messages waiting in the outbound queue", func=lambda: self.depth)
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        deadline = self._clock() + timeout
+        while self.depth and self._clock() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        await self.drain(timeout)
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        tasks = list(self._tasks)
+        if self._runner is not None:
+            tasks.append(self._runner)
+            self._runner = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for chat in self._chats.values():
+            for item in chat.queue:
+                item.future.cancel()
+        self._chats.clear()
+        self._ready.clear()
+        self.depth = 0
@@ -0,0 +1,180 @@
+import asyncio
+import hmac
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from app.monitoring.metrics import UPDATES_REJECTED
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Update types that carry a `from` user; used to keep each user's updates in order.
+_USER_FIELDS = (
+    "message",
+    "edited_message",
+    "callback_query",
+    "inline_query",
+    "chosen_inline_result",
+    "shipping_query",
+    "pre_checkout_query",
+    "my_chat_member",
+    "chat_member",
+    "chat_join_request",
+)
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    for field in _USER_FIELDS:
+        event = update.get(field)
+        if isinstance(event, dict):
+            user = event.get("from") or {}
+            if "id" in user:
+                return int(user["id"])
+            chat = event.get("chat") or {}
+            if "id" in chat:
+                return int(chat["id"])
+    return None
+
+
+class UpdateEndpoint:
+    """aiohttp route that authenticates Telegram webhook calls and hands updates to `submit`."""
+
+    def __init__(self, secret_token: str):
+        self.secret_token = secret_token
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def register(self, app: web.Application, path: str) -> None:
+        app.router.add_post(path, self.handle)
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        raise NotImplementedError
+
+    async def handle(self, request: web.Request) -> web.Response:
+        given = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(given.encode(), self.secret_token.encode()):
+            self.rejected += 1
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        if not self.submit(update):
+            # Telegram re-delivers on non-2xx, so push back instead of losing the update.
+            self.dropped += 1
+            UPDATES_REJECTED.labels(reason="busy").inc()
+            return web.Response(status=503)
+
+        self.received += 1
+        return web.Response()
+
+
+class WebhookReceiver(UpdateEndpoint):
+    """
+    Telegram webhook endpoint on the shared aiohttp app.
+
+    The request handler only checks the secret token and enqueues the raw
+    update, so Telegram gets its 200 right away. Each user has a lane of
+    their own, started on demand: one user's updates are handled in order,
+    while up to `concurrency` updates of different users run at once. A
+    slow handler thus holds up only its own user. Past `max_queue` pending
+    updates the endpoint answers 503 and Telegram re-delivers later.
+    """
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        secret_token: str,
+        concurrency: int = 64,
+        max_queue: int = 10_000,
+    ):
+        super().__init__(secret_token)
+        self.dp = dp
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self._slots = asyncio.Semaphore(concurrency)
+        self._lanes: Dict[Hashable, Deque[Dict[str, Any]]] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._started = False
+        self.running = 0
+
+    @property
+    def depth(self) -> int:
+        return self._pending - self.running
+
+    @staticmethod
+    def _lane_key(update: Dict[str, Any]) -> Hashable:
+        user_id = update_user_id(update)
+        return user_id if user_id is not None else ("update", update.get("update_id", 0))
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        if self._pending >= self.max_queue:
+            return False
+        key = self._lane_key(update)
+        self._lanes.setdefault(key, deque()).append(update)
+        self._pending += 1
+        self._idle.clear()
+        if self._pending >= self.max_queue:
+            self._room.clear()
+        if self._started and key not in self._tasks:
+            self._tasks[key] = asyncio.create_task(self._run_lane(key))
+        return True
+
+    async def _run_lane(self, key: Hashable) -> None:
+        lane = self._lanes[key]
+        try:
+            while lane:
+                update = lane.popleft()
+                try:
+                    async with self._slots:
+                        self.running += 1
+                        try:
+                            await self.dp.feed_raw_update(self.bot, update)
+                        finally:
+                            self.running -= 1
+                except Exception as exc:
+                    print(f"⚠️ update {update.get('update_id')} failed: {exc}")
+                finally:
+                    self._pending -= 1
+                    self._room.set()
+                    if not self._pending:
+                        self._idle.set()
+        finally:
+            # No await since the last `while lane` check: a new update for this
+            # user either landed before it or will start a fresh lane task.
+            del self._tasks[key]
+            if not lane:
+                del self._lanes[key]
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        for key in self._lanes:
+            self._tasks[key] = asyncio.create_task(self._run_lane(key))
+
+    async def wait_for_room(self) -> None:
+        """Until `submit` would accept another update."""
+        await self._room.wait()
+
+    async def drain(self) -> None:
+        await self._idle.wait()
+
+    async def stop(self) -> None:
+        self._started = False
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,248 @@
+import asyncio
+import multiprocessing
+import queue
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from app.bot import create_bot_and_dispatcher, register_handlers
+from app.bot.dispatcher import create_fsm_storage
+from app.bot.webhook import UpdateEndpoint, WebhookReceiver, update_user_id
+from app.config import Config, load_config
+from app.monitoring import configure_tracing, install_runtime_gauges, set_tracer, start_monitoring_server
+from app.monitoring.metrics import UPDATES_REJECTED
+from app.spotify.pages import get_page_cache
+from app.spotify.http import close_session, init_session
+from app.spotify.oauth import (
+    create_oauth_app,
+    get_refresher,
+    set_connect_hook,
+    start_oauth_server,
+    stop_background_tasks,
+    warm_library,
+)
+from app.storage import close_storage, create_backend, open_storage
+from app.storage.memory import USER_SPOTIFY
+
+
+def owner_of(user_id, workers: int) -> int:
+    """Worker index that handles everything for `user_id`."""
+    return int(user_id) % workers
+
+
+# Updates waiting for one worker; past this the webhook answers 503 and Telegram retries.
+WORKER_QUEUE_SIZE = 1_000
+# More worker exits than this within RESTART_WINDOW seconds stops the cluster.
+MAX_RESTARTS = 5
+RESTART_WINDOW = 60.0
+
+
+class ClusterRouter(UpdateEndpoint):
+    """Front-process webhook route: forwards each update to the worker that owns its user."""
+
+    def __init__(self, queues: List[Any], secret_token: str, processes: Optional[List[Any]] = None):
+        super().__init__(secret_token)
+        self.queues = queues
+        self.processes = processes
+
+    def submit(self, update: Dict[str, Any]) -> bool:
+        user_id = update_user_id(update)
+        key = user_id if user_id is not None else update.get("update_id", 0)
+        index = owner_of(key, len(self.queues))
+        if self.processes is not None and not self.processes[index].is_alive():
+            # Not restarted yet; Telegram re-delivers after the 503.
+            return False
+        try:
+            self.queues[index].put_nowait(("update", update))
+        except queue.Full:
+            return False
+        return True
+
+
+def worker_metrics_port(config: Config, index: int) -> int:
+    """Workers serve their own `/metrics` and `/traces` on the ports right after the OAuth port."""
+    return config.oauth.port + 1 + index
+
+
+def _open_backend(config: Config):
+    return create_backend(config.storage.backend, config.storage.path, config.storage.redis_url)
+
+
+async def _worker_main(index: int, workers: int, inbox) -> None:
+    load_dotenv()
+    config = load_config()
+
+    bot, dp = create_bot_and_dispatcher(
+        config.telegram.token,
+        create_fsm_storage(config.storage.redis_url),
+        config.telegram.press_window,
+    )
+    register_handlers(dp)
+    configure_tracing(config.tracing)
+
+    backend = await open_storage(_open_backend(config))
+    await init_session()
+    refresher = get_refresher()
+    refresher.owns = lambda tg: owner_of(tg, workers) == index
+    refresher.start()
+
+    outbox = dp["outbox"]
+    outbox.start()
+    importer = dp["importer"]
+    importer.resume_all(owns=refresher.owns)
+    receiver = WebhookReceiver(dp, bot, secret_token="")
+    receiver.start()
+    # Handlers, Spotify calls and traces are all recorded here, not in the front process.
+    install_runtime_gauges(queue_depth=lambda: receiver.depth)
+    monitoring = await start_monitoring_server(
+        config.oauth.host, worker_metrics_port(config, index), config.oauth.metrics_token
+    )
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            # Stop taking updates while the receiver is full: the inbox fills up
+            # and the front answers 503, so Telegram re-delivers instead of us dropping.
+            await receiver.wait_for_room()
+            message = await loop.run_in_executor(None, inbox.get)
+            if message is None:
+                break
+            kind = message[0]
+            if kind == "update":
+                if not receiver.submit(message[1]):
+                    UPDATES_REJECTED.labels(reason="dropped").inc()
+                    print(f"⚠️ worker {index}: queue full, update dropped")
+            elif kind == "connected":
+                _, tg, access_token = message
+                # The front process wrote the token; pick it up before this user's next update.
+                await backend.reload(USER_SPOTIFY.name, tg)
+                warm_library(tg, access_token)
+        await receiver.drain()
+    finally:
+        await receiver.stop()
+        await monitoring.cleanup()
+        await importer.stop()
+        await refresher.stop()
+        await stop_background_tasks()
+        await get_page_cache().close()
+        await outbox.stop()
+        await close_session()
+        await close_storage()
+        await asyncio.to_thread(set_tracer, None)
+        await bot.session.close()
+
+
+def run_worker(index: int, workers: int, inbox) -> None:
+    try:
+        asyncio.run(_worker_main(index, workers, inbox))
+    except KeyboardInterrupt:
+        pass
+
+
+class WorkerPool:
+    """
+    The worker processes and their bounded inboxes. `supervise` replaces
+    workers that exit, and gives up if they keep exiting.
+    """
+
+    def __init__(self, ctx, workers: int, max_queue: int = WORKER_QUEUE_SIZE):
+        self.ctx = ctx
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queues: List[Any] = [None] * workers
+        self.processes: List[Any] = [None] * workers
+        self._exits: Deque[float] = deque()
+
+    def spawn(self, index: int) -> None:
+        # A fresh inbox: one a process died reading from may be left locked.
+        inbox = self.ctx.Queue(maxsize=self.max_queue)
+        proc = self.ctx.Process(
+            target=run_worker, args=(index, self.workers, inbox), name=f"bot-worker-{index}", daemon=True
+        )
+        proc.start()
+        self.queues[index] = inbox
+        self.processes[index] = proc
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self.spawn(index)
+
+    async def send(self, index: int, message: tuple, timeout: float = 5.0) -> None:
+        await asyncio.to_thread(self.queues[index].put, message, True, timeout)
+
+    async def supervise(self, interval: float = 1.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for index, proc in enumerate(self.processes):
+                if proc.is_alive():
+                    continue
+                now = time.monotonic()
+                self._exits.append(now)
+                while now - self._exits[0] > RESTART_WINDOW:
+                    self._exits.popleft()
+                if len(self._exits) > MAX_RESTARTS:
+                    raise RuntimeError(f"worker {index} exited with code {proc.exitcode}; too many restarts")
+                print(f"⚠️ worker {index} exited with code {proc.exitcode}, restarting")
+                self.spawn(index)
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        for inbox in self.queues:
+            try:
+                inbox.put_nowait(None)
+            except queue.Full:
+                pass  # the join below times out and the daemon process goes with us
+        await asyncio.gather(*(asyncio.to_thread(p.join, timeout) for p in self.processes))
+
+
+async def run_cluster(config: Config) -> None:
+    """
+    Scale-out mode: this process terminates webhooks and OAuth callbacks,
+    `config.cluster.workers` processes run the dispatcher. Updates are
+    routed by user id so each user's updates stay ordered on one worker;
+    tokens, stats and FSM state live in the shared backend. A worker that
+    exits is restarted; updates for it are answered with 503 meanwhile.
+    """
+    workers = config.cluster.workers
+    pool = WorkerPool(multiprocessing.get_context("spawn"), workers)
+    pool.start()
+
+    bot, dp = create_bot_and_dispatcher(config.telegram.token)
+    register_handlers(dp)
+
+    backend = await open_storage(_open_backend(config))
+    await init_session()
+
+    async def forward_connect(tg: str, access_token: str) -> None:
+        await backend.flush()
+        await pool.send(owner_of(tg, workers), ("connected", tg, access_token))
+
+    set_connect_hook(forward_connect)
+
+    install_runtime_gauges()
+    outbox = dp["outbox"]
+    outbox.start()
+    web_app = create_oauth_app(config, outbox)
+    router = ClusterRouter(pool.queues, config.telegram.webhook_secret, pool.processes)
+    router.register(web_app, config.telegram.webhook_path)
+
+    runner = None
+    try:
+        runner = await start_oauth_server(app=web_app)
+        await bot.set_webhook(
+            config.telegram.webhook_url + config.telegram.webhook_path,
+            secret_token=config.telegram.webhook_secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        print(f"✅ Routing updates to {workers} workers")
+        await pool.supervise()
+    finally:
+        await pool.stop()
+        if runner is not None:
+            await runner.cleanup()
+        await outbox.stop()
+        await stop_background_tasks()
+        await close_session()
+        await close_storage()
+        await bot.session.close()
@@ -1,5 +1,5 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +8,12 @@ load_dotenv()
 @dataclass(frozen=True)
 class TelegramConfig:
     token: str
+    mode: str = "polling"
+    webhook_url: str = ""
+    webhook_path: str = "/telegram/webhook"
+    webhook_secret: str = ""
+    # Repeated identical button presses within this window are dropped; 0 disables.
+    press_window: float = 1.0
 
 
 @dataclass(frozen=True)
@@ -27,6 +33,28 @@ class SpotifyConfig:
 class OAuthConfig:
     host: str
     port: int
+    # Bearer token for /metrics and /traces; they are not served without one.
+    metrics_token: str = ""
+
+
+@dataclass(frozen=True)
+class StorageConfig:
+    backend: str = "memory"
+    path: str = "data/bot.sqlite3"
+    redis_url: str = ""
+
+
+@dataclass(frozen=True)
+class ClusterConfig:
+    workers: int = 1
+
+
+@dataclass(frozen=True)
+class TracingConfig:
+    # Updates slower than this many seconds are kept; 0 turns tracing off.
+    threshold: float = 0.0
+    capacity: int = 200
+    path: str = ""
 
 
 @dataclass(frozen=True)
@@ -34,10 +62,18 @@ class Config:
     telegram: TelegramConfig
     spotify: SpotifyConfig
     oauth: OAuthConfig
+    storage: StorageConfig = field(default_factory=StorageConfig)
+    cluster: ClusterConfig = field(default_factory=ClusterConfig)
+    tracing: TracingConfig = field(default_factory=TracingConfig)
 
 
 def load_config() -> Config:
     telegram_token = os.getenv("TELEGRAM_BOT_TOKEN")
+    telegram_mode = os.getenv("TELEGRAM_MODE", "polling").lower()
+    webhook_url = os.getenv("WEBHOOK_URL", "").rstrip("/")
+    webhook_path = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+    webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+    press_window = float(os.getenv("DUPLICATE_PRESS_WINDOW", "1.0"))
 
     spotify_client_id = os.getenv("SPOTIFY_CLIENT_ID")
     spotify_client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
@@ -45,6 +81,17 @@ def load_config() -> Config:
 
     oauth_host = os.getenv("OAUTH_HOST", "0.0.0.0")
     oauth_port = int(os.getenv("OAUTH_PORT", "8080"))
+    metrics_token = os.getenv("METRICS_TOKEN", "")
+
+    storage_backend = os.getenv("STORAGE_BACKEND", "memory").lower()
+    storage_path = os.getenv("STORAGE_PATH", "data/bot.sqlite3")
+    redis_url = os.getenv("REDIS_URL", "")
+
+    workers = int(os.getenv("WORKERS", "1"))
+
+    trace_threshold = float(os.getenv("TRACE_THRESHOLD", "0"))
+    trace_capacity = int(os.getenv("TRACE_BUFFER", "200"))
+    trace_path = os.getenv("TRACE_FILE", "")
 
     if not telegram_token:
         raise RuntimeError("TELEGRAM_BOT_TOKEN is not set")
@@ -54,9 +101,29 @@ def load_config() -> Config:
             "SPOTIFY_CLIENT_ID / SPOTIFY_CLIENT_SECRET / SPOTIFY_REDIRECT_URI must be set"
         )
 
+    if telegram_mode not in ("polling", "webhook"):
+        raise RuntimeError("TELEGRAM_MODE must be 'polling' or 'webhook'")
+
+    if telegram_mode == "webhook" and (not webhook_url or not webhook_secret):
+        raise RuntimeError("WEBHOOK_URL / WEBHOOK_SECRET must be set for TELEGRAM_MODE=webhook")
+
+    if storage_backend not in ("memory", "sqlite", "redis"):
+        raise RuntimeError("STORAGE_BACKEND must be 'memory', 'sqlite' or 'redis'")
+
+    if storage_backend == "redis" and not redis_url:
+        raise RuntimeError("REDIS_URL must be set for STORAGE_BACKEND=redis")
+
+    if workers > 1 and (telegram_mode != "webhook" or storage_backend == "memory"):
+        raise RuntimeError("WORKERS > 1 needs TELEGRAM_MODE=webhook and a shared STORAGE_BACKEND")
+
     return Config(
         telegram=TelegramConfig(
             token=telegram_token,
+            mode=telegram_mode,
+            webhook_url=webhook_url,
+            webhook_path=webhook_path,
+            webhook_secret=webhook_secret,
+            press_window=press_window,
         ),
         spotify=SpotifyConfig(
             client_id=spotify_client_id,
@@ -66,5 +133,19 @@ def load_config() -> Config:
         oauth=OAuthConfig(
             host=oauth_host,
             port=oauth_port,
+            metrics_token=metrics_token,
+        ),
+        storage=StorageConfig(
+            backend=storage_backend,
+            path=storage_path,
+            redis_url=redis_url,
+        ),
+        cluster=ClusterConfig(
+            workers=workers,
+        ),
+        tracing=TracingConfig(
+            threshold=trace_threshold,
+            capacity=trace_capacity,
+            path=trace_path,
         ),
     )
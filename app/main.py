@@ -3,18 +3,78 @@ from dotenv import load_dotenv
 
 from app.config import load_config
 from app.bot import create_bot_and_dispatcher, register_handlers
-from app.spotify.oauth import start_oauth_server
+from app.bot.dispatcher import create_fsm_storage
+from app.bot.webhook import WebhookReceiver
+from app.cluster import run_cluster
+from app.monitoring import LoopLagMonitor, configure_tracing, install_runtime_gauges, set_tracer
+from app.storage import close_storage, create_backend, open_storage
+from app.spotify.pages import get_page_cache
+from app.spotify.http import init_session, close_session
+from app.spotify.oauth import create_oauth_app, get_refresher, start_oauth_server, stop_background_tasks
 
 
 async def main():
     load_dotenv()
     config = load_config()
 
-    bot, dp = create_bot_and_dispatcher(config.telegram.token)
+    if config.cluster.workers > 1:
+        await run_cluster(config)
+        return
+
+    bot, dp = create_bot_and_dispatcher(
+        config.telegram.token,
+        create_fsm_storage(config.storage.redis_url),
+        config.telegram.press_window,
+    )
     register_handlers(dp)
-    await start_oauth_server()
+    configure_tracing(config.tracing)
+
+    outbox = dp["outbox"]
+    web_app = create_oauth_app(config, outbox)
+    receiver = None
+    if config.telegram.mode == "webhook":
+        receiver = WebhookReceiver(dp, bot, config.telegram.webhook_secret)
+        receiver.register(web_app, config.telegram.webhook_path)
+    install_runtime_gauges(queue_depth=(lambda: receiver.depth) if receiver is not None else None)
+    loop_lag = LoopLagMonitor()
 
-    await dp.start_polling(bot)
+    await open_storage(create_backend(config.storage.backend, config.storage.path, config.storage.redis_url))
+    await init_session()
+    importer = dp["importer"]
+    refresher = get_refresher()
+    runner = None
+    try:
+        runner = await start_oauth_server(app=web_app)
+        refresher.start()
+        outbox.start()
+        importer.resume_all()
+        loop_lag.start()
+        if receiver is not None:
+            receiver.start()
+            await bot.set_webhook(
+                config.telegram.webhook_url + config.telegram.webhook_path,
+                secret_token=config.telegram.webhook_secret,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            await asyncio.Event().wait()
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        if receiver is not None:
+            await receiver.stop()
+        await importer.stop()
+        await refresher.stop()
+        await loop_lag.stop()
+        await stop_background_tasks()
+        await get_page_cache().close()
+        if runner is not None:
+            await runner.cleanup()
+        await outbox.stop()
+        await close_session()
+        await close_storage()
+        await asyncio.to_thread(set_tracer, None)
+        await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,28 @@
+from .metrics import REGISTRY, Counter, Gauge, Histogram, LoopLagMonitor, Registry
+from .tracing import Tracer, configure_tracing, get_tracer, set_tracer, span
+from .web import (
+    add_metrics_route,
+    add_traces_route,
+    create_monitoring_app,
+    install_runtime_gauges,
+    start_monitoring_server,
+)
+
+__all__ = [
+    "REGISTRY",
+    "Counter",
+    "Gauge",
+    "Histogram",
+    "Registry",
+    "LoopLagMonitor",
+    "Tracer",
+    "configure_tracing",
+    "get_tracer",
+    "set_tracer",
+    "span",
+    "add_metrics_route",
+    "add_traces_route",
+    "create_monitoring_app",
+    "install_runtime_gauges",
+    "start_monitoring_server",
+]
@@ -0,0 +1,290 @@
+import asyncio
+import bisect
+import math
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def labels(self, **labels: str) -> _CounterChild:
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _CounterChild()
+        return child
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_fmt(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help, labelnames)
+        self.func = func
+
+    def labels(self, **labels: str) -> _GaugeChild:
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _GaugeChild()
+        return child
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def render(self) -> List[str]:
+        if self.func is not None:
+            try:
+                return [f"{self.name} {_fmt(float(self.func()))}"]
+            except Exception:
+                return []
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_fmt(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, **labels: str) -> _HistogramChild:
+        key = self._key(labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            running = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                running += count
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {child.count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.get(name) or self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = (), func: Optional[Callable[[], float]] = None) -> Gauge:
+        existing = self._metrics.get(name)
+        if existing is not None and func is None:
+            return existing
+        return self.register(Gauge(name, help, labelnames, func))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._metrics.get(name) or self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            body = metric.render()
+            if body:
+                lines.extend(metric.header())
+                lines.extend(body)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.histogram(
+    "bot_handler_duration_seconds", "Time spent in a Telegram update handler", ["handler"]
+)
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "Handler calls that raised", ["handler"]
+)
+SPOTIFY_LATENCY = REGISTRY.histogram(
+    "spotify_request_duration_seconds", "Spotify Web API round trips", ["method", "endpoint", "status"]
+)
+SPOTIFY_RATE_LIMITED = REGISTRY.counter(
+    "spotify_rate_limited_total", "Spotify responses with status 429", ["endpoint"]
+)
+TOKEN_REFRESHES = REGISTRY.counter(
+    "spotify_token_refreshes_total", "Access token refreshes", ["result"]
+)
+TOKEN_REFRESH_LATENCY = REGISTRY.histogram(
+    "spotify_token_refresh_duration_seconds", "Time to refresh an access token"
+)
+OUTBOX_SENT = REGISTRY.counter(
+    "bot_outbox_sent_total", "Telegram send calls made by the outbox", ["result"]
+)
+OUTBOX_RETRY_AFTER = REGISTRY.counter(
+    "bot_outbox_retry_after_total", "Flood-wait responses from Telegram"
+)
+OUTBOX_MERGED = REGISTRY.counter(
+    "bot_outbox_merged_total", "Messages folded into a previous message to the same chat"
+)
+DUPLICATE_PRESSES = REGISTRY.counter(
+    "bot_duplicate_presses_total", "Repeated button presses dropped before reaching a handler"
+)
+SPOTIFY_QUEUE_WAIT = REGISTRY.histogram(
+    "spotify_queue_wait_seconds", "Time a Spotify call waited for a fair-share slot", ["work_class"]
+)
+UPDATES_REJECTED = REGISTRY.counter(
+    "bot_updates_rejected_total", "Webhook updates not taken: answered 503 or dropped by a worker", ["reason"]
+)
+LOOP_LAG = REGISTRY.histogram(
+    "bot_event_loop_lag_seconds", "Delay of scheduled callbacks on the event loop",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+_SPOTIFY_ID = re.compile(r"^[0-9A-Za-z]{22}$")
+# Top-level resources whose next path segment is a parameter, whatever it looks
+# like: user ids in particular are free-form, one label each would be unbounded.
+_ID_PARENTS = frozenset({
+    "users", "playlists", "tracks", "albums", "artists", "shows", "episodes",
+    "audiobooks", "chapters", "audio-features", "audio-analysis",
+})
+
+
+def endpoint_label(url: str) -> str:
+    """`https://api.spotify.com/v1/playlists/<id>/tracks?x=1` -> `/playlists/{id}/tracks`."""
+    path = url.split("?", 1)[0]
+    marker = path.find("/v1/")
+    path = path[marker + 3:] if marker >= 0 else path
+    parts = ["{id}" if _SPOTIFY_ID.match(part) else part for part in path.split("/")]
+    if len(parts) > 2 and parts[1] in _ID_PARENTS:
+        parts[2] = "{id}"
+    return "/".join(parts)
+
+
+class LoopLagMonitor:
+    """Schedules a sleep every `interval` seconds and records how late it wakes up."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last = max(loop.time() - started - self.interval, 0.0)
+            LOOP_LAG.observe(self.last)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
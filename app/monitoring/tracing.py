@@ -0,0 +1,179 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import Any, Deque, Dict, List, Optional
+
+# Children kept per span; a full library load would otherwise record every page.
+MAX_CHILDREN = 100
+
+
+class Span:
+    """One timed step of an update. Use as a context manager; `set` adds attributes."""
+
+    __slots__ = ("name", "attrs", "start", "end", "children", "dropped", "error", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.dropped = 0
+        self.error: Optional[str] = None
+        self._token: Optional[Token] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        _current.reset(self._token)
+
+    def as_dict(self, origin: float) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.end is not None else None,
+        }
+        if self.attrs:
+            data["attrs"] = self.attrs
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.as_dict(origin) for child in self.children]
+        if self.dropped:
+            data["dropped"] = self.dropped
+        return data
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def span(name: str, **attrs: Any):
+    """
+    A child of the current span, or a shared no-op outside a traced update.
+
+    With tracing off no update is traced, so this costs one context
+    variable lookup.
+    """
+    parent = _current.get()
+    if parent is None:
+        return NOOP_SPAN
+    child = Span(name, attrs)
+    if len(parent.children) < MAX_CHILDREN:
+        parent.children.append(child)
+    else:
+        parent.dropped += 1
+    return child
+
+
+class Tracer:
+    """
+    Keeps the span trees of updates that took at least `threshold`
+    seconds: the last `capacity` in memory, and every one as a JSON line
+    in `path` when it is set. The file is written by a background
+    thread, so a slow disk never stalls the event loop.
+    """
+
+    def __init__(self, threshold: float = 1.0, capacity: int = 200, path: str = ""):
+        self.threshold = threshold
+        self.path = path
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self.traced = 0
+        self.sampled = 0
+        self._lines: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    def start(self, name: str, **attrs: Any) -> Span:
+        """A root span; enter it around the update and pass it to `finish` afterwards."""
+        self.traced += 1
+        return Span(name, attrs)
+
+    def finish(self, root: Span) -> None:
+        if root.duration < self.threshold:
+            return
+        self.sampled += 1
+        record = root.as_dict(root.start)
+        record["at"] = time.time() - root.duration
+        self.recent.append(record)
+        if self.path:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write, name="trace-writer", daemon=True)
+                self._writer.start()
+            self._lines.put(record)
+
+    def _write(self) -> None:
+        while True:
+            record = self._lines.get()
+            if record is None:
+                return
+            with open(self.path, "a", encoding="utf-8") as fh:
+                # Whatever queued up meanwhile goes out with the same open.
+                while record is not None:
+                    fh.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                    try:
+                        record = self._lines.get_nowait()
+                    except queue.Empty:
+                        break
+            if record is None:
+                return
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write out what is queued and stop the writer thread."""
+        if self._writer is not None:
+            self._lines.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+
+    def slowest(self, limit: int = 20) -> List[Dict[str, Any]]:
+        return sorted(self.recent, key=lambda r: r["duration_ms"], reverse=True)[:limit]
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Optional[Tracer]:
+    """The active tracer, or None when tracing is off (the default)."""
+    return _tracer
+
+
+def set_tracer(tracer: Optional[Tracer]) -> None:
+    """Install `tracer`; the one it replaces writes out its queued traces first."""
+    global _tracer
+    if _tracer is not None and _tracer is not tracer:
+        _tracer.close()
+    _tracer = tracer
+
+
+def configure_tracing(config) -> Optional[Tracer]:
+    """Install a tracer from a `TracingConfig`; a zero threshold leaves tracing off."""
+    set_tracer(Tracer(config.threshold, config.capacity, config.path) if config.threshold > 0 else None)
+    return get_tracer()
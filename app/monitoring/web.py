@@ -0,0 +1,129 @@
+import hmac
+import json
+from typing import Callable, Optional
+
+from aiohttp import web
+
+from app.monitoring.metrics import REGISTRY, Registry
+from app.monitoring.tracing import get_tracer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _protected(handler: Callable, token: str) -> Callable:
+    """`handler` behind `Authorization: Bearer <token>`; with no token set it is not served at all."""
+
+    async def guarded(request: web.Request) -> web.StreamResponse:
+        if not token:
+            raise web.HTTPForbidden(text="set METRICS_TOKEN to enable this endpoint")
+        given = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(given.encode(), f"Bearer {token}".encode()):
+            raise web.HTTPUnauthorized(headers={"WWW-Authenticate": "Bearer"})
+        return await handler(request)
+
+    return guarded
+
+
+async def _metrics(request: web.Request) -> web.Response:
+    registry: Registry = request.app.get("metrics_registry", REGISTRY)
+    return web.Response(body=registry.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+
+def add_metrics_route(app: web.Application, token: str, path: str = "/metrics") -> None:
+    app.router.add_get(path, _protected(_metrics, token))
+
+
+async def _traces(request: web.Request) -> web.Response:
+    tracer = get_tracer()
+    if tracer is None:
+        raise web.HTTPNotFound(text="tracing is off (set TRACE_THRESHOLD)")
+    try:
+        limit = int(request.query.get("limit", "20"))
+    except ValueError:
+        raise web.HTTPBadRequest(text="limit must be an integer")
+    return web.json_response(
+        {"threshold": tracer.threshold, "traced": tracer.traced, "sampled": tracer.sampled, "slowest": tracer.slowest(limit)},
+        dumps=lambda obj: json.dumps(obj, ensure_ascii=False, default=str),
+    )
+
+
+def add_traces_route(app: web.Application, token: str, path: str = "/traces") -> None:
+    """Slowest recently sampled updates as JSON; `?limit=N` (default 20)."""
+    app.router.add_get(path, _protected(_traces, token))
+
+
+def create_monitoring_app(token: str) -> web.Application:
+    """A bare app with just `/metrics` and `/traces`, for processes that serve no other routes."""
+    app = web.Application()
+    add_metrics_route(app, token)
+    add_traces_route(app, token)
+    return app
+
+
+async def start_monitoring_server(host: str, port: int, token: str) -> web.AppRunner:
+    runner = web.AppRunner(create_monitoring_app(token))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    print(f"✅ Metrics for this process on http://{host}:{port}/metrics")
+    return runner
+
+
+def install_runtime_gauges(
+    registry: Registry = REGISTRY,
+    queue_depth: Optional[Callable[[], float]] = None,
+) -> None:
+    """Gauges read at scrape time from the caches, the storage backend and the update queue."""
+    from app.spotify.fairness import get_fair_scheduler
+    from app.spotify.http_cache import get_response_cache
+    from app.spotify.ratelimit import get_scheduler
+    from app.spotify.search_cache import get_search_cache
+    from app.storage import get_backend
+    from app.storage.memory import SESSIONS, TABLES
+
+    for key in ("entries", "bytes", "hits", "misses", "evictions", "coalesced"):
+        registry.gauge(
+            f"spotify_search_cache_{key}",
+            f"Search cache {key}",
+            func=lambda key=key: get_search_cache().stats()[key],
+        )
+    for key in ("entries", "bytes", "hits", "revalidated", "misses", "evictions", "coalesced"):
+        registry.gauge(
+            f"spotify_http_cache_{key}",
+            f"Conditional GET cache {key}",
+            func=lambda key=key: get_response_cache().stats()[key],
+        )
+    for name, table in TABLES.items():
+        registry.gauge(f"storage_{name}_rows", f"Rows of {name} held in memory", func=table.__len__)
+        if table.max_resident:
+            registry.gauge(
+                f"storage_{name}_evictions", f"Rows of {name} paged out", func=lambda table=table: table.evictions
+            )
+    for name, store in SESSIONS.items():
+        for key in ("entries", "bytes", "expired", "evictions"):
+            registry.gauge(
+                f"bot_session_{name}_{key}",
+                f"Session store {name}: {key}",
+                func=lambda store=store, key=key: store.stats()[key],
+            )
+    registry.gauge(
+        "storage_pending_writes",
+        "Rows waiting for the write-behind flush",
+        func=lambda: get_backend().pending if get_backend() is not None else 0,
+    )
+    registry.gauge(
+        "spotify_ratelimit_blocked_seconds",
+        "Remaining global cooldown after a 429",
+        func=lambda: get_scheduler().blocked_for,
+    )
+    registry.gauge(
+        "spotify_fair_queue_depth",
+        "Spotify calls waiting for a fair-share slot",
+        func=lambda: get_fair_scheduler().queued,
+    )
+    registry.gauge(
+        "spotify_fair_in_flight",
+        "Spotify calls holding a fair-share slot",
+        func=lambda: get_fair_scheduler().in_flight,
+    )
+    if queue_depth is not None:
+        registry.gauge("bot_update_queue_depth", "Webhook updates waiting for a free handler slot", func=queue_depth)
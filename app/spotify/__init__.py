@@ -1,4 +1,7 @@
 from .client import SpotifyUserClient, SpotifyAPIError
+from .http import init_session, get_session, close_session
+from .ratelimit import RateLimitScheduler, get_scheduler
+from .search_cache import SearchCache, get_search_cache
 from .oauth import (
     get_auth_url,
     set_token_callback,
@@ -9,6 +12,13 @@ from .oauth import (
 __all__ = [
     "SpotifyUserClient",
     "SpotifyAPIError",
+    "init_session",
+    "get_session",
+    "close_session",
+    "RateLimitScheduler",
+    "get_scheduler",
+    "SearchCache",
+    "get_search_cache",
     "get_auth_url",
     "set_token_callback",
     "start_oauth_server",
@@ -1,53 +1,175 @@
+import asyncio
+import json
 import time
-import requests
+from typing import Optional
+
+import aiohttp
+
+from app.monitoring.metrics import SPOTIFY_LATENCY, SPOTIFY_RATE_LIMITED, endpoint_label
+from app.monitoring.tracing import span
+from app.spotify.fairness import BACKGROUND, FairScheduler, current_class, get_fair_scheduler
+from app.spotify.http import get_session
+from app.spotify.http_cache import ResponseCache, get_response_cache
+from app.spotify.library import PAGE_CONCURRENCY, PAGE_SIZE, LibraryTrack, iter_items, iter_saved_items, peek_library
+from app.spotify.pages import get_page_cache
+from app.spotify.ratelimit import RETRY_STATUSES, RateLimitScheduler, get_scheduler
+from app.spotify.search_cache import get_search_cache
+
+API_BASE = "https://api.spotify.com/v1"
+PLAYLIST_BATCH = 100
 
 
 class SpotifyAPIError(Exception):
-    pass
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(f"Spotify API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def _parse_retry_after(headers) -> float:
+    try:
+        return max(float(headers.get("Retry-After", "1")), 0.0)
+    except ValueError:
+        return 1.0
+
+
+def _parse_body(status: int, body: str):
+    if status == 204 or not body:
+        return None
+    return json.loads(body)
 
 
 class SpotifyUserClient:
-    def __init__(self, access_token: str):
+    def __init__(
+        self,
+        access_token: str,
+        session: Optional[aiohttp.ClientSession] = None,
+        user_id: Optional[str] = None,
+        scheduler: Optional[RateLimitScheduler] = None,
+        bulk: bool = False,
+        cache: Optional[ResponseCache] = None,
+        fair: Optional[FairScheduler] = None,
+    ):
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json",
         }
+        self._session = session
+        self.user_id = user_id
+        self._scheduler = scheduler
+        # Bulk jobs (and any background work, see `_fetch`) pace themselves and
+        # draw only on the app-wide budget; the per-user bucket is sized for taps.
+        self.bulk = bulk
+        self._cache = cache
+        self._fair = fair
 
-    def _request(self, method: str, url: str, **kwargs):
-        response = requests.request(
-            method,
-            url,
-            headers=self.headers,
-            timeout=15,
-            **kwargs,
-        )
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return self._session or get_session()
+
+    @property
+    def scheduler(self) -> RateLimitScheduler:
+        return self._scheduler or get_scheduler()
+
+    @property
+    def fair(self) -> FairScheduler:
+        return self._fair or get_fair_scheduler()
+
+    @property
+    def cache(self) -> ResponseCache:
+        return self._cache if self._cache is not None else get_response_cache()
 
-        if response.status_code == 429:
-            retry_after = int(response.headers.get("Retry-After", "1"))
-            time.sleep(retry_after + 0.5)
-            response = requests.request(
-                method,
-                url,
-                headers=self.headers,
-                timeout=15,
-                **kwargs,
+    @property
+    def cache_owner(self) -> str:
+        return self.user_id or self.headers["Authorization"]
+
+    async def _send(self, method: str, url: str, headers: Optional[dict] = None, **kwargs):
+        headers = {**self.headers, **headers} if headers else self.headers
+        async with self.session.request(method, url, headers=headers, **kwargs) as response:
+            return response.status, response.headers, await response.text()
+
+    async def _fetch(self, method: str, url: str, endpoint: str, headers: Optional[dict] = None, **kwargs):
+        """One logical call: paced, retried on 429/5xx, raising on any other error status."""
+        scheduler = self.scheduler
+        fair = self.fair
+        work_class = BACKGROUND if self.bulk else current_class()
+        # Background work (library streams, prefetch) is already held to its share by
+        # the fair scheduler; it must not drain the user's bucket for their next tap.
+        user_key = None if work_class == BACKGROUND else self.user_id
+        attempt = 0
+        while True:
+            with span("spotify", method=method, endpoint=endpoint) as trace:
+                queued = time.perf_counter()
+                async with fair.slot(self.cache_owner, work_class):
+                    await scheduler.acquire(user_key)
+                    started = time.perf_counter()
+                    status, response_headers, body = await self._send(method, url, headers=headers, **kwargs)
+                trace.set(status=status, wait_ms=round((started - queued) * 1000, 2))
+            SPOTIFY_LATENCY.labels(method=method, endpoint=endpoint, status=status).observe(
+                time.perf_counter() - started
             )
+            if status == 429:
+                SPOTIFY_RATE_LIMITED.labels(endpoint=endpoint).inc()
+
+            if status not in RETRY_STATUSES or attempt >= scheduler.max_retries:
+                break
+
+            if status == 429:
+                retry_after = _parse_retry_after(response_headers)
+                if retry_after > scheduler.max_retry_after:
+                    break
+                scheduler.throttle(scheduler.retry_delay(attempt, retry_after))
+            else:
+                await asyncio.sleep(scheduler.retry_delay(attempt))
+            attempt += 1
+
+        if status >= 400:
+            raise SpotifyAPIError(status, body)
+        return status, response_headers, body
 
-        response.raise_for_status()
+    async def _request(self, method: str, url: str, **kwargs):
+        endpoint = endpoint_label(url)
+        cache = self.cache
+        if method != "GET":
+            status, _, body = await self._fetch(method, url, endpoint, **kwargs)
+            cache.invalidate(self.cache_owner, url)
+            return _parse_body(status, body)
 
-        if response.status_code == 204 or not response.text:
-            return None
+        params = kwargs.get("params")
+        key = cache.key(self.cache_owner, endpoint, url, params)
+        cacheable = cache.cacheable(endpoint, params)
+        entry = cache.lookup(key) if cacheable else None
+        if entry is not None and cache.fresh(entry):
+            cache.hits += 1
+            return cache.read(entry)
 
-        return response.json()
+        async def fetch():
+            conditional = None
+            if entry is not None and entry.etag:
+                conditional = {"If-None-Match": entry.etag}
+            elif cacheable:
+                cache.misses += 1
+            status, headers, body = await self._fetch(method, url, endpoint, conditional, **kwargs)
+            if status == 304 and entry is not None:
+                return cache.refresh(entry, endpoint, headers)
+            # A write that landed meanwhile has already released this key.
+            if status == 200 and cacheable and cache.inflight.leads(key):
+                cache.store(key, endpoint, url, headers, body)
+            return _parse_body(status, body)
 
+        # The same user asking for the same thing twice (a double tap) shares one call.
+        return await cache.inflight.run(key, fetch)
 
-    def get_me(self):
-        return self._request("GET", "https://api.spotify.com/v1/me")
+    async def get_me(self):
+        return await self._request("GET", f"{API_BASE}/me")
 
-    def search_track_full(self, query: str):
-        data = self._request(
+    async def search_track_full(self, query: str):
+        return await get_search_cache().get_or_fetch(query, lambda: self._search_track(query))
+
+    async def _search_track(self, query: str):
+        data = await self._request(
             "GET",
-            "https://api.spotify.com/v1/search",
+            f"{API_BASE}/search",
             params={
                 "q": query,
                 "type": "track",
@@ -57,36 +179,119 @@ class SpotifyUserClient:
         items = data.get("tracks", {}).get("items", []) if data else []
         return items[0] if items else None
 
-    def is_track_saved(self, track_id: str) -> bool:
-        result = self._request(
-            "GET",
-            "https://api.spotify.com/v1/me/tracks/contains",
-            params={"ids": track_id},
-        )
+    async def contains_tracks(self, ids: list[str]) -> list[bool]:
+        flags: list[bool] = []
+        for i in range(0, len(ids), 50):
+            result = await self._request(
+                "GET",
+                f"{API_BASE}/me/tracks/contains",
+                params={"ids": ",".join(ids[i:i + 50])},
+            )
+            flags.extend(bool(x) for x in (result or []))
+        return flags
+
+    async def is_track_saved(self, track_id: str) -> bool:
+        result = await self.contains_tracks([track_id])
         return bool(result and result[0])
 
-    def save_tracks(self, ids: list[str]):
+    async def save_tracks(self, ids: list[str], tracks: Optional[list[dict]] = None):
+        """Save `ids`; pass the full track objects as `tracks` to update the local library."""
         for i in range(0, len(ids), 50):
-            self._request(
+            await self._request(
                 "PUT",
-                "https://api.spotify.com/v1/me/tracks",
+                f"{API_BASE}/me/tracks",
                 json={"ids": ids[i:i + 50]},
             )
 
-    def remove_saved_tracks(self, ids: list[str]):
+        get_page_cache().invalidate(self.user_id)
+        library = peek_library(self.user_id)
+        if library is not None:
+            if tracks is not None:
+                library.add(LibraryTrack.from_track(t) for t in tracks)
+            else:
+                library.mark_stale()
+
+    async def remove_saved_tracks(self, ids: list[str]):
         for i in range(0, len(ids), 50):
-            self._request(
+            await self._request(
                 "DELETE",
-                "https://api.spotify.com/v1/me/tracks",
+                f"{API_BASE}/me/tracks",
                 json={"ids": ids[i:i + 50]},
             )
 
-    def get_saved_tracks(self, limit: int = 20, offset: int = 0):
-        return self._request(
+        get_page_cache().invalidate(self.user_id)
+        library = peek_library(self.user_id)
+        if library is not None:
+            library.remove(ids)
+
+    async def get_saved_tracks(self, limit: int = 20, offset: int = 0):
+        return await self._request(
+            "GET",
+            f"{API_BASE}/me/tracks",
+            params={
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+
+    def iter_saved_tracks(self, page_size: int = PAGE_SIZE, concurrency: int = PAGE_CONCURRENCY):
+        """Async iterator over every saved-track item, newest first, pages fetched in parallel."""
+        return iter_saved_items(self, page_size, concurrency)
+
+    async def create_playlist(self, spotify_user_id: str, name: str, public: bool = False, description: str = ""):
+        return await self._request(
+            "POST",
+            f"{API_BASE}/users/{spotify_user_id}/playlists",
+            json={"name": name, "public": public, "description": description},
+        )
+
+    async def get_playlist_snapshot(self, playlist_id: str) -> str:
+        data = await self._request(
+            "GET",
+            f"{API_BASE}/playlists/{playlist_id}",
+            params={"fields": "snapshot_id"},
+        )
+        return data["snapshot_id"]
+
+    async def get_playlist_items(self, playlist_id: str, limit: int = PLAYLIST_BATCH, offset: int = 0):
+        return await self._request(
             "GET",
-            "https://api.spotify.com/v1/me/tracks",
+            f"{API_BASE}/playlists/{playlist_id}/tracks",
             params={
                 "limit": limit,
                 "offset": offset,
+                "fields": "items(track(id)),total",
             },
         )
+
+    def iter_playlist_items(self, playlist_id: str, concurrency: int = PAGE_CONCURRENCY):
+        """Async iterator over every playlist item in playlist order, pages fetched in parallel."""
+        return iter_items(
+            lambda limit, offset: self.get_playlist_items(playlist_id, limit=limit, offset=offset),
+            PLAYLIST_BATCH,
+            concurrency,
+        )
+
+    async def add_playlist_items(self, playlist_id: str, ids: list[str], position: Optional[int] = None) -> Optional[str]:
+        """Add tracks in batches of 100, starting at `position` (end if None); returns the new snapshot id."""
+        snapshot = None
+        for i in range(0, len(ids), PLAYLIST_BATCH):
+            body = {"uris": [f"spotify:track:{tid}" for tid in ids[i:i + PLAYLIST_BATCH]]}
+            if position is not None:
+                body["position"] = position + i
+            result = await self._request("POST", f"{API_BASE}/playlists/{playlist_id}/tracks", json=body)
+            snapshot = (result or {}).get("snapshot_id", snapshot)
+        return snapshot
+
+    async def remove_playlist_items(
+        self, playlist_id: str, ids: list[str], snapshot_id: Optional[str] = None
+    ) -> Optional[str]:
+        """Remove every occurrence of the tracks, 100 per request; returns the new snapshot id."""
+        snapshot = snapshot_id
+        for i in range(0, len(ids), PLAYLIST_BATCH):
+            body = {"tracks": [{"uri": f"spotify:track:{tid}"} for tid in ids[i:i + PLAYLIST_BATCH]]}
+            if snapshot is not None:
+                body["snapshot_id"] = snapshot
+            result = await self._request("DELETE", f"{API_BASE}/playlists/{playlist_id}/tracks", json=body)
+            snapshot = (result or {}).get("snapshot_id", snapshot)
+        return snapshot
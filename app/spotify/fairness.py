@@ -0,0 +1,178 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from app.monitoring.metrics import SPOTIFY_QUEUE_WAIT
+
+# Work classes; a user's interactive flow gets `weight` times the share of a background one.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+CLASS_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+DEFAULT_WEIGHTS = {INTERACTIVE: 4.0, BACKGROUND: 1.0}
+
+_work_class: ContextVar[int] = ContextVar("spotify_work_class", default=INTERACTIVE)
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Spotify calls made inside (and in tasks started inside) queue as background work."""
+    token = _work_class.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _work_class.reset(token)
+
+
+def current_class() -> int:
+    return _work_class.get()
+
+
+class _Waiter:
+    __slots__ = ("user", "work_class", "future")
+
+    def __init__(self, user: str, work_class: int, future: asyncio.Future):
+        self.user = user
+        self.work_class = work_class
+        self.future = future
+
+
+class FairScheduler:
+    """
+    Admission control for Spotify calls: at most `max_in_flight` at once,
+    at most `per_user` of them for any one user.
+
+    When calls have to queue, they are served by start-time fair queuing
+    over (user, class) flows. A flow's next call is tagged one
+    `1 / weight` step after its previous one, or at the current virtual
+    time if the flow was idle. A user with a thousand queued calls thus
+    takes turns with a user who just pressed a button, rather than
+    going first.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 32,
+        per_user: int = 4,
+        weights: Optional[Dict[int, float]] = None,
+    ):
+        self.max_in_flight = max_in_flight
+        self.per_user = per_user
+        self.weights = DEFAULT_WEIGHTS if weights is None else weights
+        self._heap: List[Tuple[float, int, _Waiter]] = []
+        self._seq = itertools.count()
+        self._finish: Dict[Tuple[str, int], float] = {}
+        self._running: Dict[str, int] = {}
+        # Waiters of users at their cap, set aside until one of their calls finishes.
+        self._parked: Dict[str, List[Tuple[float, int, _Waiter]]] = {}
+        self._virtual = 0.0
+        self.in_flight = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._heap) + sum(len(items) for items in self._parked.values())
+
+    def _tag(self, user: str, work_class: int) -> float:
+        flow = (user, work_class)
+        start = max(self._virtual, self._finish.get(flow, 0.0))
+        self._finish[flow] = start + 1.0 / self.weights.get(work_class, 1.0)
+        return start
+
+    def _can_run(self, user: str) -> bool:
+        return self.in_flight < self.max_in_flight and self._running.get(user, 0) < self.per_user
+
+    def _grant(self, user: str) -> None:
+        self.in_flight += 1
+        self._running[user] = self._running.get(user, 0) + 1
+
+    async def acquire(self, user: str, work_class: int = INTERACTIVE) -> None:
+        tag = self._tag(user, work_class)
+        if not self._heap and user not in self._parked and self._can_run(user):
+            self._virtual = tag
+            self._grant(user)
+            return
+
+        waiter = _Waiter(user, work_class, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, (tag, next(self._seq), waiter))
+        # Everyone ahead may be at their per-user cap, leaving room for us.
+        self._dispatch()
+        if waiter.future.done():
+            return
+        started = time.perf_counter()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as we were cancelled: hand the slot on.
+                self.release(user)
+            raise
+        finally:
+            SPOTIFY_QUEUE_WAIT.labels(work_class=CLASS_NAMES.get(work_class, "other")).observe(
+                time.perf_counter() - started
+            )
+
+    def release(self, user: str) -> None:
+        self.in_flight -= 1
+        left = self._running[user] - 1
+        if left:
+            self._running[user] = left
+        else:
+            del self._running[user]
+        self._unpark(user)
+        self._dispatch()
+
+    def _unpark(self, user: str) -> None:
+        """A slot of `user`'s freed up: put their next live parked call back in line."""
+        parked = self._parked.get(user)
+        while parked:
+            item = heapq.heappop(parked)
+            if not item[2].future.done():
+                heapq.heappush(self._heap, item)
+                break
+        if parked is not None and not parked:
+            del self._parked[user]
+
+    def _dispatch(self) -> None:
+        while self._heap and self.in_flight < self.max_in_flight:
+            item = heapq.heappop(self._heap)
+            tag, _, waiter = item
+            if waiter.future.done():
+                # Cancelled while queued; if it was holding the user's turn, pass it on.
+                self._unpark(waiter.user)
+                continue
+            if self._running.get(waiter.user, 0) >= self.per_user:
+                heapq.heappush(self._parked.setdefault(waiter.user, []), item)
+                continue
+            self._virtual = tag
+            self._grant(waiter.user)
+            waiter.future.set_result(None)
+        if not self._heap and not self._parked and not self.in_flight:
+            # Idle: nothing to be fair about, forget the per-flow history.
+            self._finish.clear()
+
+    @asynccontextmanager
+    async def slot(self, user: str, work_class: Optional[int] = None) -> AsyncIterator[None]:
+        await self.acquire(user, current_class() if work_class is None else work_class)
+        try:
+            yield
+        finally:
+            self.release(user)
+
+
+_scheduler: Optional[FairScheduler] = None
+
+
+def get_fair_scheduler() -> FairScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = FairScheduler()
+    return _scheduler
+
+
+def set_fair_scheduler(scheduler: Optional[FairScheduler]) -> None:
+    global _scheduler
+    _scheduler = scheduler
@@ -0,0 +1,106 @@
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, Optional, Set, Tuple
+
+from app.spotify.search_cache import normalize_query
+
+# Dice coefficient over trigram sets; 0.9 still tolerates a typo or a missing "the",
+# but also "Night" for "Nights", so a match above it is a candidate, not proof.
+MATCH_THRESHOLD = 0.9
+
+# A short suffix barely moves the score but names a different recording.
+VERSION_WORDS = frozenset({
+    "live", "remix", "mix", "edit", "acoustic", "instrumental", "remaster", "remastered",
+    "version", "demo", "cover", "karaoke", "radio", "extended", "sped", "slowed",
+    "ремикс", "акустика", "версия", "кавер",
+})
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Per-word padded trigrams, so word order ("Song Artist" vs "Artist - Song") does not matter."""
+    grams: Set[str] = set()
+    for word in normalize_query(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def _version_words(text: str) -> FrozenSet[str]:
+    return frozenset(normalize_query(text).split()) & VERSION_WORDS
+
+
+def word_key(text: str) -> Tuple[str, ...]:
+    """Normalized words in sorted order: equal for "Artist - Title" and "title, artist"."""
+    return tuple(sorted(normalize_query(text).split()))
+
+
+class TrigramIndex:
+    """Inverted trigram index over "artist title" of a user's saved tracks."""
+
+    def __init__(self):
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._grams: Dict[str, FrozenSet[str]] = {}
+        self._versions: Dict[str, FrozenSet[str]] = {}
+        self._keys: Dict[str, Tuple[str, ...]] = {}
+        self._by_key: Dict[Tuple[str, ...], Set[str]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def add(self, track_id: str, text: str) -> None:
+        if track_id in self._grams:
+            self.remove([track_id])
+        grams = trigrams(text)
+        self._grams[track_id] = grams
+        self._versions[track_id] = _version_words(text)
+        key = self._keys[track_id] = word_key(text)
+        self._by_key[key].add(track_id)
+        for gram in grams:
+            self._postings[gram].add(track_id)
+
+    def remove(self, track_ids: Iterable[str]) -> None:
+        for track_id in track_ids:
+            grams = self._grams.pop(track_id, None)
+            if grams is None:
+                continue
+            del self._versions[track_id]
+            key = self._keys.pop(track_id)
+            ids = self._by_key[key]
+            ids.discard(track_id)
+            if not ids:
+                del self._by_key[key]
+            for gram in grams:
+                ids = self._postings.get(gram)
+                if ids is not None:
+                    ids.discard(track_id)
+                    if not ids:
+                        del self._postings[gram]
+
+    def best(self, query: str) -> Optional[Tuple[str, float]]:
+        """Closest track and its Dice score, or None if no trigram is shared."""
+        grams = trigrams(query)
+        if not grams:
+            return None
+        overlap: Dict[str, int] = defaultdict(int)
+        for gram in grams:
+            for track_id in self._postings.get(gram, ()):
+                overlap[track_id] += 1
+        if not overlap:
+            return None
+        track_id, score = max(
+            ((tid, 2 * n / (len(grams) + len(self._grams[tid]))) for tid, n in overlap.items()),
+            key=lambda pair: pair[1],
+        )
+        return track_id, score
+
+    def exact(self, query: str) -> Optional[str]:
+        """A track whose artist and title are exactly the words of `query`, in any order."""
+        ids = self._by_key.get(word_key(query))
+        return next(iter(ids)) if ids else None
+
+    def match(self, query: str, threshold: float = MATCH_THRESHOLD) -> Optional[str]:
+        best = self.best(query)
+        if best is None or best[1] < threshold:
+            return None
+        if _version_words(query) != self._versions[best[0]]:
+            return None
+        return best[0]
@@ -0,0 +1,40 @@
+from typing import Optional
+
+import aiohttp
+
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=15)
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def _create_session(limit: int = 100, limit_per_host: int = 50) -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=60,
+        ttl_dns_cache=300,
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=DEFAULT_TIMEOUT)
+
+
+async def init_session(limit: int = 100, limit_per_host: int = 50) -> aiohttp.ClientSession:
+    """Create the process-wide keep-alive session. Call once at startup."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session(limit=limit, limit_per_host=limit_per_host)
+    return _session
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared session, creating it lazily if startup did not."""
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
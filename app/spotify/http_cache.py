@@ -0,0 +1,212 @@
+import json
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set
+from urllib.parse import urlencode
+
+from app.spotify.singleflight import SingleFlight
+
+# The endpoints that are cached, and for how many seconds a response is
+# served without asking Spotify at all; after that it is revalidated with
+# its ETag. Library contents change behind the bot's back, so they are
+# always revalidated. Searches are not cached here: the search cache in
+# front keeps a compact copy of the one track it needs.
+DEFAULT_TTLS: Dict[str, float] = {
+    "/me": 600.0,
+    "/me/tracks": 0.0,
+    "/me/tracks/contains": 0.0,
+    "/playlists/{id}": 0.0,
+    "/playlists/{id}/tracks": 0.0,
+}
+
+# Paged endpoints: only the first page is kept. Later offsets are read by
+# full-library streams, which must not leave the whole library in here.
+PAGED_ENDPOINTS = frozenset({"/me/tracks", "/playlists/{id}/tracks"})
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+def write_scope(path: str) -> str:
+    """`/me/tracks/contains` -> `/me/tracks`, `/playlists/<id>/tracks` -> `/playlists/<id>`."""
+    return "/".join(path.split("/")[:3])
+
+
+def _path(url: str) -> str:
+    return url.split("?", 1)[0].split("/v1", 1)[-1]
+
+
+class _Entry:
+    __slots__ = ("owner", "path", "body", "etag", "expires_at", "size")
+
+    def __init__(self, owner: str, path: str, body: str, etag: Optional[str], expires_at: float, size: int):
+        self.owner = owner
+        self.path = path
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+        self.size = size
+
+
+class ResponseCache:
+    """
+    Conditional-request cache for Spotify GETs, keyed per user.
+
+    Within the endpoint's TTL a stored response is served without a
+    request; after it the request carries `If-None-Match` and a 304 reuses
+    the stored copy. Bodies are kept as received and parsed on each hit,
+    so `max_bytes` bounds what is actually held. A successful write drops
+    the user's entries under the same resource (`/me/tracks`,
+    `/playlists/<id>`). Least recently used entries go first once
+    `max_bytes` is exceeded.
+
+    `inflight` holds the pending call per key, so identical concurrent
+    GETs from one user share a single request.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        max_bytes: int = 16 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._owned: Dict[str, Set[str]] = {}
+        self.inflight = SingleFlight()
+        self.bytes = 0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def coalesced(self) -> int:
+        return self.inflight.coalesced
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cacheable(self, endpoint: str, params: Optional[dict] = None) -> bool:
+        if endpoint not in self.ttls:
+            return False
+        return endpoint not in PAGED_ENDPOINTS or not (params and params.get("offset"))
+
+    def key(self, owner: str, endpoint: str, url: str, params: Optional[dict] = None) -> str:
+        query = urlencode(sorted(params.items())) if params else ""
+        return f"{owner}\x00{url}?{query}"
+
+    def lookup(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def fresh(self, entry: _Entry) -> bool:
+        return entry.expires_at > self._clock()
+
+    def _ttl(self, endpoint: str, headers) -> Optional[float]:
+        """None when the response must not be stored."""
+        control = (headers.get("Cache-Control") or "").lower()
+        if "no-store" in control:
+            return None
+        ttl = self.ttls.get(endpoint)
+        if ttl is None:
+            match = _MAX_AGE.search(control)
+            ttl = float(match.group(1)) if match else 0.0
+        return ttl
+
+    def read(self, entry: _Entry) -> Any:
+        return json.loads(entry.body)
+
+    def store(self, key: str, endpoint: str, url: str, headers, body: str) -> None:
+        ttl = self._ttl(endpoint, headers)
+        etag = headers.get("ETag")
+        size = sys.getsizeof(key) + sys.getsizeof(body)
+        if ttl is None or (not ttl and not etag) or not body or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        owner = key.split("\x00", 1)[0]
+        self._entries[key] = _Entry(owner, _path(url), body, etag, self._clock() + ttl, size)
+        self._owned.setdefault(owner, set()).add(key)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def refresh(self, entry: _Entry, endpoint: str, headers) -> Any:
+        """A 304 for `entry`: extend its lifetime and hand out the stored copy."""
+        self.revalidated += 1
+        ttl = self._ttl(endpoint, headers)
+        entry.expires_at = self._clock() + (ttl or 0.0)
+        entry.etag = headers.get("ETag") or entry.etag
+        return self.read(entry)
+
+    def forget(self, owner: str) -> None:
+        """Drop everything cached for `owner`, e.g. after they connected another account."""
+        for key in list(self._owned.get(owner, ())):
+            self._drop(key)
+        prefix = f"{owner}\x00"
+        for key in self.inflight:
+            if key.startswith(prefix):
+                self.inflight.discard(key)
+
+    def invalidate(self, owner: str, path: str) -> None:
+        """Forget `owner`'s responses under the resource that `path` writes to."""
+        scope = write_scope(_path(path))
+
+        def affected(entry_path: str) -> bool:
+            return entry_path == scope or entry_path.startswith(scope + "/")
+
+        for key in list(self._owned.get(owner, ())):
+            if affected(self._entries[key].path):
+                self._drop(key)
+        # Reads already on the wire may predate the write: later callers start afresh.
+        prefix = f"{owner}\x00"
+        for key in self.inflight:
+            if key.startswith(prefix) and affected(_path(key[len(prefix):])):
+                self.inflight.discard(key)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        owned = self._owned[entry.owner]
+        owned.discard(key)
+        if not owned:
+            del self._owned[entry.owner]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._owned.clear()
+        self.inflight.clear()
+        self.bytes = 0
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]) -> None:
+    global _cache
+    _cache = cache
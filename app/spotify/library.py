@@ -0,0 +1,328 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional
+
+from app.spotify.fairness import background
+from app.spotify.fuzzy import MATCH_THRESHOLD, TrigramIndex
+
+PAGE_SIZE = 50
+PAGE_CONCURRENCY = 8
+
+# Indexes kept in memory; the least recently used, or any idle this long, are dropped and reloaded on demand.
+MAX_LIBRARIES = 2_000
+LIBRARY_IDLE_TTL = 6 * 3600.0
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@dataclass(slots=True)
+class LibraryTrack:
+    """
+    One saved track, kept for every track of every loaded library.
+
+    `artist_names` is left empty for a single artist (readers fall back to
+    `(artist,)`), so the common case carries one tuple, not two.
+    """
+
+    id: str
+    title: str
+    artist: str
+    added_at: str
+    artist_ids: tuple = field(default_factory=tuple)
+    duration_ms: int = 0
+    artist_names: tuple = field(default_factory=tuple)
+
+    @classmethod
+    def from_track(cls, track: dict, added_at: Optional[str] = None) -> "LibraryTrack":
+        artists = track.get("artists", [])
+        names = tuple(a["name"] for a in artists)
+        return cls(
+            id=track["id"],
+            title=track.get("name", ""),
+            artist=", ".join(names),
+            added_at=added_at or _utc_now_iso(),
+            artist_ids=tuple(a.get("id") or a["name"] for a in artists),
+            duration_ms=int(track.get("duration_ms") or 0),
+            artist_names=names if len(names) > 1 else (),
+        )
+
+    @classmethod
+    def from_item(cls, item: dict) -> "LibraryTrack":
+        """Build from a `/me/tracks` item (`{"added_at": ..., "track": {...}}`)."""
+        return cls.from_track(item["track"], item.get("added_at"))
+
+    @property
+    def search_text(self) -> str:
+        return f"{self.artist} {self.title}"
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "title": self.title, "artist": self.artist}
+
+
+async def iter_items(
+    fetch: Callable[[int, int], Awaitable[Optional[dict]]],
+    page_size: int = PAGE_SIZE,
+    concurrency: int = PAGE_CONCURRENCY,
+) -> AsyncIterator[dict]:
+    """
+    Stream every item of a paged Spotify collection; `fetch(limit, offset)`
+    returns one page.
+
+    The first page gives `total`; the remaining offsets are fetched with
+    at most `concurrency` requests in flight and yielded in offset order,
+    each page released as soon as its items have been handed out.
+
+    Pages are fetched as background work, even when an interactive handler
+    walks the collection, so a long stream does not use up the user's
+    per-user allowance.
+    """
+
+    async def fetch_page(limit: int, offset: int) -> Optional[dict]:
+        with background():
+            return await fetch(limit, offset)
+
+    first = await fetch_page(page_size, 0)
+    if not first:
+        return
+    total = first.get("total", 0)
+    items = first.get("items", [])
+    offsets = iter(range(len(items), total, page_size)) if items else iter(())
+    del first
+
+    pending: Deque[asyncio.Task] = deque()
+
+    def schedule() -> None:
+        offset = next(offsets, None)
+        if offset is not None:
+            pending.append(asyncio.ensure_future(fetch_page(page_size, offset)))
+
+    for _ in range(max(concurrency, 1)):
+        schedule()
+    try:
+        for item in items:
+            yield item
+        while pending:
+            page = await pending.popleft()
+            schedule()
+            items = page.get("items", []) if page else []
+            del page
+            for item in items:
+                yield item
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def iter_saved_items(
+    client,
+    page_size: int = PAGE_SIZE,
+    concurrency: int = PAGE_CONCURRENCY,
+) -> AsyncIterator[dict]:
+    """Stream every `/me/tracks` item, newest first."""
+    return iter_items(
+        lambda limit, offset: client.get_saved_tracks(limit=limit, offset=offset), page_size, concurrency
+    )
+
+
+class LibraryIndex:
+    """
+    Local mirror of one user's saved tracks, ordered by `added_at`.
+
+    The first `sync()` walks the whole library; later ones fetch only the
+    newest pages until they reach a track that is already known. Tracks
+    saved or removed through the bot are applied directly.
+
+    `generation` changes whenever tracks are removed or reordered, so
+    consumers that mirror the order can tell a pure append from a rewrite.
+    """
+
+    def __init__(self, min_sync_interval: float = 60.0):
+        self.min_sync_interval = min_sync_interval
+        self._tracks: Dict[str, LibraryTrack] = {}
+        self._order: List[str] = []
+        self._lock = asyncio.Lock()
+        self.loaded = False
+        self.stale = False
+        self.synced_at = 0.0
+        self.generation = 0
+        self.used_at = time.monotonic()
+        self._fuzzy: Optional[TrigramIndex] = None
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, track_id: str) -> bool:
+        return track_id in self._tracks
+
+    def __iter__(self) -> Iterator[LibraryTrack]:
+        """Oldest to newest."""
+        return (self._tracks[tid] for tid in self._order)
+
+    def get(self, track_id: str) -> Optional[LibraryTrack]:
+        return self._tracks.get(track_id)
+
+    def latest(self, n: int) -> List[LibraryTrack]:
+        """Newest `n` tracks, newest first."""
+        return self.page(0, n)
+
+    def page(self, offset: int, limit: int) -> List[LibraryTrack]:
+        """Newest-first slice, same paging as `/me/tracks`."""
+        end = len(self._order) - offset
+        start = max(end - limit, 0)
+        if end <= 0:
+            return []
+        return [self._tracks[tid] for tid in reversed(self._order[start:end])]
+
+    @property
+    def fresh(self) -> bool:
+        return (
+            self.loaded
+            and not self.stale
+            and time.monotonic() - self.synced_at < self.min_sync_interval
+        )
+
+    def add(self, tracks: Iterable[LibraryTrack]) -> None:
+        """Append tracks that were just saved (oldest first)."""
+        for tr in tracks:
+            if tr.id in self._tracks:
+                self._order.remove(tr.id)
+                self.generation += 1
+            self._tracks[tr.id] = tr
+            self._order.append(tr.id)
+            if self._fuzzy is not None:
+                self._fuzzy.add(tr.id, tr.search_text)
+
+    def remove(self, ids: Iterable[str]) -> None:
+        gone = {tid for tid in ids if tid in self._tracks}
+        if not gone:
+            return
+        for tid in gone:
+            del self._tracks[tid]
+        self._order = [tid for tid in self._order if tid not in gone]
+        self.generation += 1
+        if self._fuzzy is not None:
+            self._fuzzy.remove(gone)
+
+    def mark_stale(self) -> None:
+        self.stale = True
+
+    def clear(self) -> None:
+        self._tracks.clear()
+        self._order.clear()
+        self.loaded = False
+        self.generation += 1
+        self._fuzzy = None
+
+    def _index(self) -> TrigramIndex:
+        if self._fuzzy is None:
+            # Built on first use and kept in step with add/remove from then on.
+            self._fuzzy = TrigramIndex()
+            for tr in self._tracks.values():
+                self._fuzzy.add(tr.id, tr.search_text)
+        return self._fuzzy
+
+    def find(self, query: str, threshold: float = MATCH_THRESHOLD) -> Optional[LibraryTrack]:
+        """Saved track closest to `query` (free text, e.g. "artist - title"), if it is close enough."""
+        track_id = self._index().match(query, threshold)
+        return self._tracks.get(track_id) if track_id else None
+
+    def find_exact(self, query: str) -> Optional[LibraryTrack]:
+        """Saved track whose artist and title are exactly the words of `query` (case, punctuation and order aside)."""
+        track_id = self._index().exact(query)
+        return self._tracks.get(track_id) if track_id else None
+
+    def since(self, count: int) -> List[LibraryTrack]:
+        """Tracks after the first `count` in oldest-to-newest order."""
+        return [self._tracks[tid] for tid in self._order[count:]]
+
+    async def sync(self, client, force: bool = False) -> None:
+        if self.fresh and not force:
+            return
+        async with self._lock:
+            # Someone else may have synced while we were waiting for the lock.
+            if self.fresh and not force:
+                return
+            if not self.loaded:
+                await self._load(client)
+            else:
+                await self._sync_newest(client)
+            self.stale = False
+            self.synced_at = time.monotonic()
+
+    async def _load(self, client) -> None:
+        newest_first: List[LibraryTrack] = []
+        # A full load is dozens of pages: let other users' taps go between them.
+        with background():
+            async for item in iter_saved_items(client):
+                if item.get("track"):
+                    newest_first.append(LibraryTrack.from_item(item))
+
+        self.clear()
+        self.add(reversed(newest_first))
+        self.loaded = True
+
+    async def _sync_newest(self, client) -> None:
+        fresh: List[LibraryTrack] = []
+        offset = 0
+        remote_total = len(self)
+        while True:
+            page = await client.get_saved_tracks(limit=PAGE_SIZE, offset=offset)
+            items = page.get("items", []) if page else []
+            remote_total = page.get("total", 0) if page else 0
+            reached_known = False
+            for item in items:
+                track = item.get("track")
+                if not track:
+                    continue
+                if track["id"] in self._tracks:
+                    reached_known = True
+                    break
+                fresh.append(LibraryTrack.from_item(item))
+            if reached_known or len(items) < PAGE_SIZE:
+                break
+            offset += len(items)
+
+        self.add(reversed(fresh))
+
+        # Tracks were removed (or re-ordered) outside the bot: start over.
+        if remote_total != len(self):
+            await self._load(client)
+
+
+_LIBRARIES: "OrderedDict[str, LibraryIndex]" = OrderedDict()
+
+
+def _use(tg: str, library: LibraryIndex) -> LibraryIndex:
+    now = time.monotonic()
+    library.used_at = now
+    _LIBRARIES.move_to_end(tg)
+    while len(_LIBRARIES) > MAX_LIBRARIES or _LIBRARIES and now - next(iter(_LIBRARIES.values())).used_at > LIBRARY_IDLE_TTL:
+        _LIBRARIES.popitem(last=False)
+    return library
+
+
+def get_library(tg: str) -> LibraryIndex:
+    """The user's index, created empty (to be `sync`ed) if it is not in memory."""
+    tg = str(tg)
+    library = _LIBRARIES.get(tg)
+    if library is None:
+        library = _LIBRARIES[tg] = LibraryIndex()
+    return _use(tg, library)
+
+
+def peek_library(tg: Optional[str]) -> Optional[LibraryIndex]:
+    """Return the user's index only if it has already been loaded."""
+    if tg is None:
+        return None
+    tg = str(tg)
+    library = _LIBRARIES.get(tg)
+    return _use(tg, library) if library is not None and library.loaded else None
+
+
+def drop_library(tg: str) -> None:
+    _LIBRARIES.pop(str(tg), None)
@@ -1,24 +1,30 @@
 import base64
 import time
-import requests
 import asyncio
 from urllib.parse import quote
+import aiohttp
 from aiohttp import web
-from aiogram import Bot
-from typing import Callable, Optional, Dict, Any
+from typing import Awaitable, Callable, Optional, Dict, Any
 try:
     from app.config import load_config
 except Exception:
     load_config = None
-try:
-    from app.storage import memory as storage
-except Exception:
-    try:
-        import app.storage.memory as storage  # type: ignore
-    except Exception:
-        storage = None  # type: ignore
 
-_LOCAL_STORE: Dict[str, Dict[str, Any]] = {}
+from app.monitoring.tracing import span
+from app.monitoring.web import add_metrics_route, add_traces_route
+from app.spotify.client import SpotifyUserClient
+from app.spotify.http import get_session
+from app.spotify.http_cache import get_response_cache
+from app.spotify.library import drop_library, get_library
+from app.spotify.refresh import RefreshRevoked, TokenRefresher
+from app.storage.memory import USER_SPOTIFY
+
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+TOKEN_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+_config = None
+
+_background_tasks: set = set()
 
 _on_token_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None
 
@@ -30,14 +36,11 @@ def set_token_callback(func: Callable[[str, Dict[str, Any]], None]) -> None:
 
 
 def _store_token_local(tg: str, token_data: Dict[str, Any]) -> None:
-    """Default local store: put token into storage.USER_SPOTIFY if available, else local dict."""
+    """Default store: put token into the USER_SPOTIFY table."""
     token_data = dict(token_data)
     if "expires_at" not in token_data and token_data.get("expires_in"):
         token_data["expires_at"] = int(time.time()) + int(token_data.get("expires_in", 3600))
-    if storage is not None and hasattr(storage, "USER_SPOTIFY"):
-        storage.USER_SPOTIFY[str(tg)] = token_data
-    else:
-        _LOCAL_STORE[str(tg)] = token_data
+    USER_SPOTIFY[str(tg)] = token_data
 
 
 if _on_token_callback is None:
@@ -57,15 +60,58 @@ def save_token(tg_user_id: str, token_data: Dict[str, Any]) -> None:
 
 def get_token(tg_user_id: str) -> Optional[Dict[str, Any]]:
     tg = str(tg_user_id)
-    if storage is not None and hasattr(storage, "USER_SPOTIFY"):
-        return storage.USER_SPOTIFY.get(tg)
-    return _LOCAL_STORE.get(tg)
+    return USER_SPOTIFY.get(tg)
+
+
+def warm_library(tg: str, access_token: str) -> None:
+    """Load the user's library index in the background right after OAuth."""
+    drop_library(tg)
+    get_response_cache().forget(tg)
+    client = SpotifyUserClient(access_token, user_id=tg)
+    task = asyncio.create_task(get_library(tg).sync(client))
+    _background_tasks.add(task)
+
+    def _done(t: asyncio.Task) -> None:
+        _background_tasks.discard(t)
+        if not t.cancelled():
+            t.exception()
+
+    task.add_done_callback(_done)
+
+
+async def stop_background_tasks() -> None:
+    tasks = list(_background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _warm_library_hook(tg: str, access_token: str) -> None:
+    warm_library(tg, access_token)
+
+
+_on_connected: Callable[[str, str], Awaitable[None]] = _warm_library_hook
+
+
+def set_connect_hook(func: Callable[[str, str], Awaitable[None]]) -> None:
+    """Register what runs after a user connects. Signature: await func(telegram_id, access_token)."""
+    global _on_connected
+    _on_connected = func
+
+
+def configure(cfg) -> None:
+    """Use `cfg` for every OAuth call instead of loading config on demand."""
+    global _config
+    _config = cfg
 
 
 def _load_config_or_raise():
-    if load_config is None:
-        raise RuntimeError("Config loader not available (app.config.load_config). Ensure app/config exists.")
-    return load_config()
+    global _config
+    if _config is None:
+        if load_config is None:
+            raise RuntimeError("Config loader not available (app.config.load_config). Ensure app/config exists.")
+        _config = load_config()
+    return _config
 
 
 def _basic_auth_header(cfg) -> Dict[str, str]:
@@ -89,38 +135,40 @@ def get_auth_url(telegram_user_id: str) -> str:
     )
 
 
-def exchange_code(code: str) -> Dict[str, Any]:
-    cfg = _load_config_or_raise()
-    resp = requests.post(
-        "https://accounts.spotify.com/api/token",
+async def _token_request(cfg, data: Dict[str, str]) -> Dict[str, Any]:
+    async with get_session().post(
+        TOKEN_URL,
         headers={**_basic_auth_header(cfg), "Content-Type": "application/x-www-form-urlencoded"},
-        data={"grant_type": "authorization_code", "code": code, "redirect_uri": cfg.spotify.redirect_uri},
-        timeout=10,
+        data=data,
+        timeout=TOKEN_TIMEOUT,
+    ) as resp:
+        if resp.status == 400 and data.get("grant_type") == "refresh_token":
+            error = await resp.json(content_type=None)
+            if isinstance(error, dict) and error.get("error") == "invalid_grant":
+                raise RefreshRevoked(error.get("error_description") or "invalid_grant")
+        resp.raise_for_status()
+        token = await resp.json()
+    token["expires_at"] = int(time.time()) + int(token.get("expires_in", 3600))
+    return token
+
+
+async def exchange_code(code: str, cfg=None) -> Dict[str, Any]:
+    cfg = cfg or _load_config_or_raise()
+    return await _token_request(
+        cfg,
+        {"grant_type": "authorization_code", "code": code, "redirect_uri": cfg.spotify.redirect_uri},
     )
-    resp.raise_for_status()
-    data = resp.json()
-    data["expires_at"] = int(time.time()) + int(data.get("expires_in", 3600))
-    return data
 
 
-def refresh_access_token(refresh_token: str) -> Dict[str, Any]:
-    cfg = _load_config_or_raise()
-    resp = requests.post(
-        "https://accounts.spotify.com/api/token",
-        headers={**_basic_auth_header(cfg), "Content-Type": "application/x-www-form-urlencoded"},
-        data={"grant_type": "refresh_token", "refresh_token": refresh_token},
-        timeout=10,
+async def refresh_access_token(refresh_token: str) -> Dict[str, Any]:
+    return await _token_request(
+        _load_config_or_raise(),
+        {"grant_type": "refresh_token", "refresh_token": refresh_token},
     )
-    resp.raise_for_status()
-    data = resp.json()
-    data["expires_at"] = int(time.time()) + int(data.get("expires_in", 3600))
-    return data
 
 
 async def _callback(request: web.Request) -> web.Response:
-    cfg = request.app.get("config")
-    if cfg is None:
-        cfg = _load_config_or_raise()
+    cfg = request.app["config"]
 
     params = request.rel_url.query
     code = params.get("code")
@@ -129,15 +177,15 @@ async def _callback(request: web.Request) -> web.Response:
         return web.Response(text="Missing code or state", status=400)
 
     try:
-        token = await asyncio.to_thread(exchange_code, code)
+        token = await exchange_code(code, cfg)
 
         access_token = token.get("access_token")
         refresh_token = token.get("refresh_token")
         expires_at = token.get("expires_at")
 
-        r = requests.get("https://api.spotify.com/v1/me", headers={"Authorization": f"Bearer {access_token}"}, timeout=10)
-        r.raise_for_status()
-        me = r.json()
+        # The cache is keyed by Telegram user: a different account may be behind it now.
+        get_response_cache().forget(str(telegram_user_id))
+        me = await SpotifyUserClient(access_token, user_id=str(telegram_user_id)).get_me()
         spotify_user_id = me.get("id")
 
         token_data = {
@@ -155,58 +203,83 @@ async def _callback(request: web.Request) -> web.Response:
             except Exception:
                 pass
 
-        try:
-            if cfg and getattr(cfg, "telegram", None) and getattr(cfg.telegram, "token", None):
-                async with Bot(token=cfg.telegram.token) as bot:
-                    try:
-                        await bot.send_message(int(telegram_user_id), "✅ Spotify успешно подключён. Вернись в бота.")
-                    except Exception:
-                        pass
-        except Exception:
-            pass
+        await _on_connected(str(telegram_user_id), access_token)
+
+        outbox = request.app.get("outbox")
+        if outbox is not None:
+            outbox.notify(int(telegram_user_id), "✅ Spotify успешно подключён. Вернись в бота.")
 
         return web.Response(text="✅ Spotify connected. You can return to the bot.")
     except Exception as exc:
         return web.Response(text=f"OAuth error: {exc}", status=500)
 
 
-async def start_oauth_server(host: Optional[str] = None, port: Optional[int] = None):
-    cfg = _load_config_or_raise()
-    host = host or cfg.oauth.host
-    port = int(port or cfg.oauth.port)
-
+def create_oauth_app(cfg=None, outbox=None) -> web.Application:
+    """
+    Build the aiohttp app that serves `/callback`, `/metrics` and `/traces`
+    (the last two only with `METRICS_TOKEN`); other routes can be added to
+    it. `cfg` becomes the config for all OAuth calls; the "connected"
+    notification is queued through `outbox` (the dispatcher's bot), and
+    skipped when there is none.
+    """
+    if cfg is not None:
+        configure(cfg)
     app = web.Application()
-    app["config"] = cfg
+    app["config"] = _load_config_or_raise()
+    app["outbox"] = outbox
     app.router.add_get("/callback", _callback)
+    add_metrics_route(app, app["config"].oauth.metrics_token)
+    add_traces_route(app, app["config"].oauth.metrics_token)
+    return app
+
+
+async def start_oauth_server(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    app: Optional[web.Application] = None,
+) -> web.AppRunner:
+    if app is None:
+        app = create_oauth_app()
+    cfg = app["config"]
+    host = host or cfg.oauth.host
+    port = int(port or cfg.oauth.port)
 
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, host, port)
     await site.start()
     print(f"✅ Spotify OAuth server running on http://{host}:{port}/callback")
+    return runner
 
 
-async def ensure_token(tg_user_id: str) -> str:
+def _iter_tokens():
+    return list(USER_SPOTIFY.items())
+
+
+def disconnect(tg_user_id: str) -> None:
+    """Forget the user's Spotify token and everything derived from it; they have to /connect again."""
     tg = str(tg_user_id)
-    token = get_token(tg)
-    if not token:
-        raise RuntimeError("Spotify not connected")
+    USER_SPOTIFY.pop(tg, None)
+    drop_library(tg)
+    get_response_cache().forget(tg)
+
 
-    now = time.time()
-    if now > token.get("expires_at", 0) - 30:
-        refresh = token.get("refresh_token")
-        if not refresh:
-            raise RuntimeError("No refresh_token, reauthorize")
+_refresher = TokenRefresher(
+    refresh_fn=lambda refresh: refresh_access_token(refresh),
+    load=get_token,
+    store=save_token,
+    tokens=_iter_tokens,
+    disconnect=disconnect,
+)
 
-        new = await asyncio.to_thread(refresh_access_token, refresh)
-        token["access_token"] = new.get("access_token")
-        token["expires_at"] = new.get("expires_at", int(time.time()) + int(new.get("expires_in", 3600)))
-        if new.get("refresh_token"):
-            token["refresh_token"] = new.get("refresh_token")
 
-        save_token(tg, token)
+def get_refresher() -> TokenRefresher:
+    return _refresher
 
-    return token["access_token"]
+
+async def ensure_token(tg_user_id: str) -> str:
+    with span("ensure_token"):
+        return await _refresher.get_access_token(str(tg_user_id))
 
 
 def get_token_sync(tg_user_id: str) -> Optional[Dict[str, Any]]:
@@ -217,9 +290,15 @@ __all__ = [
     "get_auth_url",
     "exchange_code",
     "refresh_access_token",
+    "configure",
+    "create_oauth_app",
     "start_oauth_server",
     "set_token_callback",
+    "set_connect_hook",
+    "stop_background_tasks",
     "ensure_token",
+    "get_refresher",
+    "disconnect",
     "save_token",
     "get_token_sync",
 ]
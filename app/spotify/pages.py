@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from app.spotify.fairness import background
+from app.spotify.library import LibraryTrack, peek_library
+from app.spotify.singleflight import SingleFlight
+
+BROWSE_PAGE_SIZE = 15
+
+
+@dataclass
+class Page:
+    number: int
+    size: int
+    total: int
+    tracks: List[dict] = field(default_factory=list)
+
+    @property
+    def pages(self) -> int:
+        return max((self.total + self.size - 1) // self.size, 1)
+
+    @property
+    def offset(self) -> int:
+        return self.number * self.size
+
+
+class PageCache:
+    """
+    Per-user cache of "My tracks" pages, newest first.
+
+    A loaded and fresh `LibraryIndex` answers without any request. Otherwise
+    each page costs one `/me/tracks` call, concurrent requests for the same
+    page share it, and the neighbours of every served page are prefetched
+    in the background so the next tap is usually a cache hit.
+    """
+
+    def __init__(
+        self,
+        page_size: int = BROWSE_PAGE_SIZE,
+        ttl: float = 120.0,
+        prefetch: int = 1,
+        max_users: int = 5000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.page_size = page_size
+        self.ttl = ttl
+        self.prefetch = prefetch
+        self.max_users = max_users
+        self._clock = clock
+        self._users: "OrderedDict[str, Dict[int, Tuple[Page, float]]]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self._prefetching: Set[asyncio.Task] = set()
+        self.fetches = 0
+
+    def _cached(self, tg: str, number: int) -> Optional[Page]:
+        pages = self._users.get(tg)
+        if not pages:
+            return None
+        entry = pages.get(number)
+        if entry is None:
+            return None
+        page, fetched_at = entry
+        if self._clock() - fetched_at > self.ttl:
+            del pages[number]
+            return None
+        self._users.move_to_end(tg)
+        return page
+
+    def _store(self, tg: str, page: Page) -> None:
+        pages = self._users.setdefault(tg, {})
+        self._users.move_to_end(tg)
+        pages[page.number] = (page, self._clock())
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    async def _fetch(self, tg: str, client, number: int) -> Page:
+        async def fetch() -> Page:
+            self.fetches += 1
+            data = await client.get_saved_tracks(limit=self.page_size, offset=number * self.page_size) or {}
+            tracks = [LibraryTrack.from_item(it).as_dict() for it in data.get("items", []) if it.get("track")]
+            page = Page(number, self.page_size, int(data.get("total", 0)), tracks)
+            self._store(tg, page)
+            return page
+
+        return await self._inflight.run((tg, number), fetch)
+
+    def _prefetch_around(self, tg: str, client, page: Page) -> None:
+        for step in range(1, self.prefetch + 1):
+            for number in (page.number + step, page.number - step):
+                if not 0 <= number < page.pages:
+                    continue
+                if self._cached(tg, number) is not None or (tg, number) in self._inflight:
+                    continue
+                with background():
+                    task = asyncio.create_task(self._fetch(tg, client, number))
+                self._prefetching.add(task)
+                task.add_done_callback(self._prefetch_done)
+
+    def _prefetch_done(self, task: asyncio.Task) -> None:
+        self._prefetching.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Page prefetch failed: {task.exception()}")
+
+    async def get(self, tg: str, client, number: int = 0) -> Page:
+        tg = str(tg)
+        number = max(number, 0)
+
+        library = peek_library(tg)
+        if library is not None and library.fresh:
+            page = Page(number, self.page_size, len(library))
+            number = page.number = min(number, page.pages - 1)
+            page.tracks = [t.as_dict() for t in library.page(page.offset, self.page_size)]
+            return page
+
+        page = self._cached(tg, number)
+        if page is None:
+            page = await self._fetch(tg, client, number)
+            # The library shrank since the keyboard was drawn: fall back to its last page.
+            if not page.tracks and page.total and number >= page.pages:
+                return await self.get(tg, client, page.pages - 1)
+        if self.prefetch:
+            self._prefetch_around(tg, client, page)
+        return page
+
+    def invalidate(self, tg: Optional[str]) -> None:
+        if tg is not None:
+            self._users.pop(str(tg), None)
+
+    def clear(self) -> None:
+        self._users.clear()
+
+    async def close(self) -> None:
+        tasks = list(self._prefetching)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    global _cache
+    if _cache is None:
+        _cache = PageCache()
+    return _cache
+
+
+def set_page_cache(cache: Optional[PageCache]) -> None:
+    global _cache
+    _cache = cache
@@ -0,0 +1,174 @@
+import asyncio
+import re
+import weakref
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from app.spotify.fairness import background
+from app.spotify.library import LibraryIndex, LibraryTrack, get_library
+from app.storage.memory import PLAYLIST_SYNC
+
+_PLAYLIST_ID = re.compile(r"(?:playlist[/:])?([A-Za-z0-9]{22})(?:\?.*)?$")
+
+_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def parse_playlist_id(text: str) -> Optional[str]:
+    """Playlist id from a share link, a `spotify:playlist:` URI or a bare id."""
+    match = _PLAYLIST_ID.search(text.strip())
+    return match.group(1) if match else None
+
+
+@dataclass
+class SyncFilter:
+    """Which saved tracks go into the playlist; empty fields match everything."""
+
+    artist: str = ""
+    # Inclusive "YYYY-MM-DD" bounds on the date the track was saved.
+    since: str = ""
+    until: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "SyncFilter":
+        return cls(**(data or {}))
+
+    @classmethod
+    def from_args(cls, args: Iterable[str]) -> "SyncFilter":
+        """Parse `artist=... since=YYYY-MM-DD until=YYYY-MM-DD`; raises ValueError."""
+        values = {}
+        for arg in args:
+            key, sep, value = arg.partition("=")
+            if not sep or key not in ("artist", "since", "until") or not value:
+                raise ValueError(f"Unknown filter: {arg}")
+            if key != "artist":
+                datetime.strptime(value, "%Y-%m-%d")
+            values[key] = value
+        return cls(**values)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+    def matches(self, track: LibraryTrack) -> bool:
+        if self.artist:
+            wanted = self.artist.casefold()
+            names = track.artist_names or (track.artist,)
+            if not any(wanted in name.casefold() for name in names):
+                return False
+        day = track.added_at[:10]
+        if self.since and day < self.since:
+            return False
+        if self.until and day > self.until:
+            return False
+        return True
+
+    def describe(self) -> str:
+        parts = []
+        if self.artist:
+            parts.append(f"исполнитель: {self.artist}")
+        if self.since:
+            parts.append(f"с {self.since}")
+        if self.until:
+            parts.append(f"по {self.until}")
+        return ", ".join(parts) or "вся библиотека"
+
+
+@dataclass
+class SyncResult:
+    added: int = 0
+    removed: int = 0
+    # The playlist changed outside the bot (or was never read) and was re-read in full.
+    refetched: bool = False
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def desired_tracks(library: LibraryIndex, flt: SyncFilter) -> List[str]:
+    """Ids the playlist should hold, newest first."""
+    return [tr.id for tr in library.page(0, len(library)) if flt.matches(tr)]
+
+
+def plan(current: List[str], desired: List[str]) -> Tuple[List[str], List[str]]:
+    """Minimal (to_add, to_remove): order of tracks already in the playlist is left alone."""
+    have = set(current)
+    want = set(desired)
+    to_add = [tid for tid in desired if tid not in have]
+    to_remove = [tid for tid in dict.fromkeys(current) if tid not in want]
+    return to_add, to_remove
+
+
+async def fetch_playlist(client, playlist_id: str) -> List[str]:
+    ids = []
+    async for item in client.iter_playlist_items(playlist_id):
+        track = item.get("track")
+        # Local files and unavailable episodes have no id and are never touched.
+        if track and track.get("id"):
+            ids.append(track["id"])
+    return ids
+
+
+async def sync_playlist(client, library: LibraryIndex, state: dict) -> SyncResult:
+    """
+    Bring the playlist in `state` in line with the library.
+
+    `state` holds the playlist id, the filter and the playlist contents as
+    of `snapshot_id`. If Spotify still reports that snapshot, the cached
+    contents are trusted and an unchanged playlist costs one request; the
+    diff is then applied in batches of 100, new tracks on top.
+    """
+    playlist_id = state["playlist_id"]
+    result = SyncResult()
+
+    snapshot = await client.get_playlist_snapshot(playlist_id)
+    current = state.get("tracks")
+    if current is None or snapshot != state.get("snapshot_id"):
+        current = await fetch_playlist(client, playlist_id)
+        result.refetched = True
+
+    to_add, to_remove = plan(current, desired_tracks(library, SyncFilter.from_dict(state.get("filter"))))
+    if to_remove:
+        snapshot = await client.remove_playlist_items(playlist_id, to_remove, snapshot) or snapshot
+        gone = set(to_remove)
+        current = [tid for tid in current if tid not in gone]
+    if to_add:
+        snapshot = await client.add_playlist_items(playlist_id, to_add, position=0) or snapshot
+        current = to_add + current
+
+    state["tracks"] = current
+    state["snapshot_id"] = snapshot
+    result.added = len(to_add)
+    result.removed = len(to_remove)
+    return result
+
+
+async def sync_user_playlist(tg: str, client) -> Optional[SyncResult]:
+    """Sync the user's mirrored playlist, if one is set; one sync per user at a time."""
+    tg = str(tg)
+    lock = _locks.get(tg)
+    if lock is None:
+        lock = _locks[tg] = asyncio.Lock()
+
+    async with lock:
+        await PLAYLIST_SYNC.ensure(tg)
+        state = PLAYLIST_SYNC.get(tg)
+        if state is None:
+            return None
+        library = get_library(tg)
+        with background():
+            await library.sync(client)
+            result = await sync_playlist(client, library, state)
+
+        # The row may have been paged out (and back in) meanwhile, or
+        # switched off or retargeted by the user: only keep our copy if
+        # it still describes the same target.
+        await PLAYLIST_SYNC.ensure(tg)
+        current = PLAYLIST_SYNC.get(tg)
+        if current is state:
+            PLAYLIST_SYNC.touch(tg)
+        elif current is not None and (current.get("playlist_id"), current.get("filter")) == (
+            state["playlist_id"], state.get("filter")
+        ):
+            PLAYLIST_SYNC[tg] = state
+        return result
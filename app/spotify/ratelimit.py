@@ -0,0 +1,103 @@
+import asyncio
+import random
+import time
+from typing import Callable, Dict, Optional
+
+from app.utils.ratelimit import TokenBucket
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RateLimitScheduler:
+    """
+    Process-wide pacing for Spotify Web API calls.
+
+    Every request first takes a token from its user's bucket and then from
+    the app-wide bucket; callers that are over quota wait in line instead
+    of failing. A 429 pauses the app bucket for `Retry-After` seconds
+    without blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        app_rate: float = 20.0,
+        app_burst: float = 40.0,
+        user_rate: float = 4.0,
+        user_burst: float = 10.0,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        max_retry_after: float = 120.0,
+        max_user_buckets: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+        self.max_user_buckets = max_user_buckets
+        self._clock = clock
+        self._app = TokenBucket(app_rate, app_burst, clock=clock)
+        self._users: Dict[str, TokenBucket] = {}
+        self._blocked_until = 0.0
+        self.throttled = 0
+
+    def _user_bucket(self, user_key: str) -> TokenBucket:
+        bucket = self._users.get(user_key)
+        if bucket is None:
+            if len(self._users) >= self.max_user_buckets:
+                self._users = {k: b for k, b in self._users.items() if not b.idle}
+            bucket = TokenBucket(self.user_rate, self.user_burst, clock=self._clock)
+            self._users[user_key] = bucket
+        return bucket
+
+    @property
+    def blocked_for(self) -> float:
+        return max(self._blocked_until - self._clock(), 0.0)
+
+    async def acquire(self, user_key: Optional[str] = None) -> None:
+        if user_key is not None:
+            delay = self._user_bucket(user_key).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+
+        while True:
+            delay = self._app.reserve()
+            if delay:
+                await asyncio.sleep(delay)
+            blocked = self.blocked_for
+            if not blocked:
+                return
+            # Throttled while we were queued: wait out the cooldown and take a new slot.
+            await asyncio.sleep(blocked)
+
+    def throttle(self, retry_after: float) -> None:
+        """Pause the app bucket after Spotify answered 429."""
+        self.throttled += 1
+        until = self._clock() + retry_after
+        if until > self._blocked_until:
+            self._blocked_until = until
+            self._app.pause_until(until)
+
+    def retry_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(backoff / 2, backoff)
+
+
+_scheduler: Optional[RateLimitScheduler] = None
+
+
+def get_scheduler() -> RateLimitScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RateLimitScheduler()
+    return _scheduler
+
+
+def set_scheduler(scheduler: Optional[RateLimitScheduler]) -> None:
+    global _scheduler
+    _scheduler = scheduler
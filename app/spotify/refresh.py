@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from app.monitoring.metrics import TOKEN_REFRESH_LATENCY, TOKEN_REFRESHES
+from app.monitoring.tracing import span
+from app.spotify.singleflight import SingleFlight
+
+TokenData = Dict[str, Any]
+
+
+class RefreshRevoked(RuntimeError):
+    """Spotify answered `invalid_grant`: the user revoked access, only a new OAuth helps."""
+
+
+class TokenRefresher:
+    """
+    Coordinates access-token refreshes.
+
+    Concurrent callers for the same user share one in-flight refresh, and a
+    background task renews tokens `lead_time` seconds before `expires_at`
+    so handlers rarely have to wait on accounts.spotify.com. Only users
+    seen in the last `active_window` seconds are renewed ahead of time
+    (the rest refresh on their next request), at most `rate` per second.
+
+    A refresh token Spotify rejects with `invalid_grant` is not retried:
+    `disconnect` is called for the user and `RefreshRevoked` raised.
+    """
+
+    def __init__(
+        self,
+        refresh_fn: Callable[[str], Awaitable[TokenData]],
+        load: Callable[[str], Optional[TokenData]],
+        store: Callable[[str, TokenData], None],
+        tokens: Callable[[], Iterable[Tuple[str, TokenData]]],
+        skew: float = 30.0,
+        lead_time: float = 300.0,
+        interval: float = 60.0,
+        concurrency: int = 8,
+        owns: Optional[Callable[[str], bool]] = None,
+        active_window: float = 3600.0,
+        rate: float = 5.0,
+        disconnect: Optional[Callable[[str], None]] = None,
+    ):
+        self._refresh_fn = refresh_fn
+        self._load = load
+        self._store = store
+        self._tokens = tokens
+        self.skew = skew
+        self.lead_time = lead_time
+        self.interval = interval
+        self.concurrency = concurrency
+        # In a multi-process setup each worker only renews the users routed to it.
+        self.owns = owns
+        self.active_window = active_window
+        self.rate = rate
+        self._disconnect = disconnect
+        self._seen: Dict[str, float] = {}
+        self._inflight = SingleFlight()
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+
+    def seen(self, tg: str) -> None:
+        """Note that `tg` is using the bot, so their token is worth renewing ahead of time."""
+        self._seen[tg] = time.monotonic()
+
+    async def get_access_token(self, tg: str) -> str:
+        self.seen(tg)
+        token = self._load(tg)
+        if not token:
+            raise RuntimeError("Spotify not connected")
+        if time.time() > token.get("expires_at", 0) - self.skew:
+            return await self.refresh(tg)
+        return token["access_token"]
+
+    async def refresh(self, tg: str) -> str:
+        # Detached: once Spotify may have rotated the refresh token, the result must be stored.
+        return await self._inflight.run(tg, lambda: self._refresh(tg), detach=True)
+
+    async def _refresh(self, tg: str) -> str:
+        token = self._load(tg)
+        if not token:
+            raise RuntimeError("Spotify not connected")
+        refresh = token.get("refresh_token")
+        if not refresh:
+            raise RuntimeError("No refresh_token, reauthorize")
+
+        started = time.perf_counter()
+        try:
+            with span("token_refresh"):
+                new = await self._refresh_fn(refresh)
+        except RefreshRevoked:
+            TOKEN_REFRESHES.labels(result="revoked").inc()
+            self._seen.pop(tg, None)
+            if self._disconnect is not None:
+                self._disconnect(tg)
+            raise
+        except Exception:
+            TOKEN_REFRESHES.labels(result="error").inc()
+            raise
+        TOKEN_REFRESH_LATENCY.observe(time.perf_counter() - started)
+        TOKEN_REFRESHES.labels(result="ok").inc()
+        self.refreshes += 1
+        token = dict(token)
+        token["access_token"] = new.get("access_token")
+        token["expires_at"] = new.get("expires_at", int(time.time()) + int(new.get("expires_in", 3600)))
+        if new.get("refresh_token"):
+            token["refresh_token"] = new.get("refresh_token")
+
+        self._store(tg, token)
+        return token["access_token"]
+
+    def due(self, now: Optional[float] = None) -> list[str]:
+        """Active users whose tokens expire within `lead_time`, soonest first."""
+        now = time.time() if now is None else now
+        idle_since = time.monotonic() - self.active_window
+        for tg in [tg for tg, at in self._seen.items() if at < idle_since]:
+            del self._seen[tg]
+        expiring = [
+            (token.get("expires_at", 0), tg)
+            for tg, token in list(self._tokens())
+            if tg in self._seen
+            and token.get("refresh_token")
+            and token.get("expires_at", 0) - now < self.lead_time
+            and (self.owns is None or self.owns(tg))
+        ]
+        return [tg for _, tg in sorted(expiring)]
+
+    async def refresh_due(self) -> None:
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(tg: str) -> None:
+            try:
+                await self.refresh(tg)
+            except Exception:
+                # The request path will retry and surface the error to the user.
+                pass
+            finally:
+                sem.release()
+
+        tasks = []
+        for i, tg in enumerate(self.due()):
+            if i:
+                # Spread the renewals out instead of bursting at accounts.spotify.com.
+                await asyncio.sleep(1.0 / self.rate)
+            await sem.acquire()
+            tasks.append(asyncio.create_task(one(tg)))
+        await asyncio.gather(*tasks)
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh_due()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,148 @@
+import json
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.spotify.singleflight import SingleFlight
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Search results carry the full market list per track and album; nothing in the bot uses it.
+_DROP_KEYS = ("available_markets",)
+
+
+def normalize_query(query: str) -> str:
+    """`"Artist — Track"`, `"artist - track "` and `"Artist/Track"` share one key."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def _compact(track: Optional[dict]) -> Optional[dict]:
+    if not track:
+        return track
+    track = {k: v for k, v in track.items() if k not in _DROP_KEYS}
+    album = track.get("album")
+    if isinstance(album, dict):
+        track["album"] = {k: v for k, v in album.items() if k not in _DROP_KEYS}
+    return track
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size")
+
+    def __init__(self, value: Any, expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+class SearchCache:
+    """
+    Bounded TTL/LRU cache for `search_track_full`, shared by all users.
+
+    Misses for the same normalized query that overlap in time share one
+    Spotify call. Empty results are cached for `negative_ttl` only.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 6 * 3600,
+        negative_ttl: float = 300,
+        max_entries: int = 20_000,
+        max_bytes: int = 32 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._inflight = SingleFlight()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str) -> Tuple[bool, Any]:
+        key = normalize_query(query)
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry.expires_at <= self._clock():
+            self._drop(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry.value
+
+    def put(self, query: str, value: Any) -> None:
+        key = normalize_query(query)
+        value = _compact(value)
+        size = len(key) + len(json.dumps(value, separators=(",", ":"), ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        ttl = self.ttl if value else self.negative_ttl
+        self._entries[key] = _Entry(value, self._clock() + ttl, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+
+    async def get_or_fetch(self, query: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        found, value = self.get(query)
+        if found:
+            self.hits += 1
+            return value
+
+        async def fetch_and_keep() -> Any:
+            self.misses += 1
+            value = await fetch()
+            self.put(query, value)
+            return _compact(value)
+
+        return await self._inflight.run(normalize_query(query), fetch_and_keep)
+
+    @property
+    def coalesced(self) -> int:
+        return self._inflight.coalesced
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+
+_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> SearchCache:
+    global _cache
+    if _cache is None:
+        _cache = SearchCache()
+    return _cache
+
+
+def set_search_cache(cache: Optional[SearchCache]) -> None:
+    global _cache
+    _cache = cache
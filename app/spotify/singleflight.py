@@ -0,0 +1,112 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# The call the current task is running as leader, so `fetch` can ask `leads(key)`.
+_running: ContextVar[Optional[asyncio.Future]] = ContextVar("singleflight_call", default=None)
+
+
+class _LeaderCancelled(Exception):
+    """Handed to waiters when the caller running the shared call was cancelled."""
+
+
+class SingleFlight:
+    """
+    At most one call per key at a time; callers that arrive while it runs
+    wait for it and get its result or its error.
+
+    By default the first caller (the leader) runs `fetch` itself. If the
+    leader is cancelled, the waiters are not: the key is released and the
+    first of them runs `fetch` again as the new leader. With
+    `detach=True` the call runs in a task of its own that no caller's
+    cancellation stops, for work that must finish once started (e.g. a
+    token refresh that rotates the refresh token).
+
+    `discard` lets a newer write make later callers start afresh, while
+    a call already running finishes for those who joined it.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(list(self._calls))
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def leads(self, key: Hashable) -> bool:
+        """Inside `fetch`: whether this call is still the one registered for `key`."""
+        current = _running.get()
+        return current is not None and self._calls.get(key) is current
+
+    def discard(self, key: Hashable) -> None:
+        self._calls.pop(key, None)
+
+    def clear(self) -> None:
+        self._calls.clear()
+
+    def _release(self, key: Hashable, call: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def run(self, key: Hashable, fetch: Callable[[], Awaitable[T]], detach: bool = False) -> T:
+        joined = False
+        while True:
+            pending = self._calls.get(key)
+            if pending is None:
+                break
+            if not joined:
+                self.coalesced += 1
+                joined = True
+            try:
+                # shield: a waiter that is cancelled must not cancel the call others wait on.
+                return await asyncio.shield(pending)
+            except _LeaderCancelled:
+                continue
+
+        if detach:
+            return await self._run_detached(key, fetch)
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        token = _running.set(call)
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            call.set_exception(_LeaderCancelled())
+            call.exception()
+            raise
+        except Exception as exc:
+            call.set_exception(exc)
+            # Waiters get the error; retrieve it here so a lone failure is not logged twice.
+            call.exception()
+            raise
+        else:
+            call.set_result(value)
+            return value
+        finally:
+            _running.reset(token)
+            self._release(key, call)
+
+    async def _run_detached(self, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        async def lead():
+            _running.set(asyncio.current_task())
+            return await fetch()
+
+        task = asyncio.ensure_future(lead())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        self._release(key, task)
+        if not task.cancelled():
+            # Read even when every caller has gone, so the error is not reported as unretrieved.
+            task.exception()
@@ -0,0 +1,9 @@
+from .engine import LibraryColumns, LibraryStats, StatsEngine, compute_stats, get_stats_engine
+
+__all__ = [
+    "LibraryColumns",
+    "LibraryStats",
+    "StatsEngine",
+    "compute_stats",
+    "get_stats_engine",
+]
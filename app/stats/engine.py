@@ -0,0 +1,226 @@
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.spotify.library import LibraryIndex, LibraryTrack
+
+DAY = 86400
+# 1970-01-01 was a Thursday; shifting by 3 days makes weeks start on Monday.
+_WEEK_SHIFT = 3
+
+
+def parse_added_at(values: Iterable[str]) -> np.ndarray:
+    """ISO-8601 `added_at` strings (`2024-01-01T12:00:00Z`) -> int64 unix seconds."""
+    return np.array([v[:19] for v in values], dtype="datetime64[s]").astype(np.int64)
+
+
+def _grow(array: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.empty(max(size, 2 * len(array), 64), dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class LibraryColumns:
+    """
+    Columnar copy of a `LibraryIndex`: one row per track, oldest first.
+
+    Artists are interned to integer codes; a track with several artists has
+    one entry per artist in `artist_codes`, with `artist_rows` pointing back
+    at the track row. Appends extend the arrays in place, anything else
+    (removal, reorder, reload) rebuilds them.
+    """
+
+    def __init__(self):
+        self.artist_code: Dict[str, int] = {}
+        self.artist_names: List[str] = []
+        self._added = np.empty(0, dtype=np.int64)
+        self._duration = np.empty(0, dtype=np.int64)
+        self._codes = np.empty(0, dtype=np.int32)
+        self._rows = np.empty(0, dtype=np.int32)
+        self.size = 0
+        self.links = 0
+        self.generation = -1
+
+    @property
+    def added_at(self) -> np.ndarray:
+        return self._added[: self.size]
+
+    @property
+    def duration_ms(self) -> np.ndarray:
+        return self._duration[: self.size]
+
+    @property
+    def artist_codes(self) -> np.ndarray:
+        return self._codes[: self.links]
+
+    @property
+    def artist_rows(self) -> np.ndarray:
+        return self._rows[: self.links]
+
+    def _intern(self, key: str, name: str) -> int:
+        code = self.artist_code.get(key)
+        if code is None:
+            code = self.artist_code[key] = len(self.artist_names)
+            self.artist_names.append(name)
+        return code
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def append(self, tracks: List[LibraryTrack]) -> None:
+        if not tracks:
+            return
+        start, end = self.size, self.size + len(tracks)
+        self._added = _grow(self._added, end)
+        self._duration = _grow(self._duration, end)
+        self._added[start:end] = parse_added_at(t.added_at for t in tracks)
+        self._duration[start:end] = [t.duration_ms for t in tracks]
+
+        codes, rows = [], []
+        for row, tr in enumerate(tracks, start):
+            names = tr.artist_names or (tr.artist,)
+            for key, name in zip(tr.artist_ids or names, names):
+                codes.append(self._intern(key, name))
+                rows.append(row)
+        link_end = self.links + len(codes)
+        self._codes = _grow(self._codes, link_end)
+        self._rows = _grow(self._rows, link_end)
+        self._codes[self.links:link_end] = codes
+        self._rows[self.links:link_end] = rows
+
+        self.size, self.links = end, link_end
+
+    def update(self, library: LibraryIndex) -> bool:
+        """Bring the columns in line with `library`; True if anything changed."""
+        rebuilt = library.generation != self.generation or len(library) < self.size
+        if rebuilt:
+            self.reset()
+            self.generation = library.generation
+        if len(library) == self.size:
+            return rebuilt
+        self.append(library.since(self.size))
+        return True
+
+
+@dataclass
+class LibraryStats:
+    total: int = 0
+    duration_ms: int = 0
+    first_added: Optional[int] = None
+    last_added: Optional[int] = None
+    top_artists: List[Tuple[str, int]] = field(default_factory=list)
+    # period start (unix seconds) -> tracks added in that period
+    per_day: Dict[int, int] = field(default_factory=dict)
+    per_week: Dict[int, int] = field(default_factory=dict)
+    per_month: Dict[int, int] = field(default_factory=dict)
+
+    @property
+    def avg_duration_ms(self) -> int:
+        return self.duration_ms // self.total if self.total else 0
+
+    def growth(self, period: str = "month") -> List[Tuple[int, int]]:
+        """Library size at the end of each period: [(period_start, cumulative_total), ...]."""
+        counts = getattr(self, f"per_{period}")
+        starts = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        totals = np.cumsum(np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+        return list(zip(starts.tolist(), totals.tolist()))
+
+
+def _histogram(periods: np.ndarray, scale: int) -> Dict[int, int]:
+    keys, counts = np.unique(periods, return_counts=True)
+    return dict(zip((keys * scale).tolist(), counts.tolist()))
+
+
+def top_k(codes: np.ndarray, names: List[str], k: int) -> List[Tuple[str, int]]:
+    if not len(codes) or k <= 0:
+        return []
+    counts = np.bincount(codes, minlength=len(names))
+    k = min(k, int(np.count_nonzero(counts)))
+    best = np.argpartition(-counts, k - 1)[:k]
+    # Ties broken by interning order, i.e. whoever appeared in the library first.
+    best = best[np.lexsort((best, -counts[best]))]
+    return [(names[i], int(counts[i])) for i in best]
+
+
+def compute_stats(columns: LibraryColumns, top: int = 5) -> LibraryStats:
+    if not columns.size:
+        return LibraryStats()
+
+    added = columns.added_at
+    days = added // DAY
+    months = added.astype("datetime64[s]").astype("datetime64[M]")
+    month_keys, month_counts = np.unique(months, return_counts=True)
+    month_starts = month_keys.astype("datetime64[s]").astype(np.int64)
+
+    weeks = (days + _WEEK_SHIFT) // 7
+    week_keys, week_counts = np.unique(weeks, return_counts=True)
+    week_starts = (week_keys * 7 - _WEEK_SHIFT) * DAY
+
+    return LibraryStats(
+        total=columns.size,
+        duration_ms=int(columns.duration_ms.sum()),
+        first_added=int(added.min()),
+        last_added=int(added.max()),
+        top_artists=top_k(columns.artist_codes, columns.artist_names, top),
+        per_day=_histogram(days, DAY),
+        per_week=dict(zip(week_starts.tolist(), week_counts.tolist())),
+        per_month=dict(zip(month_starts.tolist(), month_counts.tolist())),
+    )
+
+
+class StatsEngine:
+    """
+    Per-user columns and the last computed result; recomputed only after the library changes.
+
+    A user's entry goes when their `LibraryIndex` is dropped from memory,
+    and the least recently used go once more than `max_users` are kept.
+    Either way the next `stats` call rebuilds it from the library.
+    """
+
+    def __init__(self, top: int = 5, max_users: int = 1_000):
+        self.top = top
+        self.max_users = max_users
+        self._columns: "OrderedDict[str, LibraryColumns]" = OrderedDict()
+        self._results: Dict[str, LibraryStats] = {}
+        self._owners: Dict[str, weakref.ref] = {}
+
+    def stats(self, tg: str, library: LibraryIndex) -> LibraryStats:
+        tg = str(tg)
+        columns = self._columns.get(tg)
+        # A different index object (e.g. after reconnecting) always starts over.
+        owner = self._owners.get(tg)
+        if columns is None or owner is None or owner() is not library:
+            columns = self._columns[tg] = LibraryColumns()
+            self._owners[tg] = weakref.ref(library, lambda ref, tg=tg: self._released(tg, ref))
+            self._results.pop(tg, None)
+        self._columns.move_to_end(tg)
+        while len(self._columns) > self.max_users:
+            self.drop(next(iter(self._columns)))
+
+        changed = columns.update(library)
+        result = self._results.get(tg)
+        if result is None or changed:
+            result = self._results[tg] = compute_stats(columns, self.top)
+        return result
+
+    def _released(self, tg: str, ref: weakref.ref) -> None:
+        if self._owners.get(tg) is ref:
+            self.drop(tg)
+
+    def drop(self, tg: str) -> None:
+        tg = str(tg)
+        self._columns.pop(tg, None)
+        self._results.pop(tg, None)
+        self._owners.pop(tg, None)
+
+
+_engine = StatsEngine()
+
+
+def get_stats_engine() -> StatsEngine:
+    return _engine
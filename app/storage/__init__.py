@@ -0,0 +1,50 @@
+from typing import Optional
+
+from .base import StorageBackend, Table, WriteBehindBackend
+from .memory import TABLES, MemoryBackend
+from .redis_backend import RedisBackend
+from .sqlite import SqliteBackend
+
+_backend: Optional[StorageBackend] = None
+
+
+def create_backend(kind: str = "memory", path: str = "", redis_url: str = "") -> StorageBackend:
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SqliteBackend(path)
+    if kind == "redis":
+        return RedisBackend(redis_url)
+    raise RuntimeError(f"Unknown storage backend: {kind}")
+
+
+async def open_storage(backend: StorageBackend) -> StorageBackend:
+    global _backend
+    await backend.open(TABLES)
+    _backend = backend
+    return backend
+
+
+async def close_storage() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+
+def get_backend() -> Optional[StorageBackend]:
+    return _backend
+
+
+__all__ = [
+    "StorageBackend",
+    "Table",
+    "WriteBehindBackend",
+    "MemoryBackend",
+    "SqliteBackend",
+    "RedisBackend",
+    "create_backend",
+    "open_storage",
+    "close_storage",
+    "get_backend",
+]
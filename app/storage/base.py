@@ -0,0 +1,353 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+WriteListener = Callable[[str, str], None]
+RowLoader = Callable[[str, str], Awaitable[Optional[Any]]]
+
+_MISSING = object()
+
+
+def encode_value(value: Any) -> str:
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {"__dt__": obj.isoformat()}
+        raise TypeError(f"Cannot store {type(obj).__name__}")
+
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode_value(text: str) -> Any:
+    def hook(obj):
+        if len(obj) == 1 and "__dt__" in obj:
+            return datetime.fromisoformat(obj["__dt__"])
+        return obj
+
+    return json.loads(text, object_hook=hook)
+
+
+class Table(dict):
+    """
+    A plain dict that reports writes to the storage backend.
+
+    Handlers keep reading and writing it like the old module-level dicts.
+    Values that are mutated in place (e.g. `STATS[tg]["added"] += 1`) must
+    be followed by `table.touch(key)` so the backend sees the change.
+
+    With `max_resident` set and a backend that can read single rows, the
+    table is paged: rows are loaded by `await table.ensure(key)` rather
+    than at startup, and least recently used rows that have been written
+    out are dropped once more than `max_resident` are in memory. Code
+    that reads a paged table must `ensure` the key first and then read,
+    change and `touch` the row without awaiting in between.
+    """
+
+    def __init__(self, name: str, persistent: bool = True, max_resident: int = 0):
+        super().__init__()
+        self.name = name
+        self.persistent = persistent
+        self.max_resident = max_resident
+        self._listener: Optional[WriteListener] = None
+        self._loader: Optional[RowLoader] = None
+        self._is_dirty: Optional[Callable[[str], bool]] = None
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        # Keys the backend has no row for, so new users cost one lookup, not one per update.
+        self._absent: "OrderedDict[str, None]" = OrderedDict()
+        self.evictions = 0
+
+    @property
+    def paged(self) -> bool:
+        return bool(self.max_resident) and self._loader is not None
+
+    def bind(
+        self,
+        listener: Optional[WriteListener],
+        loader: Optional[RowLoader] = None,
+        is_dirty: Optional[Callable[[str], bool]] = None,
+    ) -> None:
+        self._listener = listener
+        self._loader = loader
+        self._is_dirty = is_dirty
+        if not self.paged:
+            self._recent.clear()
+            self._absent.clear()
+
+    def load(self, items: Iterable[Tuple[str, Any]]) -> None:
+        """Fill from the backend without reporting the writes back."""
+        for key, value in items:
+            dict.__setitem__(self, key, value)
+            self._used(key)
+
+    async def ensure(self, key: str) -> None:
+        """Make sure `key` is in memory if the backend has it (no-op unless paged)."""
+        if not self.paged:
+            return
+        if dict.__contains__(self, key):
+            self._used(key)
+            return
+        if key in self._absent:
+            self._absent.move_to_end(key)
+            return
+        value = await self._loader(self.name, key)
+        # Someone may have loaded or written the key while we were waiting.
+        if dict.__contains__(self, key):
+            return
+        if value is None:
+            self._absent[key] = None
+            if len(self._absent) > self.max_resident:
+                self._absent.popitem(last=False)
+        else:
+            self.load([(key, value)])
+
+    def _used(self, key: str) -> None:
+        if not self.paged:
+            return
+        self._absent.pop(key, None)
+        self._recent[key] = None
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.max_resident:
+            self._evict()
+
+    def _evict(self) -> None:
+        # Rows not yet written out go to the back of the line instead, so
+        # the next eviction does not walk past them again.
+        skipped = 0
+        while len(self._recent) > self.max_resident and skipped < len(self._recent):
+            key = next(iter(self._recent))
+            if self._is_dirty is not None and self._is_dirty(key):
+                self._recent.move_to_end(key)
+                skipped += 1
+                continue
+            self._recent.popitem(last=False)
+            dict.pop(self, key, None)
+            self.evictions += 1
+
+    def touch(self, key: str) -> None:
+        if self.paged and not dict.__contains__(self, key):
+            # The row was paged out under a stale reference: reporting it
+            # now would read as a delete.
+            return
+        self._report(key)
+
+    def _report(self, key: str) -> None:
+        if self._listener is not None:
+            self._listener(self.name, key)
+
+    def _written(self, key: str) -> None:
+        self._report(key)
+        self._used(key)
+
+    def _removed(self, key: str) -> None:
+        self._recent.pop(key, None)
+        self._absent.pop(key, None)
+        self._report(key)
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self._written(key)
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._removed(key)
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, default=_MISSING):
+        if key in self:
+            value = super().pop(key)
+            self._removed(key)
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._removed(key)
+        return key, value
+
+    def update(self, *args, **kwargs) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self) -> None:
+        keys = list(self)
+        super().clear()
+        for key in keys:
+            self._removed(key)
+
+    def stats(self) -> Dict[str, int]:
+        return {"resident": len(self), "evictions": self.evictions}
+
+
+class StorageBackend(ABC):
+    """Persistence strategy for the bot's tables."""
+
+    name = "base"
+
+    @abstractmethod
+    async def open(self, tables: Dict[str, Table]) -> None:
+        """Load persisted rows into `tables` and start tracking their writes."""
+
+    @abstractmethod
+    async def flush(self) -> None:
+        """Write out everything that is still pending."""
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Flush and release resources."""
+
+    async def reload(self, table: str, key: str) -> None:
+        """Re-read one key written by another process."""
+
+    @property
+    def pending(self) -> int:
+        return 0
+
+
+class WriteBehindBackend(StorageBackend):
+    """
+    Base for backends that persist outside the process.
+
+    Tables stay in memory and serve every read (paged tables: their
+    recently used rows, the rest is read on demand). Writes only mark a key
+    dirty; a background task collects dirty keys for `flush_interval`
+    seconds and hands them to `_write_batch` in one go, so handlers never
+    wait on I/O.
+    """
+
+    def __init__(self, flush_interval: float = 0.5, max_batch: int = 1000):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._tables: Dict[str, Table] = {}
+        self._dirty: Dict[Tuple[str, str], None] = {}
+        # Keys of the batch being written: still unsaved, so paged tables must keep them.
+        self._writing: Dict[Tuple[str, str], None] = {}
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._write_lock = asyncio.Lock()
+        self._connected = False
+        self.batches = 0
+
+    @abstractmethod
+    async def _connect(self) -> None: ...
+
+    @abstractmethod
+    async def _disconnect(self) -> None: ...
+
+    @abstractmethod
+    async def _load_all(self, tables: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+        """Return raw `(key, value)` rows per table name."""
+
+    @abstractmethod
+    async def _fetch(self, table: str, key: str) -> Optional[str]: ...
+
+    @abstractmethod
+    async def _write_batch(self, upserts: List[Tuple[str, str, str]], deletes: List[Tuple[str, str]]) -> None: ...
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty) + len(self._writing)
+
+    def _unsaved(self, table: str, key: str) -> bool:
+        item = (table, key)
+        return item in self._dirty or item in self._writing
+
+    async def open(self, tables: Dict[str, Table]) -> None:
+        await self._connect()
+        self._connected = True
+        self._tables = {name: t for name, t in tables.items() if t.persistent}
+
+        # Paged tables are read row by row on demand instead.
+        eager = [name for name, t in self._tables.items() if not t.max_resident]
+        loaded = await self._load_all(eager)
+        for name, table in self._tables.items():
+            if table.max_resident:
+                table.bind(self._mark, self._load_row, lambda key, name=name: self._unsaved(name, key))
+            else:
+                table.load((key, decode_value(value)) for key, value in loaded.get(name, []))
+                table.bind(self._mark)
+
+        self._writer = asyncio.create_task(self._run())
+
+    async def _load_row(self, table: str, key: str) -> Optional[Any]:
+        value = await self._fetch(table, key)
+        return None if value is None else decode_value(value)
+
+    async def reload(self, table: str, key: str) -> None:
+        target = self._tables.get(table)
+        if target is None:
+            return
+        value = await self._fetch(table, key)
+        if value is None:
+            dict.pop(target, key, None)
+        else:
+            target.load([(key, decode_value(value))])
+
+    def _mark(self, table: str, key: str) -> None:
+        self._dirty[(table, key)] = None
+        self._wakeup.set()
+
+    def _snapshot(self) -> Tuple[list, list, list]:
+        """Serialize dirty keys in the event loop, so I/O never sees live dicts."""
+        upserts, deletes = [], []
+        batch = list(self._dirty)[: self.max_batch]
+        for item in batch:
+            del self._dirty[item]
+            self._writing[item] = None
+            tbl, key = item
+            table = self._tables.get(tbl)
+            if table is None:
+                continue
+            if key in table:
+                upserts.append((tbl, key, encode_value(table[key])))
+            else:
+                deletes.append((tbl, key))
+        return batch, upserts, deletes
+
+    async def flush(self) -> None:
+        async with self._write_lock:
+            while self._dirty and self._connected:
+                batch, upserts, deletes = self._snapshot()
+                try:
+                    await self._write_batch(upserts, deletes)
+                except Exception:
+                    for item in batch:
+                        self._dirty[item] = None
+                    raise
+                finally:
+                    for item in batch:
+                        self._writing.pop(item, None)
+                self.batches += 1
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                print(f"⚠️ {self.name} storage flush failed: {exc}")
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if self._connected:
+            await self.flush()
+            self._connected = False
+            await self._disconnect()
+        for table in self._tables.values():
+            table.bind(None)
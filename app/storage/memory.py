@@ -1,7 +1,50 @@
-USER_SPOTIFY: dict[str, dict] = {}
+import asyncio
+from typing import Dict
 
-LAST_SHOWN: dict[str, list] = {}
+from app.storage.base import StorageBackend, Table
+from app.storage.session import SessionStore
 
-STATS: dict[str, dict] = {}
+USER_SPOTIFY: Table = Table("user_spotify")
 
-ARTIST_COUNTER: dict[str, dict[str, int]] = {}
+# What the delete prompt listed, as `ShownTrack`s; only needed until the user answers.
+LAST_SHOWN: SessionStore = SessionStore("last_shown", ttl=15 * 60)
+
+# Per-user rows below are only needed while that user is active, so
+# persistent backends page them in on demand (see `ensure_user`).
+STATS: Table = Table("stats", max_resident=50_000)
+
+# Checkpoints of running bulk imports, so they resume after a restart. The
+# query list lives in IMPORT_QUERIES, written once, so a checkpoint after
+# every batch re-writes only the counters and the position.
+IMPORTS: Table = Table("imports")
+IMPORT_QUERIES: Table = Table("import_queries")
+
+# Mirrored playlist per user: target, filter and the last seen snapshot and contents.
+PLAYLIST_SYNC: Table = Table("playlist_sync", max_resident=1_000)
+
+TABLES: Dict[str, Table] = {
+    t.name: t for t in (USER_SPOTIFY, STATS, IMPORTS, IMPORT_QUERIES, PLAYLIST_SYNC)
+}
+
+SESSIONS: Dict[str, SessionStore] = {s.name: s for s in (LAST_SHOWN,)}
+
+
+async def ensure_user(tg: str) -> None:
+    """Page in every row this user has in the paged tables."""
+    await asyncio.gather(*(table.ensure(tg) for table in TABLES.values() if table.paged))
+
+
+class MemoryBackend(StorageBackend):
+    """Keeps everything in the process; state is lost on restart."""
+
+    name = "memory"
+
+    async def open(self, tables: Dict[str, Table]) -> None:
+        for table in tables.values():
+            table.bind(None)
+
+    async def flush(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
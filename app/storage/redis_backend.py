@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.storage.base import WriteBehindBackend
+
+
+class RedisBackend(WriteBehindBackend):
+    """
+    Shared state for multi-process deployments.
+
+    Each table is one Redis hash (`<prefix>:<table>`); a write-behind batch
+    is sent as one MULTI/EXEC pipeline. Any server that speaks the Redis
+    protocol for HGETALL/HGET/HSET/HDEL works.
+    """
+
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = "",
+        client: Any = None,
+        prefix: str = "musicbot",
+        flush_interval: float = 0.2,
+        max_batch: int = 1000,
+    ):
+        super().__init__(flush_interval=flush_interval, max_batch=max_batch)
+        self.url = url
+        self.prefix = prefix
+        self._client = client
+        self._owns_client = client is None
+
+    def _key(self, table: str) -> str:
+        return f"{self.prefix}:{table}"
+
+    async def _connect(self) -> None:
+        if self._client is None:
+            from redis.asyncio import Redis
+
+            self._client = Redis.from_url(self.url, decode_responses=True)
+
+    async def _disconnect(self) -> None:
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+    async def _load_all(self, tables: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+        loaded = {}
+        for table in tables:
+            rows = await self._client.hgetall(self._key(table))
+            loaded[table] = list(rows.items())
+        return loaded
+
+    async def _fetch(self, table: str, key: str) -> Optional[str]:
+        return await self._client.hget(self._key(table), key)
+
+    async def _write_batch(self, upserts: list, deletes: list) -> None:
+        pipe = self._client.pipeline(transaction=True)
+        for tbl, key, value in upserts:
+            pipe.hset(self._key(tbl), key, value)
+        for tbl, key in deletes:
+            pipe.hdel(self._key(tbl), key)
+        await pipe.execute()
@@ -0,0 +1,150 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+class ShownTrack:
+    """What a track list showed the user: enough to act on "delete 3"."""
+
+    __slots__ = ("id", "title", "artist")
+
+    def __init__(self, id: str, title: str, artist: str):
+        self.id = id
+        self.title = title
+        self.artist = artist
+
+    def __repr__(self) -> str:
+        return f"ShownTrack({self.id!r}, {self.title!r}, {self.artist!r})"
+
+
+def resident_size(value: Any) -> int:
+    """Approximate bytes held by `value`: containers, strings and `__slots__` records."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        return size + sum(resident_size(k) + resident_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(resident_size(item) for item in value)
+    for slot in getattr(type(value), "__slots__", ()):
+        size += resident_size(getattr(value, slot, None))
+    return size
+
+
+class _Meta:
+    __slots__ = ("expires_at", "size")
+
+    def __init__(self, expires_at: float, size: int):
+        self.expires_at = expires_at
+        self.size = size
+
+
+class SessionStore(dict):
+    """
+    Short-lived per-user state that is fine to lose (e.g. the list the
+    delete prompt showed).
+
+    Reads like a dict. Entries expire `ttl` seconds after they were
+    written; once the values together exceed `max_bytes`, the least
+    recently used go first. Expired entries are dropped when touched and
+    by a sweep whenever the store has doubled since the last one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = 900.0,
+        max_bytes: int = 32 * 1024 * 1024,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__()
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._meta: "OrderedDict[Any, _Meta]" = OrderedDict()
+        self._sweep_at = 1024
+        self.bytes = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _alive(self, key) -> bool:
+        meta = self._meta.get(key)
+        if meta is None:
+            return False
+        if meta.expires_at <= self._clock():
+            self._drop(key)
+            self.expired += 1
+            return False
+        self._meta.move_to_end(key)
+        return True
+
+    def _drop(self, key) -> None:
+        meta = self._meta.pop(key)
+        self.bytes -= meta.size
+        dict.__delitem__(self, key)
+
+    def __contains__(self, key) -> bool:
+        return self._alive(key)
+
+    def __getitem__(self, key):
+        if not self._alive(key):
+            raise KeyError(key)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        return dict.__getitem__(self, key) if self._alive(key) else default
+
+    def __setitem__(self, key, value) -> None:
+        if key in self._meta:
+            self._drop(key)
+        if len(self._meta) >= self._sweep_at:
+            self.sweep()
+        size = resident_size(value)
+        dict.__setitem__(self, key, value)
+        self._meta[key] = _Meta(self._clock() + self.ttl, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and len(self._meta) > 1:
+            self._drop(next(iter(self._meta)))
+            self.evictions += 1
+
+    def setdefault(self, key, default=None):
+        if self._alive(key):
+            return dict.__getitem__(self, key)
+        self[key] = default
+        return default
+
+    def __delitem__(self, key) -> None:
+        if key not in self._meta:
+            raise KeyError(key)
+        self._drop(key)
+
+    def pop(self, key, *default):
+        if self._alive(key):
+            value = dict.__getitem__(self, key)
+            self._drop(key)
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def clear(self) -> None:
+        dict.clear(self)
+        self._meta.clear()
+        self.bytes = 0
+
+    def sweep(self) -> None:
+        now = self._clock()
+        for key in [k for k, meta in self._meta.items() if meta.expires_at <= now]:
+            self._drop(key)
+            self.expired += 1
+        self._sweep_at = max(1024, 2 * len(self._meta))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._meta),
+            "bytes": self.bytes,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
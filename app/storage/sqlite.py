@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+from app.storage.base import WriteBehindBackend
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    tbl   TEXT NOT NULL,
+    key   TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (tbl, key)
+) WITHOUT ROWID
+"""
+
+
+class SqliteBackend(WriteBehindBackend):
+    """SQLite (WAL) persistence; batches are written in one transaction on a worker thread."""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, flush_interval: float = 0.5, max_batch: int = 1000):
+        super().__init__(flush_interval=flush_interval, max_batch=max_batch)
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _open_connection(self) -> sqlite3.Connection:
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    async def _connect(self) -> None:
+        self._conn = await asyncio.to_thread(self._open_connection)
+
+    async def _disconnect(self) -> None:
+        if self._conn is not None:
+            await asyncio.to_thread(self._conn.close)
+            self._conn = None
+
+    def _read_all(self, tables: List[str]) -> List[Tuple[str, str, str]]:
+        if not tables:
+            return []
+        marks = ", ".join("?" * len(tables))
+        return self._conn.execute(f"SELECT tbl, key, value FROM kv WHERE tbl IN ({marks})", tables).fetchall()
+
+    async def _load_all(self, tables: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+        rows = await asyncio.to_thread(self._read_all, tables)
+        loaded: Dict[str, List[Tuple[str, str]]] = {}
+        for tbl, key, value in rows:
+            loaded.setdefault(tbl, []).append((key, value))
+        return loaded
+
+    def _read_one(self, table: str, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM kv WHERE tbl = ? AND key = ?", (table, key)).fetchone()
+        return row[0] if row else None
+
+    async def _fetch(self, table: str, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._read_one, table, key)
+
+    def _write(self, upserts: list, deletes: list) -> None:
+        conn = self._conn
+        conn.execute("BEGIN")
+        try:
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO kv (tbl, key, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT (tbl, key) DO UPDATE SET value = excluded.value",
+                    upserts,
+                )
+            if deletes:
+                conn.executemany("DELETE FROM kv WHERE tbl = ? AND key = ?", deletes)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def _write_batch(self, upserts: list, deletes: list) -> None:
+        await asyncio.to_thread(self._write, upserts, deletes)
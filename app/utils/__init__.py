@@ -1,3 +1,5 @@
 from .time import human_time
+from .ratelimit import TokenBucket
+from .text import clip, clip_html, split_message
 
-__all__ = ["human_time"]
+__all__ = ["human_time", "TokenBucket", "clip", "clip_html", "split_message"]
@@ -0,0 +1,48 @@
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """
+    Token bucket with reservations.
+
+    `reserve()` always takes the tokens and returns how long the caller has
+    to wait before using them, so concurrent callers queue up in arrival
+    order instead of polling.
+    """
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._tokens = float(capacity)
+        self._updated = clock()
+
+    def _refill(self, now: float) -> None:
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        now = self._clock()
+        self._refill(now)
+        self._tokens -= amount
+        wait = max(self._updated - now, 0.0)
+        if self._tokens < 0:
+            wait += -self._tokens / self.rate
+        return wait
+
+    def pause_until(self, until: float) -> None:
+        """Drop accumulated burst and accrue nothing before `until`."""
+        self._refill(self._clock())
+        self._tokens = min(self._tokens, 0.0)
+        self._updated = max(self._updated, until)
+
+    @property
+    def available(self) -> float:
+        self._refill(self._clock())
+        return self._tokens
+
+    @property
+    def idle(self) -> bool:
+        return self.available >= self.capacity
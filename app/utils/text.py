@@ -0,0 +1,55 @@
+import html
+from typing import Iterable, List
+
+MESSAGE_LIMIT = 4096
+
+
+def clip(text: str, width: int) -> str:
+    """Cut `text` to at most `width` characters, marking the cut with an ellipsis."""
+    return text if len(text) <= width else text[: max(width - 1, 0)] + "…"
+
+
+def clip_html(text: str, width: int) -> str:
+    """Escape `text` for HTML and cut it so the escaped form is at most `width` characters."""
+    escaped = html.escape(text)
+    if len(escaped) <= width:
+        return escaped
+    pieces: List[str] = []
+    used = 0
+    for ch in text:
+        # Escape per character, so the cut never splits an entity like `&amp;`.
+        piece = html.escape(ch)
+        if used + len(piece) > width - 1:
+            break
+        pieces.append(piece)
+        used += len(piece)
+    return "".join(pieces) + "…"
+
+
+def split_message(lines: Iterable[str], header: str = "", limit: int = MESSAGE_LIMIT) -> List[str]:
+    """
+    Join `lines` into as few messages as possible, each at most `limit` characters.
+
+    Lines are never broken across messages unless a single line is longer
+    than `limit` on its own; `header` starts the first message only.
+    """
+    chunks: List[str] = []
+    current = header
+    for line in lines:
+        if len(line) >= limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            while len(line) >= limit:
+                chunks.append(line[:limit])
+                line = line[limit:]
+            if not line:
+                continue
+        candidate = f"{current}{line}\n"
+        if len(candidate) > limit and current:
+            chunks.append(current)
+            candidate = f"{line}\n"
+        current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class FakeSpotifyOptions:
+    latency: float = 0.0
+    jitter: float = 0.0
+    rate_429: float = 0.0
+    retry_after: str = "0"
+    library_size: int = 200
+    seed: int = 1
+
+
+def _track(track_id: str, name: str, artist_no: int) -> dict:
+    return {
+        "id": track_id,
+        "name": name,
+        "duration_ms": 180_000 + artist_no * 1000,
+        "artists": [{"id": f"artist{artist_no}", "name": f"Artist {artist_no}"}],
+        "album": {"images": [{"url": f"https://img.example/{track_id}.jpg"}]},
+    }
+
+
+def _iso(ts: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+class FakeSpotify:
+    """
+    In-process stand-in for the Spotify Web API and accounts endpoints
+    used by the bot. Libraries are created per access token on first use.
+    """
+
+    def __init__(self, options: Optional[FakeSpotifyOptions] = None):
+        self.options = options or FakeSpotifyOptions()
+        self.random = random.Random(self.options.seed)
+        self.libraries: Dict[str, List[dict]] = {}
+        self.catalog: Dict[str, dict] = {}
+        self.calls: Counter = Counter()
+        self.throttled = 0
+        self.not_modified = 0
+
+    def library(self, token: str) -> List[dict]:
+        """Saved tracks of one user, newest first."""
+        lib = self.libraries.get(token)
+        if lib is None:
+            now = time.time()
+            size = self.options.library_size
+            lib = []
+            for i in range(size):
+                track = _track(f"{token}-lib{i}", f"Saved {i}", i % 97)
+                lib.append({"added_at": _iso(now - i * 3600), "track": track})
+            self.libraries[token] = lib
+        return lib
+
+    def _search(self, query: str) -> dict:
+        digest = hashlib.md5(query.casefold().encode()).hexdigest()
+        track_id = f"s{digest[:16]}"
+        track = self.catalog.get(track_id)
+        if track is None:
+            track = self.catalog[track_id] = _track(track_id, query, int(digest[:4], 16) % 97)
+        return track
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        self.calls[f"{request.method} {request.path}"] += 1
+        opts = self.options
+        if opts.latency or opts.jitter:
+            await asyncio.sleep(opts.latency + self.random.uniform(0, opts.jitter))
+        if opts.rate_429 and request.path.startswith("/v1") and self.random.random() < opts.rate_429:
+            self.throttled += 1
+            return web.json_response(
+                {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                status=429,
+                headers={"Retry-After": opts.retry_after},
+            )
+        return await handler(request)
+
+    @staticmethod
+    def _token(request: web.Request) -> str:
+        return request.headers.get("Authorization", "").removeprefix("Bearer ")
+
+    def _cacheable(self, request: web.Request, data) -> web.Response:
+        """A JSON response with an ETag, or an empty 304 when the client already has it."""
+        body = json.dumps(data)
+        etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(text=body, content_type="application/json", headers={"ETag": etag})
+
+    async def me(self, request: web.Request) -> web.Response:
+        return self._cacheable(request, {"id": f"user-{self._token(request)}"})
+
+    async def search(self, request: web.Request) -> web.Response:
+        track = self._search(request.query.get("q", ""))
+        return self._cacheable(request, {"tracks": {"items": [track], "total": 1}})
+
+    async def saved(self, request: web.Request) -> web.Response:
+        lib = self.library(self._token(request))
+        limit = int(request.query.get("limit", 20))
+        offset = int(request.query.get("offset", 0))
+        return self._cacheable(request, {"items": lib[offset:offset + limit], "total": len(lib), "limit": limit, "offset": offset})
+
+    async def contains(self, request: web.Request) -> web.Response:
+        saved = {item["track"]["id"] for item in self.library(self._token(request))}
+        ids = [i for i in request.query.get("ids", "").split(",") if i]
+        return self._cacheable(request, [i in saved for i in ids])
+
+    async def save(self, request: web.Request) -> web.Response:
+        lib = self.library(self._token(request))
+        ids = (await request.json()).get("ids", [])
+        known = {item["track"]["id"] for item in lib}
+        now = _iso(time.time())
+        for track_id in ids:
+            if track_id not in known:
+                track = self.catalog.get(track_id) or _track(track_id, track_id, 0)
+                lib.insert(0, {"added_at": now, "track": track})
+        return web.Response(status=200)
+
+    async def remove(self, request: web.Request) -> web.Response:
+        token = self._token(request)
+        ids = set((await request.json()).get("ids", []))
+        self.libraries[token] = [item for item in self.library(token) if item["track"]["id"] not in ids]
+        return web.Response(status=200)
+
+    async def token(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if form.get("grant_type") == "authorization_code":
+            access = f"tok-{form.get('code')}"
+        else:
+            access = f"tok-{form.get('refresh_token')}"
+        return web.json_response({"access_token": access, "refresh_token": form.get("code") or form.get("refresh_token"), "expires_in": 3600, "scope": ""})
+
+    def make_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/v1/me", self.me)
+        app.router.add_get("/v1/search", self.search)
+        app.router.add_get("/v1/me/tracks", self.saved)
+        app.router.add_get("/v1/me/tracks/contains", self.contains)
+        app.router.add_put("/v1/me/tracks", self.save)
+        app.router.add_delete("/v1/me/tracks", self.remove)
+        app.router.add_post("/api/token", self.token)
+        return app
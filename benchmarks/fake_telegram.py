@@ -0,0 +1,66 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+
+class FakeTelegram:
+    """
+    Minimal Bot API server: accepts every method and returns a plausible
+    result, so the real aiogram client code runs end to end.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(1)
+
+    async def _params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        form = await request.post()
+        return {k: v for k, v in form.items() if isinstance(v, str)}
+
+    def _message(self, params: Dict[str, Any], extra: Optional[dict] = None) -> dict:
+        chat_id = params.get("chat_id", 0)
+        try:
+            chat_id = int(chat_id)
+        except (TypeError, ValueError):
+            chat_id = 0
+        message = {
+            "message_id": int(params.get("message_id") or next(self._ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if extra:
+            message.update(extra)
+        return message
+
+    async def method(self, request: web.Request) -> web.Response:
+        name = request.match_info["method"]
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = await self._params(request)
+
+        lowered = name.lower()
+        if lowered in ("sendmessage", "editmessagetext"):
+            result: Any = self._message(params)
+        elif lowered == "sendphoto":
+            result = self._message(params, {"photo": [{"file_id": "f", "file_unique_id": "u", "width": 1, "height": 1}]})
+        elif lowered == "getme":
+            result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        else:
+            result = True
+        return web.Response(text=json.dumps({"ok": True, "result": result}), content_type="application/json")
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.method)
+        return app
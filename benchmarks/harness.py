@@ -0,0 +1,363 @@
+import asyncio
+import itertools
+import json
+import math
+import os
+import resource
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+import app.spotify.client as client_mod
+import app.spotify.library as library_mod
+import app.spotify.oauth as oauth_mod
+from app.bot import register_handlers
+from app.bot.middlewares import setup_middlewares
+from app.bot.outbox import Outbox
+from app.spotify import http as http_mod
+from app.spotify import fairness, http_cache, pages, ratelimit, search_cache
+from app.storage import memory
+
+from benchmarks.fake_spotify import FakeSpotify, FakeSpotifyOptions
+from benchmarks.fake_telegram import FakeTelegram
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        # Not Linux: the peak is the best we have.
+        return peak_rss_mb()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+class ServerThread:
+    """
+    Serves aiohttp apps from a separate thread and event loop, so the fakes
+    neither compete with nor get blocked by the bot's event loop.
+    """
+
+    def __init__(self, *apps: web.Application):
+        self.apps = apps
+        self.urls: List[str] = []
+        self._loop = asyncio.new_event_loop()
+        self._runners: List[web.AppRunner] = []
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._serve, name="bench-fakes", daemon=True)
+
+    def _serve(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._cleanup())
+        self._loop.close()
+
+    async def _start(self) -> None:
+        for app in self.apps:
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            host, port = runner.addresses[0][:2]
+            self._runners.append(runner)
+            self.urls.append(f"http://{host}:{port}")
+
+    async def _cleanup(self) -> None:
+        for runner in self._runners:
+            await runner.cleanup()
+
+    def start(self) -> List[str]:
+        self._thread.start()
+        self._ready.wait()
+        return self.urls
+
+    def stop(self) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+@dataclass
+class BenchOptions:
+    users: int = 50
+    spotify: FakeSpotifyOptions = field(default_factory=FakeSpotifyOptions)
+    telegram_latency: float = 0.0
+    app_rate: float = 10_000.0
+    user_rate: float = 10_000.0
+    # Outbox limits; the fake Telegram enforces none, so by default they stay out of the way.
+    telegram_rate: float = 10_000.0
+
+
+class BenchEnv:
+    """
+    Runs the real dispatcher and handlers against local fake Spotify and
+    Telegram servers. Module-level endpoints and singletons are swapped
+    on enter and restored on exit.
+    """
+
+    def __init__(self, options: Optional[BenchOptions] = None):
+        self.options = options or BenchOptions()
+        self.spotify = FakeSpotify(self.options.spotify)
+        self.telegram = FakeTelegram(latency=self.options.telegram_latency)
+        self.users = [100_000 + i for i in range(self.options.users)]
+        self._update_ids = itertools.count(1)
+        self._servers: Optional[ServerThread] = None
+        self._saved: Dict[tuple, object] = {}
+        self.bot: Optional[Bot] = None
+        self.dp: Optional[Dispatcher] = None
+        self.oauth: Optional[TestClient] = None
+        self.outbox: Optional[Outbox] = None
+
+    def _patch(self, module, name: str, value) -> None:
+        self._saved.setdefault((module, name), getattr(module, name))
+        setattr(module, name, value)
+
+    async def __aenter__(self) -> "BenchEnv":
+        self._servers = ServerThread(self.spotify.make_app(), self.telegram.make_app())
+        spotify_url, telegram_url = await asyncio.to_thread(self._servers.start)
+
+        config = SimpleNamespace(
+            telegram=SimpleNamespace(token=""),
+            spotify=SimpleNamespace(client_id="bench", client_secret="bench", redirect_uri="http://bench/callback", scopes=""),
+            oauth=SimpleNamespace(host="127.0.0.1", port=0, metrics_token=""),
+        )
+        self._patch(client_mod, "API_BASE", f"{spotify_url}/v1")
+        self._patch(oauth_mod, "TOKEN_URL", f"{spotify_url}/api/token")
+        self._patch(oauth_mod, "_load_config_or_raise", lambda: config)
+        self._patch(oauth_mod, "_config", config)
+
+        opts = self.options
+        ratelimit.set_scheduler(ratelimit.RateLimitScheduler(
+            app_rate=opts.app_rate, app_burst=opts.app_rate,
+            user_rate=opts.user_rate, user_burst=opts.user_rate,
+            base_delay=0.01,
+        ))
+        search_cache.set_search_cache(None)
+        pages.set_page_cache(None)
+        http_cache.set_response_cache(None)
+        fairness.set_fair_scheduler(None)
+        for table in memory.TABLES.values():
+            dict.clear(table)
+        for store in memory.SESSIONS.values():
+            store.clear()
+        library_mod._LIBRARIES.clear()
+
+        await http_mod.init_session()
+
+        far = int(time.time()) + 10 * 365 * 24 * 3600
+        for uid in self.users:
+            memory.USER_SPOTIFY[str(uid)] = {"access_token": f"tok-{uid}", "refresh_token": str(uid), "expires_at": far}
+
+        self.bot = Bot(token="123456:bench", session=AiohttpSession(api=TelegramAPIServer.from_base(telegram_url)))
+        self.dp = Dispatcher(storage=MemoryStorage())
+        self.dp["bot"] = self.bot
+        self.outbox = self.dp["outbox"] = Outbox(
+            self.bot, global_rate=opts.telegram_rate, chat_rate=opts.telegram_rate, chat_burst=opts.telegram_rate
+        )
+        self.outbox.start()
+        # Lanes replay the same press back-to-back on purpose; don't fold them.
+        setup_middlewares(self.dp, press_window=0)
+        register_handlers(self.dp)
+
+        self.oauth = TestClient(TestServer(oauth_mod.create_oauth_app(config, self.outbox)))
+        await self.oauth.start_server()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self.oauth is not None:
+            await self.oauth.close()
+        if self.outbox is not None:
+            await self.outbox.stop()
+        if self.bot is not None:
+            await self.bot.session.close()
+        await oauth_mod.stop_background_tasks()
+        await pages.get_page_cache().close()
+        await http_mod.close_session()
+        await asyncio.to_thread(self._servers.stop)
+        for (module, name), value in self._saved.items():
+            setattr(module, name, value)
+        ratelimit.set_scheduler(None)
+        search_cache.set_search_cache(None)
+        pages.set_page_cache(None)
+        http_cache.set_response_cache(None)
+        fairness.set_fair_scheduler(None)
+        library_mod._LIBRARIES.clear()
+        for table in memory.TABLES.values():
+            dict.clear(table)
+        for store in memory.SESSIONS.values():
+            store.clear()
+
+    def make_update(self, user_id: int, text: str) -> dict:
+        update_id = next(self._update_ids)
+        user = {"id": user_id, "is_bot": False, "first_name": f"U{user_id}"}
+        return {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": user,
+                "text": text,
+            },
+        }
+
+    async def send(self, user_id: int, text: str) -> None:
+        await self.dp.feed_raw_update(self.bot, self.make_update(user_id, text))
+
+
+FlowFn = Callable[[BenchEnv, int, int], Awaitable[None]]
+
+
+async def flow_add(env: BenchEnv, user_id: int, i: int) -> None:
+    await env.send(user_id, "🎵 Добавить трек")
+    await env.send(user_id, f"Artist {i % 40} - Song {i % 400}")
+
+
+async def flow_my_tracks(env: BenchEnv, user_id: int, i: int) -> None:
+    await env.send(user_id, "📂 Мои треки")
+
+
+async def flow_delete(env: BenchEnv, user_id: int, i: int) -> None:
+    await env.send(user_id, "🗑 Удалить треки")
+    await env.send(user_id, "1")
+
+
+async def flow_statistics(env: BenchEnv, user_id: int, i: int) -> None:
+    await env.send(user_id, "📊 Статистика")
+
+
+async def flow_oauth(env: BenchEnv, user_id: int, i: int) -> None:
+    resp = await env.oauth.get("/callback", params={"code": str(user_id), "state": str(user_id)})
+    if resp.status != 200:
+        raise RuntimeError(f"callback returned {resp.status}")
+
+
+FLOWS: Dict[str, FlowFn] = {
+    "add": flow_add,
+    "my_tracks": flow_my_tracks,
+    "delete": flow_delete,
+    "statistics": flow_statistics,
+    "oauth": flow_oauth,
+}
+
+
+@dataclass
+class FlowResult:
+    flow: str
+    ops: int
+    errors: int
+    seconds: float
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    # Growth of the current RSS over the flow; the process peak never comes
+    # down, so after the first flow it would only repeat earlier ones.
+    rss_delta_mb: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+async def run_flow(env: BenchEnv, name: str, iterations: int, concurrency: int) -> FlowResult:
+    """Run `iterations` ops of one flow; each of `concurrency` lanes drives its own user."""
+    flow = FLOWS[name]
+    lanes = max(1, min(concurrency, len(env.users)))
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def lane(user_id: int) -> None:
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= iterations:
+                return
+            started = time.perf_counter()
+            try:
+                await flow(env, user_id, i)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    await asyncio.gather(*(lane(env.users[k]) for k in range(lanes)))
+    seconds = time.perf_counter() - started
+    rss_after = current_rss_mb()
+
+    latencies.sort()
+    return FlowResult(
+        flow=name,
+        ops=len(latencies),
+        errors=errors,
+        seconds=round(seconds, 4),
+        throughput=round(len(latencies) / seconds, 2) if seconds else 0.0,
+        p50_ms=round(percentile(latencies, 50) * 1000, 3),
+        p95_ms=round(percentile(latencies, 95) * 1000, 3),
+        p99_ms=round(percentile(latencies, 99) * 1000, 3),
+        rss_delta_mb=round(rss_after - rss_before, 1),
+    )
+
+
+async def run_suite(
+    flows: List[str],
+    iterations: int = 200,
+    concurrency: int = 20,
+    options: Optional[BenchOptions] = None,
+) -> List[FlowResult]:
+    results = []
+    for name in flows:
+        # A fresh environment per flow keeps flows from warming each other's caches.
+        async with BenchEnv(options) as env:
+            results.append(await run_flow(env, name, iterations, concurrency))
+    return results
+
+
+def compare(results: List[FlowResult], baseline: Dict[str, dict], tolerance: float = 0.2) -> List[str]:
+    """Regressions beyond `tolerance` (0.2 = 20%) against a stored baseline."""
+    problems = []
+    for res in results:
+        base = baseline.get(res.flow)
+        if not base:
+            continue
+        if base["throughput"] and res.throughput < base["throughput"] * (1 - tolerance):
+            problems.append(f"{res.flow}: throughput {res.throughput} < baseline {base['throughput']}")
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and getattr(res, key) > base[key] * (1 + tolerance):
+                problems.append(f"{res.flow}: {key} {getattr(res, key)} > baseline {base[key]}")
+        if res.errors > base.get("errors", 0):
+            problems.append(f"{res.flow}: {res.errors} errors (baseline {base.get('errors', 0)})")
+    return problems
+
+
+def load_baseline(path: str) -> Dict[str, dict]:
+    with open(path, encoding="utf-8") as f:
+        return {row["flow"]: row for row in json.load(f)}
+
+
+def save_results(results: List[FlowResult], path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([r.to_dict() for r in results], f, indent=2)
@@ -0,0 +1,377 @@
+"""
+Load test: virtual users with think time, ramped up against the real
+dispatcher and the local fakes, reporting where latency breaks down.
+
+    python -m benchmarks.load --users 10000 --ramp 120 --hold 60 --think exponential:3
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field, replace
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.storage import memory
+from app.storage.session import resident_size
+
+from benchmarks.fake_spotify import FakeSpotifyOptions
+from benchmarks.harness import BenchEnv, BenchOptions, current_rss_mb, percentile
+
+THINK_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+# Relative weights of what a connected user does next.
+DEFAULT_MIX = {"add": 3.0, "browse": 3.0, "delete": 1.0, "stats": 1.0}
+
+
+@dataclass
+class ThinkTime:
+    """Pause between two steps of a virtual user, in seconds, with mean `mean`."""
+
+    dist: str = "exponential"
+    mean: float = 2.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "ThinkTime":
+        """`exponential:2.5`, `uniform:1`, `constant:0.5`, `lognormal:3`."""
+        dist, _, mean = spec.partition(":")
+        if dist not in THINK_DISTRIBUTIONS:
+            raise ValueError(f"think time distribution must be one of {', '.join(THINK_DISTRIBUTIONS)}")
+        return cls(dist, float(mean) if mean else cls.mean)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.dist == "constant":
+            return self.mean
+        if self.dist == "uniform":
+            return rng.uniform(0, 2 * self.mean)
+        if self.dist == "lognormal":
+            # sigma 1: a long tail of users who wander off for a while.
+            return rng.lognormvariate(math.log(self.mean) - 0.5, 1.0)
+        return rng.expovariate(1 / self.mean)
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """`add=3,browse=3,delete=1,stats=1`."""
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in ACTIONS:
+            raise ValueError(f"unknown action {name!r}; known: {', '.join(ACTIONS)}")
+        mix[name] = float(weight or 1)
+    if not mix or not any(mix.values()):
+        raise ValueError("the action mix needs at least one positive weight")
+    return mix
+
+
+@dataclass
+class LoadOptions:
+    users: int = 1000
+    ramp: float = 60.0
+    hold: float = 30.0
+    think: ThinkTime = field(default_factory=ThinkTime)
+    mix: Dict[str, float] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    window: float = 5.0
+    slo_ms: float = 1000.0
+    max_error_rate: float = 0.01
+    seed: int = 1
+    bench: BenchOptions = field(default_factory=BenchOptions)
+
+
+@dataclass
+class LoadWindow:
+    t: float
+    users: int
+    ops: int
+    errors: int
+    throughput: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    rss_mb: float
+
+
+@dataclass
+class LoadReport:
+    windows: List[LoadWindow]
+    steps: Dict[str, dict]
+    ops: int
+    errors: int
+    peak_throughput: float
+    peak_users: int
+    saturated_users: Optional[int]
+    saturated_at: Optional[float]
+    rss_per_user_kb: float
+    state_per_user_kb: float
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class Recorder:
+    """Step latencies, kept per window for the timeline and per step name for the summary."""
+
+    def __init__(self):
+        self.window: List[float] = []
+        self.window_errors = 0
+        self.by_step: Dict[str, List[float]] = {}
+        self.errors = 0
+
+    def add(self, step: str, seconds: float, ok: bool) -> None:
+        self.window.append(seconds)
+        self.by_step.setdefault(step, []).append(seconds)
+        if not ok:
+            self.window_errors += 1
+            self.errors += 1
+
+    def take(self) -> Tuple[List[float], int]:
+        window, errors = self.window, self.window_errors
+        self.window, self.window_errors = [], 0
+        return window, errors
+
+
+def _ms(values: List[float], pct: float) -> float:
+    return round(percentile(values, pct) * 1000, 3)
+
+
+def saturation_point(windows: List[LoadWindow], slo_ms: float, max_error_rate: float) -> Optional[LoadWindow]:
+    """First window whose p95 misses the SLO or whose error rate is too high."""
+    for w in windows:
+        if not w.ops:
+            continue
+        if w.p95_ms > slo_ms or w.errors / w.ops > max_error_rate:
+            return w
+    return None
+
+
+StepFn = Callable[[BenchEnv, int, random.Random], Awaitable[None]]
+
+
+async def _callback(env: BenchEnv, user_id: int, rng: random.Random) -> None:
+    resp = await env.oauth.get("/callback", params={"code": str(user_id), "state": str(user_id)})
+    if resp.status != 200:
+        raise RuntimeError(f"callback returned {resp.status}")
+
+
+async def _track_title(env: BenchEnv, user_id: int, rng: random.Random) -> None:
+    n = rng.randrange(4000)
+    await env.send(user_id, f"Artist {n % 97} - Song {n}")
+
+
+def _step(text: str) -> StepFn:
+    async def send(env: BenchEnv, user_id: int, rng: random.Random) -> None:
+        await env.send(user_id, text)
+
+    return send
+
+
+# A session opens with /start and the OAuth round trip; the FSM steps
+# (waiting_add, waiting_delete) get their own think time in between.
+SESSION_START: List[Tuple[str, StepFn]] = [
+    ("start", _step("/start")),
+    ("connect", _step("🔐 Подключить Spotify")),
+    ("oauth_callback", _callback),
+]
+
+ACTIONS: Dict[str, List[Tuple[str, StepFn]]] = {
+    "add": [("add_open", _step("🎵 Добавить трек")), ("add_title", _track_title)],
+    "browse": [("browse", _step("📂 Мои треки"))],
+    "delete": [("delete_open", _step("🗑 Удалить треки")), ("delete_pick", _step("1"))],
+    "stats": [("stats", _step("📊 Статистика"))],
+}
+
+
+async def _pause(stop: asyncio.Event, seconds: float) -> None:
+    if seconds <= 0:
+        return
+    try:
+        await asyncio.wait_for(stop.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _virtual_user(
+    env: BenchEnv, user_id: int, options: LoadOptions, recorder: Recorder, stop: asyncio.Event
+) -> None:
+    rng = random.Random(options.seed * 1_000_003 + user_id)
+    names = list(options.mix)
+    weights = [options.mix[n] for n in names]
+
+    async def run(steps: List[Tuple[str, StepFn]]) -> None:
+        for name, step in steps:
+            if stop.is_set():
+                return
+            started = time.perf_counter()
+            ok = True
+            try:
+                await step(env, user_id, rng)
+            except Exception:
+                ok = False
+            recorder.add(name, time.perf_counter() - started, ok)
+            await _pause(stop, options.think.sample(rng))
+
+    await run(SESSION_START)
+    while not stop.is_set():
+        await run(ACTIONS[rng.choices(names, weights)[0]])
+
+
+def _state_bytes() -> int:
+    tables = list(memory.TABLES.values()) + list(memory.SESSIONS.values())
+    return sum(resident_size(dict(table)) for table in tables)
+
+
+async def run_load(options: LoadOptions) -> LoadReport:
+    bench = replace(options.bench, users=options.users)
+    recorder = Recorder()
+    stop = asyncio.Event()
+    windows: List[LoadWindow] = []
+    active = 0
+
+    async def user(index: int, user_id: int) -> None:
+        nonlocal active
+        await _pause(stop, index * options.ramp / options.users)
+        if stop.is_set():
+            return
+        active += 1
+        try:
+            await _virtual_user(env, user_id, options, recorder, stop)
+        finally:
+            active -= 1
+
+    async def sample() -> None:
+        started = time.perf_counter()
+        while not stop.is_set():
+            await _pause(stop, options.window)
+            latencies, errors = recorder.take()
+            latencies.sort()
+            elapsed = time.perf_counter() - started
+            windows.append(LoadWindow(
+                t=round(elapsed, 2),
+                users=active,
+                ops=len(latencies),
+                errors=errors,
+                throughput=round(len(latencies) / options.window, 2),
+                p50_ms=_ms(latencies, 50),
+                p95_ms=_ms(latencies, 95),
+                p99_ms=_ms(latencies, 99),
+                rss_mb=round(current_rss_mb(), 1),
+            ))
+
+    async with BenchEnv(bench) as env:
+        # The harness pre-connects everyone; sessions connect through OAuth themselves.
+        for uid in env.users:
+            memory.USER_SPOTIFY.pop(str(uid), None)
+        rss_before = current_rss_mb()
+        state_before = _state_bytes()
+
+        sampler = asyncio.create_task(sample())
+        users = [asyncio.create_task(user(i, uid)) for i, uid in enumerate(env.users)]
+        await asyncio.sleep(options.ramp + options.hold)
+        stop.set()
+        await asyncio.gather(*users)
+        await sampler
+
+        rss_after = current_rss_mb()
+        state_after = _state_bytes()
+
+    ops = sum(len(v) for v in recorder.by_step.values())
+    steps = {}
+    for name, values in recorder.by_step.items():
+        values.sort()
+        steps[name] = {"ops": len(values), "p50_ms": _ms(values, 50), "p95_ms": _ms(values, 95), "p99_ms": _ms(values, 99)}
+    peak = max(windows, key=lambda w: w.throughput, default=None)
+    saturated = saturation_point(windows, options.slo_ms, options.max_error_rate)
+    return LoadReport(
+        windows=windows,
+        steps=steps,
+        ops=ops,
+        errors=recorder.errors,
+        peak_throughput=peak.throughput if peak else 0.0,
+        peak_users=peak.users if peak else 0,
+        saturated_users=saturated.users if saturated else None,
+        saturated_at=saturated.t if saturated else None,
+        rss_per_user_kb=round(max(rss_after - rss_before, 0.0) * 1024 / options.users, 2),
+        state_per_user_kb=round(max(state_after - state_before, 0) / 1024 / options.users, 2),
+    )
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Ramp virtual users against the bot with fake Spotify/Telegram/OAuth")
+    p.add_argument("--users", type=int, default=1000, help="virtual users at the end of the ramp")
+    p.add_argument("--ramp", type=float, default=60.0, help="seconds over which users arrive")
+    p.add_argument("--hold", type=float, default=30.0, help="seconds at full load after the ramp")
+    p.add_argument("--think", default="exponential:2", help=f"DIST:MEAN, DIST one of {', '.join(THINK_DISTRIBUTIONS)}")
+    p.add_argument("--mix", default=",".join(f"{k}={v:g}" for k, v in DEFAULT_MIX.items()))
+    p.add_argument("--window", type=float, default=5.0, help="seconds per report line")
+    p.add_argument("--slo-ms", type=float, default=1000.0, help="p95 step latency that counts as saturated")
+    p.add_argument("--max-error-rate", type=float, default=0.01)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--latency", type=float, default=0.05, help="fake Spotify latency, seconds")
+    p.add_argument("--jitter", type=float, default=0.02)
+    p.add_argument("--rate-429", type=float, default=0.0)
+    p.add_argument("--library-size", type=int, default=100)
+    p.add_argument("--telegram-latency", type=float, default=0.03)
+    p.add_argument("--app-rate", type=float, default=10_000.0, help="scheduler app-wide requests/s")
+    p.add_argument("--save", metavar="PATH", help="write the report as JSON")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        think = ThinkTime.parse(args.think)
+        mix = parse_mix(args.mix)
+    except ValueError as exc:
+        print(exc, file=sys.stderr)
+        return 2
+
+    options = LoadOptions(
+        users=args.users,
+        ramp=args.ramp,
+        hold=args.hold,
+        think=think,
+        mix=mix,
+        window=args.window,
+        slo_ms=args.slo_ms,
+        max_error_rate=args.max_error_rate,
+        seed=args.seed,
+        bench=BenchOptions(
+            spotify=FakeSpotifyOptions(
+                latency=args.latency,
+                jitter=args.jitter,
+                rate_429=args.rate_429,
+                library_size=args.library_size,
+                seed=args.seed,
+            ),
+            telegram_latency=args.telegram_latency,
+            app_rate=args.app_rate,
+        ),
+    )
+    report = asyncio.run(run_load(options))
+
+    print(f"{'t s':>7}{'users':>8}{'ops/s':>10}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rss MB':>9}")
+    for w in report.windows:
+        print(f"{w.t:>7}{w.users:>8}{w.throughput:>10}{w.errors:>6}{w.p50_ms:>10}{w.p95_ms:>10}{w.p99_ms:>10}{w.rss_mb:>9}")
+    print()
+    print(f"{'step':<16}{'ops':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, s in report.steps.items():
+        print(f"{name:<16}{s['ops']:>8}{s['p50_ms']:>10}{s['p95_ms']:>10}{s['p99_ms']:>10}")
+    print()
+    print(f"peak throughput {report.peak_throughput} ops/s at {report.peak_users} users")
+    if report.saturated_users is None:
+        print(f"no saturation: p95 stayed under {options.slo_ms} ms")
+    else:
+        print(f"saturated at {report.saturated_users} users (t={report.saturated_at}s)")
+    print(f"memory per user: {report.rss_per_user_kb} KiB RSS, {report.state_per_user_kb} KiB bot state")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import sys
+
+from benchmarks.fake_spotify import FakeSpotifyOptions
+from benchmarks.harness import FLOWS, BenchOptions, compare, load_baseline, run_suite, save_results
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmarks against fake Spotify/Telegram servers")
+    p.add_argument("--flows", default=",".join(FLOWS), help="comma-separated: " + ", ".join(FLOWS))
+    p.add_argument("--iterations", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--users", type=int, default=50)
+    p.add_argument("--latency", type=float, default=0.02, help="fake Spotify latency, seconds")
+    p.add_argument("--jitter", type=float, default=0.01)
+    p.add_argument("--rate-429", type=float, default=0.0, help="share of Spotify calls answered with 429")
+    p.add_argument("--library-size", type=int, default=200)
+    p.add_argument("--telegram-latency", type=float, default=0.0)
+    p.add_argument("--app-rate", type=float, default=10_000.0, help="scheduler app-wide requests/s")
+    p.add_argument("--save", metavar="PATH", help="write results as JSON (e.g. a new baseline)")
+    p.add_argument("--baseline", metavar="PATH", help="compare against stored results")
+    p.add_argument("--tolerance", type=float, default=0.2)
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    flows = [f.strip() for f in args.flows.split(",") if f.strip()]
+    unknown = [f for f in flows if f not in FLOWS]
+    if unknown:
+        print(f"unknown flows: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    options = BenchOptions(
+        users=args.users,
+        spotify=FakeSpotifyOptions(
+            latency=args.latency,
+            jitter=args.jitter,
+            rate_429=args.rate_429,
+            library_size=args.library_size,
+        ),
+        telegram_latency=args.telegram_latency,
+        app_rate=args.app_rate,
+    )
+    results = asyncio.run(run_suite(flows, args.iterations, args.concurrency, options))
+
+    print(f"{'flow':<12}{'ops':>7}{'err':>5}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ΔRSS MB':>9}")
+    for r in results:
+        print(f"{r.flow:<12}{r.ops:>7}{r.errors:>5}{r.throughput:>10}{r.p50_ms:>10}{r.p95_ms:>10}{r.p99_ms:>10}{r.rss_delta_mb:>9}")
+
+    if args.save:
+        save_results(results, args.save)
+
+    if args.baseline:
+        problems = compare(results, load_baseline(args.baseline), args.tolerance)
+        for line in problems:
+            print(f"REGRESSION {line}")
+        if problems:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
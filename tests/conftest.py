@@ -2,4 +2,23 @@ import sys
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
-sys.path.insert(0, str(PROJECT_ROOT))
\ No newline at end of file
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def fresh_search_cache():
+    from app.spotify import fairness, http_cache, pages, ratelimit, search_cache
+
+    search_cache.set_search_cache(None)
+    pages.set_page_cache(None)
+    http_cache.set_response_cache(None)
+    fairness.set_fair_scheduler(None)
+    ratelimit.set_scheduler(None)
+    yield
+    search_cache.set_search_cache(None)
+    pages.set_page_cache(None)
+    http_cache.set_response_cache(None)
+    fairness.set_fair_scheduler(None)
+    ratelimit.set_scheduler(None)
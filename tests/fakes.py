@@ -0,0 +1,44 @@
+"""Stand-ins for the aiohttp session and responses the Spotify code talks to."""
+
+import json
+
+
+class FakeResp:
+    """A response used as `async with session.request(...) as resp`; `data` is served as JSON."""
+
+    def __init__(self, status=200, data=None, headers=None):
+        self.status = status
+        self.data = data
+        self._body = "" if data is None else json.dumps(data)
+        self.headers = headers or {}
+
+    async def text(self):
+        return self._body
+
+    async def json(self, **kwargs):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise Exception(f"HTTP {self.status}")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Answers every call with `handler(method, url, headers=..., **kwargs)` and records it in `calls`."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return self.handler(method, url, headers=headers, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
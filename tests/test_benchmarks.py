@@ -0,0 +1,102 @@
+import pytest
+
+from benchmarks.fake_spotify import FakeSpotifyOptions
+from benchmarks.harness import FLOWS, BenchOptions, FlowResult, compare, percentile, run_suite
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 95) == 0.0
+
+
+def test_compare_flags_regressions():
+    base = {"add": {"flow": "add", "throughput": 100.0, "p95_ms": 10.0, "p99_ms": 20.0, "errors": 0}}
+    ok = FlowResult("add", 10, 0, 1.0, 95.0, 1.0, 11.0, 21.0, 100.0)
+    slow = FlowResult("add", 10, 1, 1.0, 50.0, 1.0, 30.0, 21.0, 100.0)
+    assert compare([ok], base) == []
+    assert len(compare([slow], base)) == 3
+
+
+@pytest.mark.asyncio
+async def test_every_flow_runs_against_fakes():
+    options = BenchOptions(users=3, spotify=FakeSpotifyOptions(library_size=20))
+    results = await run_suite(list(FLOWS), iterations=6, concurrency=3, options=options)
+    assert [r.flow for r in results] == list(FLOWS)
+    for r in results:
+        assert r.ops == 6
+        assert r.errors == 0
+        assert r.p50_ms <= r.p95_ms <= r.p99_ms
+
+
+@pytest.mark.asyncio
+async def test_injected_429s_are_absorbed_by_retries():
+    options = BenchOptions(users=2, spotify=FakeSpotifyOptions(library_size=10, rate_429=0.2, seed=3))
+    results = await run_suite(["add", "oauth"], iterations=10, concurrency=2, options=options)
+    assert [r.errors for r in results] == [0, 0]
+
+
+def test_load_options_parsing_and_saturation_point():
+    from benchmarks.load import LoadWindow, ThinkTime, parse_mix, saturation_point
+
+    assert ThinkTime.parse("uniform:1.5") == ThinkTime("uniform", 1.5)
+    with pytest.raises(ValueError):
+        ThinkTime.parse("gaussian:1")
+    assert parse_mix("add=2,stats") == {"add": 2.0, "stats": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("dance=1")
+
+    def window(users, p95, errors=0):
+        return LoadWindow(t=users, users=users, ops=100, errors=errors, throughput=100.0,
+                          p50_ms=1.0, p95_ms=p95, p99_ms=p95, rss_mb=1.0)
+
+    windows = [window(10, 50.0), window(20, 90.0, errors=5), window(40, 2000.0)]
+    assert saturation_point(windows, slo_ms=1000, max_error_rate=0.01).users == 20
+    assert saturation_point(windows, slo_ms=1000, max_error_rate=0.1).users == 40
+    assert saturation_point(windows[:1], slo_ms=1000, max_error_rate=0.01) is None
+
+
+@pytest.mark.asyncio
+async def test_virtual_users_ramp_through_sessions():
+    from benchmarks.load import LoadOptions, ThinkTime, run_load
+
+    options = LoadOptions(
+        users=4, ramp=0.2, hold=0.6, window=0.2, think=ThinkTime("constant", 0.02),
+        bench=BenchOptions(spotify=FakeSpotifyOptions(library_size=20)),
+    )
+    report = await run_load(options)
+
+    assert report.errors == 0
+    assert report.steps["oauth_callback"]["ops"] == 4
+    assert report.windows and max(w.users for w in report.windows) == 4
+    assert report.ops == sum(s["ops"] for s in report.steps.values()) > 12
+    assert report.saturated_users is None
+
+
+@pytest.mark.asyncio
+async def test_fake_spotify_answers_revalidation_with_304():
+    from aiohttp.test_utils import TestClient, TestServer
+
+    from benchmarks.fake_spotify import FakeSpotify
+
+    fake = FakeSpotify(FakeSpotifyOptions(library_size=5))
+    async with TestClient(TestServer(fake.make_app())) as http:
+        headers = {"Authorization": "Bearer a"}
+        first = await http.get("/v1/me/tracks", headers=headers)
+        etag = first.headers["ETag"]
+        again = await http.get("/v1/me/tracks", headers={**headers, "If-None-Match": etag})
+        assert (first.status, again.status, fake.not_modified) == (200, 304, 1)
+
+        await http.put("/v1/me/tracks", headers=headers, json={"ids": ["new"]})
+        changed = await http.get("/v1/me/tracks", headers={**headers, "If-None-Match": etag})
+        assert changed.status == 200 and changed.headers["ETag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_flow_memory_is_measured_per_flow():
+    options = BenchOptions(users=2, spotify=FakeSpotifyOptions(library_size=10))
+    results = await run_suite(["add", "my_tracks"], iterations=5, concurrency=2, options=options)
+    # A per-flow delta, not the process-wide peak repeated for every flow.
+    assert all(abs(r.rss_delta_mb) < 200 for r in results)
+    assert "rss_delta_mb" in results[0].to_dict()
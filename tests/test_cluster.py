@@ -0,0 +1,142 @@
+import asyncio
+import queue
+
+import pytest
+
+import app.cluster as cluster
+from app.cluster import ClusterRouter, WorkerPool, owner_of
+from app.storage.base import Table
+from app.storage.redis_backend import RedisBackend
+
+
+class FakePipeline:
+    def __init__(self, server):
+        self.server = server
+        self.ops = []
+
+    def hset(self, name, key, value):
+        self.ops.append(("hset", name, key, value))
+
+    def hdel(self, name, key):
+        self.ops.append(("hdel", name, key))
+
+    async def execute(self):
+        for op in self.ops:
+            bucket = self.server.data.setdefault(op[1], {})
+            if op[0] == "hset":
+                bucket[op[2]] = op[3]
+            else:
+                bucket.pop(op[2], None)
+        self.server.transactions += 1
+
+
+class FakeRedis:
+    """Stand-in for the handful of hash commands RedisBackend uses."""
+
+    def __init__(self):
+        self.data = {}
+        self.transactions = 0
+
+    async def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    async def hget(self, name, key):
+        return self.data.get(name, {}).get(key)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+def test_owner_of_is_stable():
+    assert owner_of(10, 4) == owner_of("10", 4) == 2
+    assert {owner_of(uid, 3) for uid in range(30)} == {0, 1, 2}
+
+
+def test_router_sends_user_updates_to_one_worker():
+    queues = [queue.Queue() for _ in range(3)]
+    router = ClusterRouter(queues, secret_token="s")
+    for i in range(6):
+        router.submit({"update_id": i, "message": {"from": {"id": 7}, "chat": {"id": 7}}})
+    owner = owner_of(7, 3)
+    assert queues[owner].qsize() == 6
+    assert [queues[owner].get()[1]["update_id"] for _ in range(6)] == list(range(6))
+
+
+class FakeProcess:
+    def __init__(self, target=None, args=(), name="", daemon=False):
+        self.alive = False
+        self.exitcode = None
+
+    def start(self):
+        self.alive = True
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+
+class FakeContext:
+    Process = FakeProcess
+
+    @staticmethod
+    def Queue(maxsize=0):
+        return queue.Queue(maxsize)
+
+
+def test_router_pushes_back_when_worker_is_dead_or_backlogged():
+    pool = WorkerPool(FakeContext(), 2, max_queue=2)
+    pool.start()
+    router = ClusterRouter(pool.queues, secret_token="s", processes=pool.processes)
+    update = {"update_id": 1, "message": {"from": {"id": 4}, "chat": {"id": 4}}}
+
+    assert [router.submit(update) for _ in range(3)] == [True, True, False]
+    pool.processes[0].alive = False
+    assert not router.submit(update)
+
+
+@pytest.mark.asyncio
+async def test_pool_restarts_exited_workers_then_gives_up(monkeypatch):
+    monkeypatch.setattr(cluster, "MAX_RESTARTS", 1)
+    pool = WorkerPool(FakeContext(), 2)
+    pool.start()
+    first = pool.processes[1]
+    first.alive = False
+    task = asyncio.create_task(pool.supervise(interval=0))
+    await asyncio.sleep(0.01)
+    assert pool.processes[1] is not first and pool.processes[1].is_alive()
+    assert pool.queues[1] is not None
+
+    pool.processes[0].alive = False
+    with pytest.raises(RuntimeError):
+        await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_shares_state_between_processes():
+    server = FakeRedis()
+
+    front_tables = {"users": Table("users"), "stats": Table("stats")}
+    front = RedisBackend(client=server, flush_interval=60)
+    await front.open(front_tables)
+
+    worker_tables = {"users": Table("users"), "stats": Table("stats")}
+    worker = RedisBackend(client=server, flush_interval=60)
+    await worker.open(worker_tables)
+
+    front_tables["users"]["7"] = {"access_token": "a"}
+    front_tables["users"]["8"] = {"access_token": "b"}
+    await front.flush()
+    assert server.transactions == 1
+
+    assert "7" not in worker_tables["users"]
+    await worker.reload("users", "7")
+    assert worker_tables["users"]["7"] == {"access_token": "a"}
+    assert worker.pending == 0
+
+    del front_tables["users"]["7"]
+    await front.close()
+    await worker.reload("users", "7")
+    assert "7" not in worker_tables["users"]
+    await worker.close()
@@ -27,3 +27,24 @@ def test_load_config_missing(monkeypatch):
     from app.config.settings import load_config
     with pytest.raises(RuntimeError):
         load_config()
+
+def test_load_config_storage(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "tok:test")
+    monkeypatch.setenv("SPOTIFY_CLIENT_ID", "cid")
+    monkeypatch.setenv("SPOTIFY_CLIENT_SECRET", "csecret")
+    monkeypatch.setenv("SPOTIFY_REDIRECT_URI", "http://localhost:8080/callback")
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    from app.config.settings import load_config
+    assert load_config().storage.backend == "memory"
+    monkeypatch.setenv("STORAGE_BACKEND", "mongo")
+    with pytest.raises(RuntimeError):
+        load_config()
+
+def test_storage_defaults_to_memory(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "tok:test")
+    monkeypatch.setenv("SPOTIFY_CLIENT_ID", "cid")
+    monkeypatch.setenv("SPOTIFY_CLIENT_SECRET", "csecret")
+    monkeypatch.setenv("SPOTIFY_REDIRECT_URI", "http://localhost:8080/callback")
+    monkeypatch.delenv("STORAGE_BACKEND", raising=False)
+    from app.config.settings import load_config
+    assert load_config().storage.backend == "memory"
@@ -9,3 +9,40 @@ def test_create_bot_and_dispatcher_returns_objects():
 
     assert isinstance(bot, Bot)
     assert isinstance(dp, Dispatcher)
+
+
+def test_duplicate_presses_are_dropped_within_window():
+    import asyncio
+    from datetime import datetime
+
+    from aiogram.types import Chat, Message, User
+
+    from app.bot.middlewares import DuplicatePressMiddleware
+
+    now = [0.0]
+    mw = DuplicatePressMiddleware(1.0, ["📂 Мои треки"], clock=lambda: now[0])
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.text)
+
+    def message(chat_id, text):
+        return Message(
+            message_id=1, date=datetime.now(), chat=Chat(id=chat_id, type="private"),
+            from_user=User(id=chat_id, is_bot=False, first_name="U"), text=text,
+        )
+
+    async def press(chat_id, text):
+        await mw(handler, message(chat_id, text), {})
+
+    async def scenario():
+        await press(1, "📂 Мои треки")
+        await press(1, "📂 Мои треки")
+        await press(2, "📂 Мои треки")
+        await press(1, "Muse - Uprising")
+        await press(1, "Muse - Uprising")
+        now[0] = 1.5
+        await press(1, "📂 Мои треки")
+
+    asyncio.run(scenario())
+    assert handled == ["📂 Мои треки", "📂 Мои треки", "Muse - Uprising", "Muse - Uprising", "📂 Мои треки"]
@@ -0,0 +1,264 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app.bot.handlers as h
+from app.storage import memory
+from app.storage.session import ShownTrack
+
+
+class FakeMessage:
+    def __init__(self, text, user_id=555):
+        self.text = text
+        self.from_user = SimpleNamespace(id=user_id, first_name="Test")
+        self.answers = []
+        self.photos = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+    async def answer_photo(self, photo, caption=None, **kwargs):
+        self.photos.append((photo, caption))
+
+
+class FakeState:
+    def __init__(self):
+        self.cleared = False
+
+    async def clear(self):
+        self.cleared = True
+
+    async def set_state(self, state):
+        self.state = state
+
+
+def make_track(tid, artist="Artist"):
+    return {
+        "id": tid,
+        "name": f"Song {tid}",
+        "artists": [{"name": artist}],
+        "album": {"images": [{"url": "http://img"}]},
+    }
+
+
+class FakeSpotify:
+    def __init__(self, catalog, saved=()):
+        self.catalog = catalog
+        self.saved = set(saved)
+        self.calls = []
+
+    async def search_track_full(self, query):
+        self.calls.append(("search", query))
+        return self.catalog.get(query)
+
+    async def contains_tracks(self, ids):
+        self.calls.append(("contains", list(ids)))
+        return [tid in self.saved for tid in ids]
+
+    async def save_tracks(self, ids, tracks=None):
+        self.calls.append(("save", list(ids)))
+        self.saved.update(ids)
+
+    async def remove_saved_tracks(self, ids):
+        self.calls.append(("remove", list(ids)))
+        self.saved.difference_update(ids)
+
+
+@pytest.fixture
+def fake_sp(monkeypatch):
+    holder = {}
+
+    async def get_client(tg):
+        return holder["sp"]
+
+    monkeypatch.setattr(h, "get_spotify_client", get_client)
+    yield holder
+    for table in (memory.STATS, memory.LAST_SHOWN):
+        table.pop("555", None)
+
+
+@pytest.mark.asyncio
+async def test_add_many_tracks_batches_contains_and_save(fake_sp):
+    sp = FakeSpotify(
+        {"a": make_track("1"), "b": make_track("2"), "c": make_track("3"), "dup": make_track("1")},
+        saved={"3"},
+    )
+    fake_sp["sp"] = sp
+    m = FakeMessage("a\nb\nc\nmissing\ndup")
+    state = FakeState()
+
+    await h.add_track(m, state)
+
+    assert [c[0] for c in sp.calls].count("contains") == 1
+    assert ("save", ["1", "2"]) in sp.calls
+    assert len(m.answers) == 1
+    assert "2 из 5" in m.answers[0]
+    assert "не найден" in m.answers[0]
+    assert "уже в библиотеке" in m.answers[0]
+    assert memory.STATS["555"]["added"] == 2
+    assert state.cleared
+
+
+@pytest.mark.asyncio
+async def test_add_single_track_sends_card(fake_sp):
+    sp = FakeSpotify({"a": make_track("1")})
+    fake_sp["sp"] = sp
+    m = FakeMessage("a")
+    await h.add_track(m, FakeState())
+    assert m.photos and "Трек добавлен" in m.photos[0][1]
+
+
+@pytest.mark.asyncio
+async def test_delete_sends_one_batched_call(fake_sp):
+    sp = FakeSpotify({}, saved={f"t{i}" for i in range(15)})
+    fake_sp["sp"] = sp
+    memory.LAST_SHOWN["555"] = [ShownTrack(f"t{i}", f"T{i}", "A") for i in range(15)]
+    m = FakeMessage(" ".join(str(i) for i in range(1, 16)))
+
+    await h.delete_tracks(m, FakeState())
+
+    assert len(sp.calls) == 1
+    assert sp.calls[0][0] == "remove" and len(sp.calls[0][1]) == 15
+    assert memory.STATS["555"]["deleted"] == 15
+    assert "555" not in memory.LAST_SHOWN
+
+
+@pytest.mark.asyncio
+async def test_my_tracks_page_edits_message_in_place(fake_sp):
+    class PagedSpotify(FakeSpotify):
+        async def get_saved_tracks(self, limit=20, offset=0):
+            self.calls.append(("page", offset))
+            items = [{"track": {"id": f"t{i}", "name": f"<S{i}>", "artists": [{"name": "A"}]}} for i in range(offset, min(offset + limit, 40))]
+            return {"items": items, "total": 40}
+
+    class FakeCallback:
+        def __init__(self):
+            self.from_user = SimpleNamespace(id=555)
+            self.edits = []
+            self.answered = False
+            self.message = SimpleNamespace(edit_text=self.edit_text)
+
+        async def edit_text(self, text, **kwargs):
+            self.edits.append((text, kwargs["reply_markup"]))
+
+        async def answer(self, *args, **kwargs):
+            self.answered = True
+
+    fake_sp["sp"] = PagedSpotify({})
+    cb = FakeCallback()
+    await h.my_tracks_page(cb, h.TracksPage(page=2))
+
+    text, markup = cb.edits[0]
+    assert "31. A — &lt;S30&gt;" in text
+    assert markup.inline_keyboard[0][2].text == "3/3"
+    assert cb.answered
+
+
+@pytest.mark.asyncio
+async def test_add_known_track_answers_from_local_library(fake_sp, monkeypatch):
+    from app.spotify import library as library_mod
+    from app.spotify.library import LibraryIndex, LibraryTrack
+
+    lib = LibraryIndex()
+    lib.add([LibraryTrack("t1", "Song One", "Artist", "2024-01-01T00:00:00Z", artist_names=("Artist",))])
+    lib.loaded = True
+    monkeypatch.setitem(library_mod._LIBRARIES, "555", lib)
+
+    async def no_client(tg):
+        raise AssertionError("Spotify must not be called")
+
+    monkeypatch.setattr(h, "get_spotify_client", no_client)
+    m = FakeMessage("artist - song one")
+    await h.add_track(m, FakeState())
+    assert m.answers == ["ℹ️ Этот трек уже есть в библиотеке"]
+
+
+@pytest.mark.asyncio
+async def test_near_match_in_library_is_confirmed_remotely(fake_sp, monkeypatch):
+    from app.spotify import library as library_mod
+    from app.spotify.library import LibraryIndex, LibraryTrack
+
+    lib = LibraryIndex()
+    lib.add([LibraryTrack("t1", "Stronger", "Kanye West", "2024-01-01T00:00:00Z", artist_names=("Kanye West",))])
+    lib.loaded = True
+    monkeypatch.setitem(library_mod._LIBRARIES, "555", lib)
+    assert lib.find("Kanye West - Strongest") is not None
+
+    sp = fake_sp["sp"] = FakeSpotify({"Kanye West - Strongest": make_track("t2", "Kanye West")}, saved={"t1"})
+    m = FakeMessage("Kanye West - Strongest")
+    await h.add_track(m, FakeState())
+    assert ("contains", ["t2"]) in sp.calls and ("save", ["t2"]) in sp.calls
+
+
+class RecordingOutbox:
+    """Outbox stand-in: records what was queued and resolves it at once."""
+
+    def __init__(self):
+        self.sent = []
+
+    def _queued(self, *item):
+        self.sent.append(item)
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    def send_text(self, chat_id, text, **kwargs):
+        return self._queued("text", chat_id, text, kwargs)
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        return self._queued("photo", chat_id, kwargs.get("caption"), kwargs)
+
+    def edit_text(self, chat_id, message_id, text, priority=None, **kwargs):
+        return self._queued("edit", chat_id, text, dict(kwargs, priority=priority))
+
+
+@pytest.mark.asyncio
+async def test_delete_menu_lists_the_latest_tracks_through_the_outbox(fake_sp, monkeypatch):
+    import time
+
+    from app.spotify import library as library_mod
+    from app.spotify.library import LibraryIndex, LibraryTrack
+
+    lib = LibraryIndex()
+    lib.add([LibraryTrack(f"t{i}", "x" * 300, "Artist", f"2024-01-{i % 28 + 1:02d}T00:00:00Z") for i in range(60)])
+    lib.loaded = True
+    lib.synced_at = time.monotonic()
+    monkeypatch.setitem(library_mod._LIBRARIES, "555", lib)
+    fake_sp["sp"] = FakeSpotify({})
+
+    m = FakeMessage("🗑 Удалить треки")
+    m.chat = SimpleNamespace(id=555)
+    outbox = RecordingOutbox()
+    await h.delete_menu(m, FakeState(), outbox)
+    # collect_tracks shows the latest 15, which always fit one message even at full line width.
+    assert m.answers == [] and len(outbox.sent) == 1
+    _, chat_id, text, _ = outbox.sent[0]
+    assert chat_id == 555
+    assert "15." in text and "16." not in text
+    assert len(memory.LAST_SHOWN["555"]) == 15
+
+
+@pytest.mark.asyncio
+async def test_replies_go_through_the_outbox_when_there_is_one(fake_sp):
+    fake_sp["sp"] = FakeSpotify({"a": make_track("1")})
+    m = FakeMessage("a")
+    m.chat = SimpleNamespace(id=555)
+    outbox = RecordingOutbox()
+
+    await h.add_start(m, FakeState(), outbox)
+    await h.add_track(m, FakeState(), outbox=outbox)
+
+    assert m.answers == [] and m.photos == []
+    assert [item[0] for item in outbox.sent] == ["text", "photo"]
+    assert "Трек добавлен" in outbox.sent[1][2]
+
+
+def test_render_page_keeps_every_track_within_one_message():
+    from app.spotify.pages import Page
+    from app.utils.text import MESSAGE_LIMIT
+
+    tracks = [{"artist": "&" * 150, "title": "<" * 150} for _ in range(15)]
+    text = h.render_page(Page(number=2, size=15, total=100, tracks=tracks))
+    assert len(text) <= MESSAGE_LIMIT
+    assert all(f"\n{i}. " in text for i in range(31, 46))
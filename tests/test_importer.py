@@ -0,0 +1,193 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.bot.importer import ImportRunner, dedupe, parse_import
+from app.spotify.client import SpotifyAPIError
+from app.storage.memory import IMPORT_QUERIES, IMPORTS
+
+
+def test_parse_pasted_list_and_csv_export():
+    text = "1. Muse - Uprising\n2) Queen - Bohemian Rhapsody\n- Daft Punk - One More Time\n\n# comment\n"
+    assert parse_import(text) == ["Muse - Uprising", "Queen - Bohemian Rhapsody", "Daft Punk - One More Time"]
+
+    csv_text = 'Track URI,Track Name,Artist Name(s)\nspotify:track:1,"Hello, World",Some Artist\n'
+    assert parse_import(csv_text, "playlist.csv") == ["Some Artist - Hello, World"]
+
+    assert dedupe(["Muse - Uprising", "muse uprising", "", "Queen"]) == ["Muse - Uprising", "Queen"]
+
+
+class FakeOutbox:
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+        self.notified = []
+
+    @staticmethod
+    def _done(result=None):
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(result)
+        return future
+
+    def send_text(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+        return self._done(SimpleNamespace(message_id=77))
+
+    def edit_text(self, chat_id, message_id, text, **kwargs):
+        self.edits.append((message_id, text))
+        return self._done()
+
+    def notify(self, chat_id, text, **kwargs):
+        self.notified.append(text)
+        return self._done()
+
+
+class FakeImportClient:
+    def __init__(self, saved=(), fail_at=None, error=None, fail_save=None):
+        self.saved = set(saved)
+        self.fail_at = fail_at
+        self.error = error or RuntimeError("network down")
+        self.fail_save = fail_save
+        self.searched = []
+        self.calls = []
+
+    async def search_track_full(self, query):
+        self.searched.append(query)
+        if query == self.fail_at:
+            raise self.error
+        await asyncio.sleep(0)
+        n = int(query.split()[-1])
+        return None if n % 10 == 9 else {"id": f"t{n}", "name": query, "artists": [{"name": "A"}]}
+
+    async def contains_tracks(self, ids):
+        self.calls.append(("contains", len(ids)))
+        return [tid in self.saved for tid in ids]
+
+    async def save_tracks(self, ids, tracks=None):
+        self.calls.append(("save", len(ids)))
+        if self.fail_save is not None and self.fail_save in ids:
+            raise SpotifyAPIError(502, "bad gateway")
+        self.saved.update(ids)
+
+
+@pytest.fixture
+def clean_imports():
+    IMPORTS.clear()
+    IMPORT_QUERIES.clear()
+    yield
+    IMPORTS.clear()
+    IMPORT_QUERIES.clear()
+
+
+def make_runner(client, saved_log=None):
+    # A list hands out one client per call, the last one from then on.
+    clients = list(client) if isinstance(client, list) else [client]
+
+    async def factory(tg):
+        return clients.pop(0) if len(clients) > 1 else clients[0]
+
+    async def on_saved(tg, tracks):
+        saved_log.extend(tracks)
+
+    return ImportRunner(
+        FakeOutbox(), factory,
+        on_saved=on_saved if saved_log is not None else None,
+        workers=4, batch=50, progress_interval=0,
+    )
+
+
+@pytest.mark.asyncio
+async def test_import_batches_contains_and_save(clean_imports):
+    client = FakeImportClient(saved={"t0", "t1"})
+    saved_log = []
+    runner = make_runner(client, saved_log)
+    queries = [f"Song {i}" for i in range(120)]
+
+    assert await runner.start("1", 1, queries)
+    await runner.wait("1")
+
+    assert [c for c in client.calls if c[0] == "contains"] == [("contains", 45), ("contains", 45), ("contains", 18)]
+    assert sum(n for kind, n in client.calls if kind == "save") == 106
+    assert len(saved_log) == 106
+    final = runner.outbox.edits[-1][1]
+    assert "Импорт завершён: 120/120" in final
+    assert "добавлено: 106" in final and "уже было: 2" in final and "не найдено: 12" in final
+    assert "1" not in IMPORTS
+
+
+@pytest.mark.asyncio
+async def test_import_resumes_from_checkpoint(clean_imports):
+    failing = FakeImportClient(fail_at="Song 70")
+    runner = make_runner(failing)
+    await runner.start("1", 1, [f"Song {i}" for i in range(120)])
+    await runner.wait("1")
+    assert IMPORTS["1"]["done"] == 50
+    assert "остановлен на 50/120" in runner.outbox.notified[0]
+    assert "queries" not in IMPORTS["1"] and len(IMPORT_QUERIES["1"]) == 120
+
+    resumed = FakeImportClient(saved=failing.saved)
+    runner = make_runner(resumed)
+    assert runner.resume_all() == 1
+    await runner.wait("1")
+    assert min(int(q.split()[-1]) for q in resumed.searched) == 50
+    assert "1" not in IMPORTS
+
+
+@pytest.mark.asyncio
+async def test_spotify_errors_pause_instead_of_counting_as_missing(clean_imports):
+    failing = FakeImportClient(fail_at="Song 30", error=SpotifyAPIError(503, "unavailable"))
+    runner = make_runner(failing)
+    await runner.start("1", 1, [f"Song {i}" for i in range(60)])
+    await runner.wait("1")
+
+    job = IMPORTS["1"]
+    assert (job["done"], job["missing"]) == (0, 0)
+    assert runner.paused("1") and runner.outbox.notified
+    assert "Spotify временно недоступен" in runner.outbox.notified[0]
+    assert "unavailable" not in runner.outbox.notified[0]
+
+    runner.client_factory = make_runner(FakeImportClient()).client_factory
+    assert runner.resume("1")
+    await runner.wait("1")
+    assert "не найдено: 6" in runner.outbox.edits[-1][1]
+
+
+@pytest.mark.asyncio
+async def test_expired_token_gets_a_fresh_client(clean_imports):
+    expired = FakeImportClient(fail_at="Song 3", error=SpotifyAPIError(401, "token expired"))
+    fresh = FakeImportClient()
+    runner = make_runner([expired, fresh])
+    await runner.start("1", 1, [f"Song {i}" for i in range(10)])
+    await runner.wait("1")
+
+    assert "1" not in IMPORTS
+    assert "Song 3" in fresh.searched
+    assert "добавлено: 9" in runner.outbox.edits[-1][1]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_not_counted_twice(clean_imports):
+    flaky = FakeImportClient(fail_save="t60")
+    runner = make_runner(flaky)
+    await runner.start("1", 1, [f"Song {i}" for i in range(100)])
+    await runner.wait("1")
+    assert IMPORTS["1"]["done"] == 50 and IMPORTS["1"]["added"] == 45
+
+    runner = make_runner(FakeImportClient(saved=flaky.saved))
+    runner.resume_all()
+    await runner.wait("1")
+    final = runner.outbox.edits[-1][1]
+    assert "100/100" in final and "добавлено: 90" in final and "не найдено: 10" in final
+
+
+def test_pause_reason_hides_spotify_response_bodies():
+    from app.bot.importer import pause_reason
+    from app.spotify.refresh import RefreshRevoked
+
+    assert pause_reason(SpotifyAPIError(429, '{"error": {"status": 429}}')) == "Spotify ограничил число запросов"
+    assert "авторизац" in pause_reason(SpotifyAPIError(401, "token expired"))
+    assert "авторизац" in pause_reason(RefreshRevoked("invalid_grant"))
+    assert pause_reason(SpotifyAPIError(502, "<html>bad gateway</html>")) == "Spotify временно недоступен"
+    assert pause_reason(asyncio.TimeoutError()) == "Spotify временно недоступен"
+    assert pause_reason(ValueError("boom")) == "ошибка при обращении к Spotify"
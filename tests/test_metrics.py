@@ -0,0 +1,168 @@
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from aiohttp import web
+
+from app.bot.middlewares import HandlerTimingMiddleware
+from app.monitoring import add_metrics_route
+from app.monitoring.metrics import HANDLER_LATENCY, Registry, endpoint_label
+from fakes import FakeResp, FakeSession
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    hits = registry.counter("hits_total", "Hits", ["route"])
+    hits.labels(route="/a").inc()
+    hits.labels(route="/a").inc(2)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    latency.observe(0.05)
+    latency.observe(0.5)
+    latency.observe(3)
+    registry.gauge("queue_depth", "Depth", func=lambda: 7)
+
+    text = registry.render()
+    assert "# TYPE hits_total counter" in text
+    assert 'hits_total{route="/a"} 3' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert "latency_seconds_count 3" in text
+    assert "queue_depth 7" in text
+
+
+def test_endpoint_label_hides_ids():
+    assert endpoint_label("https://api.spotify.com/v1/me/tracks?limit=50") == "/me/tracks"
+    assert endpoint_label("http://x/v1/playlists/37i9dQZF1DXcBWIGoYBM5M/tracks") == "/playlists/{id}/tracks"
+    assert endpoint_label("http://x/v1/users/some.user_42/playlists") == "/users/{id}/playlists"
+    assert endpoint_label("http://x/v1/me/tracks/contains?ids=a") == "/me/tracks/contains"
+    assert endpoint_label("http://x/v1/tracks") == "/tracks"
+
+
+@pytest.mark.asyncio
+async def test_handler_timing_middleware_and_route():
+    async def my_handler(event, data):
+        return "ok"
+
+    class HandlerObject:
+        callback = my_handler
+
+    before = HANDLER_LATENCY.labels(handler="my_handler").count
+    result = await HandlerTimingMiddleware()(my_handler, object(), {"handler": HandlerObject()})
+    assert result == "ok"
+    assert HANDLER_LATENCY.labels(handler="my_handler").count == before + 1
+
+    app = web.Application()
+    add_metrics_route(app, "secret")
+    async with TestClient(TestServer(app)) as client:
+        assert (await client.get("/metrics")).status == 401
+        assert (await client.get("/metrics", headers={"Authorization": "Bearer nope"})).status == 401
+        resp = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert resp.status == 200
+        assert 'bot_handler_duration_seconds_count{handler="my_handler"}' in await resp.text()
+
+
+def test_span_is_a_noop_outside_a_traced_update():
+    from app.monitoring.tracing import NOOP_SPAN, span
+
+    with span("spotify", endpoint="/me") as trace:
+        trace.set(status=200)
+    assert trace is NOOP_SPAN
+
+
+@pytest.mark.asyncio
+async def test_slow_updates_are_traced_and_served():
+    from datetime import datetime
+
+    from aiogram import Bot, Dispatcher
+    from aiogram.types import Chat, Message, Update, User
+
+    from app.bot.middlewares import setup_middlewares
+    from app.monitoring import Tracer, add_traces_route, set_tracer
+    from app.spotify.client import SpotifyUserClient
+
+    dp = Dispatcher()
+    setup_middlewares(dp, press_window=0)
+
+    @dp.message()
+    async def lookup(m: Message):
+        await SpotifyUserClient("token", session=FakeSession(lambda method, url, **kw: FakeResp(200, {"id": "me"})), user_id="1").get_me()
+
+    def update(update_id):
+        message = Message(
+            message_id=update_id, date=datetime.now(), chat=Chat(id=1, type="private"),
+            from_user=User(id=1, is_bot=False, first_name="U"), text="hi",
+        )
+        return Update(update_id=update_id, message=message)
+
+    bot = Bot("123456:TEST_TOKEN")
+    tracer = Tracer(threshold=0.0, capacity=10)
+    set_tracer(tracer)
+    try:
+        await dp.feed_update(bot, update(1))
+        tracer.threshold = 60.0
+        await dp.feed_update(bot, update(2))
+    finally:
+        set_tracer(None)
+        await bot.session.close()
+
+    assert (tracer.traced, tracer.sampled) == (2, 1)
+    [trace] = tracer.slowest()
+    assert trace["name"] == "update" and trace["attrs"]["update_id"] == 1
+    [handler] = trace["children"]
+    assert handler["attrs"] == {"handler": "lookup"}
+    [call] = handler["children"]
+    assert call["name"] == "spotify" and call["attrs"]["endpoint"] == "/me" and call["attrs"]["status"] == 200
+
+    app = web.Application()
+    add_traces_route(app, "secret")
+    auth = {"Authorization": "Bearer secret"}
+    async with TestClient(TestServer(app)) as client:
+        assert (await client.get("/traces", headers=auth)).status == 404
+        set_tracer(tracer)
+        try:
+            data = await (await client.get("/traces?limit=5", headers=auth)).json()
+        finally:
+            set_tracer(None)
+    assert data["slowest"][0]["attrs"]["update_id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_monitoring_routes_are_closed_without_a_token():
+    from app.monitoring import add_traces_route
+
+    app = web.Application()
+    add_metrics_route(app, "")
+    add_traces_route(app, "")
+    async with TestClient(TestServer(app)) as client:
+        for path in ("/metrics", "/traces"):
+            assert (await client.get(path, headers={"Authorization": "Bearer "})).status == 403
+
+
+@pytest.mark.asyncio
+async def test_worker_monitoring_app_serves_both_routes():
+    from types import SimpleNamespace
+
+    from app.cluster import worker_metrics_port
+    from app.monitoring import create_monitoring_app
+
+    async with TestClient(TestServer(create_monitoring_app("secret"))) as client:
+        resp = await client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert resp.status == 200
+        assert (await client.get("/traces")).status == 401
+    config = SimpleNamespace(oauth=SimpleNamespace(port=8080))
+    assert [worker_metrics_port(config, i) for i in range(3)] == [8081, 8082, 8083]
+
+
+def test_trace_file_is_written_off_the_loop(tmp_path):
+    from app.monitoring import Tracer
+
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(threshold=0.0, path=str(path))
+    for i in range(3):
+        root = tracer.start("update", update_id=i)
+        with root:
+            pass
+        tracer.finish(root)
+    tracer.close()
+    assert [json.loads(line)["attrs"]["update_id"] for line in path.read_text().splitlines()] == [0, 1, 2]
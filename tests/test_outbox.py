@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from app.bot.outbox import BULK, INTERACTIVE, Outbox
+
+
+class FakeBot:
+    def __init__(self, flood=None):
+        self.sent = []
+        self.flood = dict(flood or {})
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.flood.get(chat_id):
+            self.flood[chat_id] -= 1
+            err = TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Flood control exceeded", 1)
+            err.retry_after = 0.05
+            raise err
+        self.sent.append((chat_id, text))
+        return len(self.sent)
+
+
+@pytest.mark.asyncio
+async def test_small_messages_to_one_chat_are_merged():
+    bot = FakeBot()
+    outbox = Outbox(bot)
+    futures = [outbox.send_text(1, f"line {i}") for i in range(3)]
+    outbox.start()
+    results = await asyncio.gather(*futures)
+    await outbox.stop()
+
+    assert bot.sent == [(1, "line 0\n\nline 1\n\nline 2")]
+    assert results == [1, 1, 1]
+    assert outbox.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_flood_wait_parks_only_that_chat():
+    bot = FakeBot(flood={1: 1})
+    outbox = Outbox(bot)
+    outbox.start()
+    first = outbox.send_text(1, "a")
+    await asyncio.sleep(0.01)
+    second = outbox.send_text(2, "b")
+    await second
+    assert bot.sent == [(2, "b")]
+    await first
+    assert bot.sent == [(2, "b"), (1, "a")]
+    await outbox.stop()
+
+
+@pytest.mark.asyncio
+async def test_interactive_replies_go_before_bulk():
+    bot = FakeBot()
+    outbox = Outbox(bot, max_in_flight=1)
+    bulk = outbox.send_text(1, "bulk", priority=BULK)
+    reply = outbox.send_text(2, "reply", priority=INTERACTIVE)
+    outbox.start()
+    await asyncio.gather(bulk, reply)
+    await outbox.stop()
+    assert [chat for chat, _ in bot.sent] == [2, 1]
+
+
+@pytest.mark.asyncio
+async def test_per_chat_bucket_spaces_sends():
+    bot = FakeBot()
+    outbox = Outbox(bot, chat_rate=20, chat_burst=1)
+    outbox.start()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    # Photos are never merged, so each one needs its own token.
+    bot.send_photo = lambda chat_id, photo, **kw: bot.send_message(chat_id, photo)
+    await asyncio.gather(*(outbox.send_photo(1, f"p{i}") for i in range(3)))
+    assert loop.time() - started >= 0.09
+    await outbox.stop()
+
+
+@pytest.mark.asyncio
+async def test_only_messages_sent_the_same_way_are_merged():
+    bot = FakeBot()
+    outbox = Outbox(bot)
+    futures = [
+        outbox.send_text(1, "a"),
+        outbox.send_text(1, "b", disable_notification=True),
+        outbox.send_text(1, "c", disable_notification=True),
+    ]
+    outbox.start()
+    await asyncio.gather(*futures)
+    await outbox.stop()
+    assert bot.sent == [(1, "a"), (1, "b\n\nc")]
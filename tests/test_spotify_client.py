@@ -1,55 +1,176 @@
+import asyncio
+
 import pytest
-from unittest.mock import patch, MagicMock
 
 import app.spotify.client as sc
+from fakes import FakeResp, FakeSession
 
-class FakeResp:
-    def __init__(self, status=200, data=None, headers=None):
-        self.status_code = status
-        self._data = data or {}
-        self.text = "" if data is None else "ok"
-        self.headers = headers or {}
-
-    def json(self):
-        return self._data
-
-    def raise_for_status(self):
-        if self.status_code >= 400:
-            raise Exception(f"HTTP {self.status_code}")
 
-def test_search_track_full(monkeypatch):
+@pytest.mark.asyncio
+async def test_search_track_full():
     fake = {"tracks": {"items": [{"id": "t1", "name": "Name", "artists": [{"name":"A"}], "album": {"images": []}}]}}
-    def fake_req(method, url, headers=None, timeout=None, **kwargs):
-        return FakeResp(200, fake)
-    monkeypatch.setattr("requests.request", fake_req)
-    client = sc.SpotifyUserClient("token")
-    res = client.search_track_full("query")
+    session = FakeSession(lambda method, url, **kw: FakeResp(200, fake))
+    client = sc.SpotifyUserClient("token", session=session)
+    res = await client.search_track_full("query")
     assert res["id"] == "t1"
+    assert session.calls[0][2]["params"]["q"] == "query"
+
+
+@pytest.mark.asyncio
+async def test_is_track_saved():
+    session = FakeSession(lambda method, url, **kw: FakeResp(200, [True]))
+    client = sc.SpotifyUserClient("token", session=session)
+    assert await client.is_track_saved("t1") is True
+
+
+@pytest.mark.asyncio
+async def test_save_and_remove_tracks_calls():
+    session = FakeSession(lambda method, url, **kw: FakeResp(200))
+    client = sc.SpotifyUserClient("token", session=session)
+    await client.save_tracks(["a","b","c"])
+    await client.remove_saved_tracks(["a","b","c"])
+    assert any(call[0] == "PUT" for call in session.calls)
+    assert any(call[0] == "DELETE" for call in session.calls)
+
+
+@pytest.mark.asyncio
+async def test_save_tracks_chunks_by_50():
+    session = FakeSession(lambda method, url, **kw: FakeResp(200))
+    client = sc.SpotifyUserClient("token", session=session)
+    await client.save_tracks([f"t{i}" for i in range(120)])
+    assert [len(call[2]["json"]["ids"]) for call in session.calls] == [50, 50, 20]
+
 
-def test_is_track_saved(monkeypatch):
-    def fake_req(method, url, headers=None, timeout=None, **kwargs):
-        return FakeResp(200, [True])
-    monkeypatch.setattr("requests.request", fake_req)
-    client = sc.SpotifyUserClient("token")
-    assert client.is_track_saved("t1") is True
-
-def test_save_and_remove_tracks_calls(monkeypatch):
-    recorded = []
-    def fake_req(method, url, headers=None, timeout=None, **kwargs):
-        recorded.append((method, url, kwargs))
-        return FakeResp(200, {})
-    monkeypatch.setattr("requests.request", fake_req)
-    client = sc.SpotifyUserClient("token")
-    client.save_tracks(["a","b","c"])
-    client.remove_saved_tracks(["a","b","c"])
-    assert any(call[0] == "PUT" for call in recorded)
-    assert any(call[0] == "DELETE" for call in recorded)
-
-def test_get_saved_tracks(monkeypatch):
+@pytest.mark.asyncio
+async def test_get_saved_tracks():
     page = {"items": [{"track": {"id":"t1","name":"t","artists":[{"name":"A"}],"album":{"images":[]}}}], "total": 1}
-    def fake_req(method, url, headers=None, timeout=None, **kwargs):
-        return FakeResp(200, page)
-    monkeypatch.setattr("requests.request", fake_req)
-    client = sc.SpotifyUserClient("token")
-    res = client.get_saved_tracks(limit=1, offset=0)
+    session = FakeSession(lambda method, url, **kw: FakeResp(200, page))
+    client = sc.SpotifyUserClient("token", session=session)
+    res = await client.get_saved_tracks(limit=1, offset=0)
     assert "items" in res
+
+
+@pytest.mark.asyncio
+async def test_iter_saved_tracks_keeps_order_with_parallel_pages():
+    total = 230
+    in_flight = peak = 0
+
+    class SlowResp(FakeResp):
+        async def __aenter__(self):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            # Later pages answer first, so ordering has to come from the iterator.
+            await asyncio.sleep(0.01 * (total - self.offset) / total)
+            in_flight -= 1
+            return self
+
+    def handler(method, url, params=None, **kw):
+        offset, limit = params["offset"], params["limit"]
+        items = [{"track": {"id": f"t{i}"}} for i in range(offset, min(offset + limit, total))]
+        resp = SlowResp(200, {"items": items, "total": total})
+        resp.offset = offset
+        return resp
+
+    session = FakeSession(handler)
+    client = sc.SpotifyUserClient("token", session=session)
+    ids = [item["track"]["id"] async for item in client.iter_saved_tracks(concurrency=3)]
+    assert ids == [f"t{i}" for i in range(total)]
+    assert len(session.calls) == 5
+    assert peak <= 3
+
+
+@pytest.mark.asyncio
+async def test_error_status_raises():
+    session = FakeSession(lambda method, url, **kw: FakeResp(404, {"error": "nope"}))
+    client = sc.SpotifyUserClient("token", session=session)
+    with pytest.raises(sc.SpotifyAPIError) as exc:
+        await client.get_me()
+    assert exc.value.status == 404
+
+
+@pytest.mark.asyncio
+async def test_shared_session_lifecycle():
+    from app.spotify import http
+
+    session = await http.init_session()
+    try:
+        assert http.get_session() is session
+        assert sc.SpotifyUserClient("token").session is session
+    finally:
+        await http.close_session()
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_retries_after_429():
+    from app.spotify.ratelimit import RateLimitScheduler
+
+    responses = [FakeResp(429, headers={"Retry-After": "0"}), FakeResp(200, {"id": "me"})]
+    session = FakeSession(lambda method, url, **kw: responses.pop(0))
+    sched = RateLimitScheduler(base_delay=0.01)
+    client = sc.SpotifyUserClient("token", session=session, user_id="1", scheduler=sched)
+    assert (await client.get_me())["id"] == "me"
+    assert len(session.calls) == 2
+    assert sched.throttled == 1
+
+
+@pytest.mark.asyncio
+async def test_contains_tracks_chunks_ids():
+    def handler(method, url, **kw):
+        return FakeResp(200, [True] * len(kw["params"]["ids"].split(",")))
+
+    session = FakeSession(handler)
+    client = sc.SpotifyUserClient("token", session=session)
+    flags = await client.contains_tracks([f"t{i}" for i in range(60)])
+    assert flags == [True] * 60
+    assert len(session.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_gets_share_one_request():
+    release = asyncio.Event()
+
+    class SlowResp(FakeResp):
+        async def text(self):
+            await release.wait()
+            return self._body
+
+    session = FakeSession(lambda method, url, **kw: SlowResp(200, {"items": [], "total": 0}))
+    client = sc.SpotifyUserClient("token", session=session, user_id="1")
+    other = sc.SpotifyUserClient("token2", session=session, user_id="2")
+
+    tasks = [asyncio.create_task(client.get_saved_tracks(limit=15)) for _ in range(3)]
+    tasks.append(asyncio.create_task(other.get_saved_tracks(limit=15)))
+    tasks.append(asyncio.create_task(client.get_saved_tracks(limit=15, offset=15)))
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert len(session.calls) == 3
+    assert results[0] is results[1] is results[2]
+
+
+@pytest.mark.asyncio
+async def test_library_stream_leaves_the_users_bucket_for_taps():
+    from app.spotify.ratelimit import RateLimitScheduler
+
+    total = 250
+    sched = RateLimitScheduler(app_rate=1000, app_burst=1000, user_rate=0.01, user_burst=1)
+
+    def handler(method, url, params=None, **kw):
+        if params is None:
+            return FakeResp(200, {"id": "me"})
+        offset = params["offset"]
+        items = [{"track": {"id": f"t{i}"}} for i in range(offset, min(offset + params["limit"], total))]
+        return FakeResp(200, {"items": items, "total": total})
+
+    client = sc.SpotifyUserClient("token", session=FakeSession(handler), user_id="1", scheduler=sched)
+    # Five pages against a one-token bucket: only possible if the stream skips it.
+    ids = await asyncio.wait_for(_collect(client.iter_saved_tracks()), 1)
+    assert len(ids) == total
+    assert (await asyncio.wait_for(client.get_me(), 1))["id"] == "me"
+
+
+async def _collect(items):
+    return [item async for item in items]
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+import app.spotify.client as sc
+from app.spotify.fairness import BACKGROUND, INTERACTIVE, FairScheduler, background, current_class
+from fakes import FakeResp
+
+
+async def hold_all(sched, user, work_class, count, order, release):
+    async def one(i):
+        async with sched.slot(user, work_class):
+            order.append((user, i))
+            await release.wait()
+
+    return [asyncio.create_task(one(i)) for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_interactive_call_overtakes_queued_background_work():
+    sched = FairScheduler(max_in_flight=1, per_user=1)
+    order = []
+
+    async def call(user, work_class, i):
+        async with sched.slot(user, work_class):
+            order.append((user, i))
+            await asyncio.sleep(0)
+
+    bulk = [asyncio.create_task(call("importer", BACKGROUND, i)) for i in range(50)]
+    await asyncio.sleep(0)
+    tap = asyncio.create_task(call("tapper", INTERACTIVE, 0))
+    await asyncio.gather(tap, *bulk)
+
+    assert order.index(("tapper", 0)) <= 2
+    assert [i for user, i in order if user == "importer"] == list(range(50))
+    assert sched.in_flight == 0 and sched.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_users_take_turns_and_per_user_cap_holds():
+    sched = FairScheduler(max_in_flight=4, per_user=2)
+    order = []
+    release = asyncio.Event()
+    tasks = await hold_all(sched, "a", INTERACTIVE, 6, order, release)
+    await asyncio.sleep(0)
+    tasks += await hold_all(sched, "b", INTERACTIVE, 6, order, release)
+    await asyncio.sleep(0)
+
+    # "a" is held at two calls even though the global limit has room.
+    assert sorted(order) == [("a", 0), ("a", 1), ("b", 0), ("b", 1)]
+    assert sched.queued == 8
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert len(order) == 12 and sched.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_gives_up_its_place():
+    sched = FairScheduler(max_in_flight=1, per_user=1)
+    release = asyncio.Event()
+    order = []
+    [holder] = await hold_all(sched, "a", INTERACTIVE, 1, order, release)
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(sched.acquire("b"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    release.set()
+    await holder
+    assert sched.in_flight == 0
+    await asyncio.wait_for(sched.acquire("c"), 1)
+
+
+def test_background_marks_the_context():
+    assert current_class() == INTERACTIVE
+    with background():
+        assert current_class() == BACKGROUND
+    assert current_class() == INTERACTIVE
+
+
+class SlowResp(FakeResp):
+    def __init__(self, api):
+        super().__init__(200, {})
+        self.api = api
+
+    async def __aenter__(self):
+        self.api.active += 1
+        self.api.peak = max(self.api.peak, self.api.active)
+        await asyncio.sleep(0.01)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.api.active -= 1
+        return False
+
+
+class CountingAPI:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    def request(self, method, url, headers=None, params=None, json=None):
+        return SlowResp(self)
+
+
+@pytest.mark.asyncio
+async def test_client_calls_go_through_the_fair_scheduler():
+    api = CountingAPI()
+    client = sc.SpotifyUserClient("token", session=api, user_id="1", fair=FairScheduler(per_user=3))
+
+    await asyncio.gather(*(client.save_tracks([f"t{i}"]) for i in range(10)))
+
+    assert api.peak == 3
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_capped_users_next_call_does_not_stall_the_rest():
+    sched = FairScheduler(max_in_flight=4, per_user=1)
+    release = asyncio.Event()
+    order = []
+    [holder] = await hold_all(sched, "a", INTERACTIVE, 1, order, release)
+    await asyncio.sleep(0)
+    doomed = asyncio.create_task(sched.acquire("a"))
+    later = asyncio.create_task(sched.acquire("a"))
+    await asyncio.sleep(0)
+    release.set()
+    doomed.cancel()
+    await holder
+
+    await asyncio.wait_for(later, 1)
+    assert sched.in_flight == 1 and sched.queued == 0
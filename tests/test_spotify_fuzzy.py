@@ -0,0 +1,41 @@
+from app.spotify.fuzzy import TrigramIndex
+from app.spotify.library import LibraryIndex, LibraryTrack
+
+
+def make(tid, artist, title):
+    return LibraryTrack(tid, title, artist, "2024-01-01T00:00:00Z", artist_names=(artist,))
+
+
+def test_match_ignores_case_punctuation_and_word_order():
+    index = TrigramIndex()
+    index.add("1", "Daft Punk Around the World")
+    index.add("2", "Daft Punk One More Time")
+    assert index.match("daft punk — around the world") == "1"
+    assert index.match("Around The World, Daft Punk") == "1"
+    assert index.match("Daft Punk - One More Time (Live)") is None
+    assert index.match("Queen Bohemian Rhapsody") is None
+
+
+def test_library_find_follows_add_and_remove():
+    lib = LibraryIndex()
+    lib.add([make("1", "Muse", "Uprising")])
+    assert lib.find("muse - uprising").id == "1"
+
+    lib.add([make("2", "Muse", "Hysteria")])
+    assert lib.find("Muse Hysteria").id == "2"
+
+    lib.remove(["1"])
+    assert lib.find("muse - uprising") is None
+    lib.clear()
+    assert lib.find("Muse Hysteria") is None
+
+
+def test_exact_lookup_needs_every_word():
+    lib = LibraryIndex()
+    lib.add([make("1", "Kanye West", "Stronger"), make("2", "The Weeknd", "Nights")])
+    assert lib.find_exact("kanye west — stronger").id == "1"
+    assert lib.find_exact("Stronger, Kanye West").id == "1"
+    assert lib.find_exact("Kanye West - Strongest") is None
+    assert lib.find_exact("The Weeknd - Night") is None
+    lib.remove(["1"])
+    assert lib.find_exact("Kanye West Stronger") is None
@@ -0,0 +1,145 @@
+import json
+
+import pytest
+
+import app.spotify.client as sc
+from app.spotify.http_cache import ResponseCache
+from fakes import FakeResp, FakeSession
+
+
+class ETagServer:
+    """Answers `/me/tracks` with an ETag and honours If-None-Match."""
+
+    def __init__(self):
+        self.version = 1
+        self.calls = []
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.calls.append((method, (headers or {}).get("If-None-Match")))
+        etag = f'"v{self.version}"'
+        if method != "GET":
+            self.version += 1
+            return FakeResp(200)
+        if headers.get("If-None-Match") == etag:
+            return FakeResp(304, headers={"ETag": etag})
+        page = {"items": [{"track": {"id": f"t{self.version}"}}], "total": 1}
+        return FakeResp(200, page, {"ETag": etag, "Cache-Control": "private, max-age=0"})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_revalidates_with_etag_and_serves_304_from_cache():
+    server = ETagServer()
+    cache = ResponseCache()
+    client = sc.SpotifyUserClient("token", session=server, user_id="1", cache=cache)
+
+    first = await client.get_saved_tracks(limit=1)
+    second = await client.get_saved_tracks(limit=1)
+
+    assert second == first and second is not first
+    assert server.calls == [("GET", None), ("GET", '"v1"')]
+    assert cache.stats()["revalidated"] == 1
+
+
+@pytest.mark.asyncio
+async def test_write_invalidates_the_users_entries():
+    server = ETagServer()
+    cache = ResponseCache()
+    client = sc.SpotifyUserClient("token", session=server, user_id="1", cache=cache)
+
+    await client.get_saved_tracks(limit=1)
+    await client.save_tracks(["x"])
+    page = await client.get_saved_tracks(limit=1)
+
+    assert page["items"][0]["track"]["id"] == "t2"
+    assert server.calls[-1] == ("GET", None)
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_ttl_serves_without_request_and_is_per_user():
+    clock = Clock()
+    cache = ResponseCache(clock=clock)
+    calls = []
+
+    def handler(method, url, headers=None, **kwargs):
+        calls.append(headers["Authorization"])
+        return FakeResp(200, {"id": headers["Authorization"]})
+
+    alice = sc.SpotifyUserClient("a", session=FakeSession(handler), user_id="1", cache=cache)
+    bob = sc.SpotifyUserClient("b", session=FakeSession(handler), user_id="2", cache=cache)
+
+    assert (await alice.get_me())["id"] == "Bearer a"
+    assert (await alice.get_me())["id"] == "Bearer a"
+    assert (await bob.get_me())["id"] == "Bearer b"
+    assert len(calls) == 2
+
+    clock.now += 601
+    await alice.get_me()
+    assert len(calls) == 3
+
+
+def test_lru_eviction_respects_byte_cap():
+    cache = ResponseCache(ttls={"/me/tracks": 0.0}, max_bytes=380)
+    etag = {"ETag": '"x"'}
+
+    def put(url, headers=etag):
+        cache.store(cache.key("1", "/me/tracks", url), "/me/tracks", url, headers, "x" * 20)
+
+    def cached(url):
+        return cache.lookup(cache.key("1", "/me/tracks", url)) is not None
+
+    for i in range(5):
+        put(f"u{i}")
+    assert cache.evictions == 2
+    assert cached("u2")
+    put("u5")
+
+    assert cache.bytes <= 380
+    assert cache.evictions == 3
+    assert [cached(u) for u in ("u2", "u3", "u4", "u5")] == [True, False, True, True]
+    put("u6", {"Cache-Control": "no-store", "ETag": '"y"'})
+    assert not cached("u6")
+
+
+@pytest.mark.asyncio
+async def test_search_and_later_pages_are_not_kept():
+    server = ETagServer()
+    cache = ResponseCache()
+    client = sc.SpotifyUserClient("token", session=server, user_id="1", cache=cache)
+
+    await client.get_saved_tracks(limit=50, offset=0)
+    await client.get_saved_tracks(limit=50, offset=50)
+    await client.get_saved_tracks(limit=50, offset=100)
+    assert len(cache) == 1
+    assert not cache.cacheable("/search", {"q": "muse"})
+
+
+def test_size_counts_the_stored_body():
+    cache = ResponseCache()
+    body = json.dumps({"items": [{"track": {"id": str(i)}} for i in range(100)]})
+    key = cache.key("1", "/me/tracks", "u")
+    cache.store(key, "/me/tracks", "u", {"ETag": '"x"'}, body)
+    assert cache.bytes >= len(body)
+    assert cache.read(cache.lookup(key))["items"][99]["track"]["id"] == "99"
+
+    cache.clear()
+    assert not cache.bytes
+
+
+@pytest.mark.asyncio
+async def test_reconnecting_another_account_is_not_served_the_old_profile():
+    cache = ResponseCache()
+
+    session = FakeSession(lambda method, url, headers=None, **kw: FakeResp(200, {"id": headers["Authorization"]}))
+
+    assert (await sc.SpotifyUserClient("a", session=session, user_id="1", cache=cache).get_me())["id"] == "Bearer a"
+    cache.forget("1")
+    assert (await sc.SpotifyUserClient("b", session=session, user_id="1", cache=cache).get_me())["id"] == "Bearer b"
@@ -0,0 +1,129 @@
+import pytest
+
+from app.spotify.library import LibraryIndex, LibraryTrack
+
+
+def make_item(i, added_at=None):
+    return {
+        "added_at": added_at or f"2024-01-01T00:{i // 60:02d}:{i % 60:02d}Z",
+        "track": {
+            "id": f"t{i}",
+            "name": f"Track {i}",
+            "artists": [{"id": f"a{i % 3}", "name": f"Artist {i % 3}"}],
+            "duration_ms": 1000,
+        },
+    }
+
+
+class FakeLibraryClient:
+    """Serves `/me/tracks` newest first from a list of items (oldest first)."""
+
+    def __init__(self, n):
+        self.items = [make_item(i) for i in range(n)]
+        self.calls = []
+
+    async def get_saved_tracks(self, limit=20, offset=0):
+        self.calls.append((limit, offset))
+        newest_first = list(reversed(self.items))
+        return {"items": newest_first[offset:offset + limit], "total": len(self.items)}
+
+
+@pytest.mark.asyncio
+async def test_initial_load_reads_every_page():
+    client = FakeLibraryClient(120)
+    lib = LibraryIndex()
+    await lib.sync(client)
+    assert len(lib) == 120
+    assert len(client.calls) == 3
+    assert [t.id for t in lib.latest(3)] == ["t119", "t118", "t117"]
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_stops_at_known_track():
+    client = FakeLibraryClient(120)
+    lib = LibraryIndex(min_sync_interval=0)
+    await lib.sync(client)
+    client.items += [make_item(i) for i in range(120, 125)]
+    client.calls.clear()
+
+    await lib.sync(client)
+    assert client.calls == [(50, 0)]
+    assert len(lib) == 125
+    assert lib.latest(1)[0].id == "t124"
+
+
+@pytest.mark.asyncio
+async def test_fresh_index_skips_network():
+    client = FakeLibraryClient(10)
+    lib = LibraryIndex(min_sync_interval=60)
+    await lib.sync(client)
+    client.calls.clear()
+    await lib.sync(client)
+    assert client.calls == []
+
+
+@pytest.mark.asyncio
+async def test_external_removal_triggers_reload():
+    client = FakeLibraryClient(10)
+    lib = LibraryIndex(min_sync_interval=0)
+    await lib.sync(client)
+    del client.items[3]
+    await lib.sync(client)
+    assert len(lib) == 9
+    assert "t3" not in lib
+
+
+def test_local_add_and_remove():
+    lib = LibraryIndex()
+    lib.add([LibraryTrack.from_item(make_item(i)) for i in range(5)])
+    lib.remove(["t1", "t4"])
+    assert [t.id for t in lib.latest(10)] == ["t3", "t2", "t0"]
+    assert [t.id for t in lib.page(1, 2)] == ["t2", "t0"]
+
+
+def test_tracks_are_compact():
+    solo = LibraryTrack.from_item(make_item(1))
+    assert not hasattr(solo, "__dict__")
+    assert solo.artist_names == () and solo.artist == "Artist 1"
+    duo = LibraryTrack.from_track({"id": "x", "name": "X", "artists": [{"name": "A"}, {"name": "B"}]})
+    assert duo.artist_names == ("A", "B") and duo.artist == "A, B"
+
+
+@pytest.mark.asyncio
+async def test_client_save_and_remove_update_loaded_library():
+    import app.spotify.library as library_mod
+    from app.spotify.client import SpotifyUserClient
+
+    lib = library_mod.get_library("lib-user")
+    await lib.sync(FakeLibraryClient(3))
+
+    client = SpotifyUserClient("token", user_id="lib-user")
+
+    async def fake_request(method, url, **kwargs):
+        return None
+
+    client._request = fake_request
+    await client.save_tracks(["new"], tracks=[{"id": "new", "name": "N", "artists": [{"name": "X"}]}])
+    assert lib.latest(1)[0].id == "new"
+    await client.remove_saved_tracks(["t0"])
+    assert "t0" not in lib
+    library_mod.drop_library("lib-user")
+
+
+def test_resident_indexes_are_bounded_and_rebuilt_on_demand(monkeypatch):
+    import app.spotify.library as library_mod
+
+    monkeypatch.setattr(library_mod, "_LIBRARIES", library_mod.OrderedDict())
+    monkeypatch.setattr(library_mod, "MAX_LIBRARIES", 2)
+    first = library_mod.get_library("1")
+    first.loaded = True
+    library_mod.get_library("2")
+    assert library_mod.peek_library("1") is first
+    library_mod.get_library("3")
+    assert list(library_mod._LIBRARIES) == ["1", "3"]
+
+    monkeypatch.setattr(library_mod, "LIBRARY_IDLE_TTL", 0.0)
+    first.used_at -= 1
+    library_mod.get_library("4")
+    assert "1" not in library_mod._LIBRARIES
+    assert library_mod.get_library("1") is not first and not library_mod.get_library("1").loaded
@@ -4,12 +4,13 @@ from types import SimpleNamespace
 from unittest.mock import patch, MagicMock
 
 import app.spotify.oauth as oauth
+from fakes import FakeResp, FakeSession
 
 @pytest.fixture
 def fake_config(monkeypatch):
     cfg = SimpleNamespace()
     cfg.spotify = SimpleNamespace(client_id="cid", client_secret="csec", redirect_uri="http://localhost/cb", scopes="s1 s2")
-    cfg.oauth = SimpleNamespace(host="127.0.0.1", port=8081)
+    cfg.oauth = SimpleNamespace(host="127.0.0.1", port=8081, metrics_token="")
     cfg.telegram = SimpleNamespace(token="telegramtoken")
     monkeypatch.setattr("app.spotify.oauth._load_config_or_raise", lambda: cfg)
     return cfg
@@ -19,31 +20,138 @@ def test_get_auth_url(fake_config):
     assert "client_id=cid" in url
     assert "state=123" in url
 
-def test_exchange_and_refresh(monkeypatch, fake_config):
-    class FakeResp:
-        def __init__(self, data):
-            self._data = data
-            self.status_code = 200
-            self.text = "ok"
-        def json(self):
-            return self._data
-        def raise_for_status(self): pass
-
-    def fake_post(url, headers=None, data=None, timeout=None):
-        if data.get("grant_type") == "authorization_code":
-            return FakeResp({"access_token":"a","refresh_token":"r","expires_in":3600})
-        else:
-            return FakeResp({"access_token":"a2","expires_in":3600})
-    monkeypatch.setattr("requests.post", fake_post)
-    tok = oauth.exchange_code("code")
-    assert tok["access_token"] == "a"
-    ref = oauth.refresh_access_token("r")
+def token_session():
+    return FakeSession(lambda method, url, **kw: FakeResp(200, {"access_token": "a2", "expires_in": 3600}))
+
+
+@pytest.mark.asyncio
+async def test_exchange_code(monkeypatch, fake_config):
+    session = token_session()
+    monkeypatch.setattr("app.spotify.oauth.get_session", lambda: session)
+    tok = await oauth.exchange_code("code")
+    assert tok["access_token"] == "a2"
+    assert session.calls[0][2]["data"]["grant_type"] == "authorization_code"
+    assert session.calls[0][2]["data"]["redirect_uri"] == "http://localhost/cb"
+
+
+@pytest.mark.asyncio
+async def test_refresh_uses_shared_session(monkeypatch, fake_config):
+    session = token_session()
+    monkeypatch.setattr("app.spotify.oauth.get_session", lambda: session)
+    ref = await oauth.refresh_access_token("r")
     assert ref["access_token"] == "a2"
+    assert ref["expires_at"] > 0
+    assert session.calls[0][2]["data"]["grant_type"] == "refresh_token"
+
 
 @pytest.mark.asyncio
 async def test_ensure_token_refresh(monkeypatch, fake_config):
     tg = "999"
     oauth.save_token(tg, {"access_token":"old","refresh_token":"r","expires_at":1})
-    monkeypatch.setattr("app.spotify.oauth.refresh_access_token", lambda refresh: {"access_token":"new","expires_at":9999999})
+
+    async def fake_refresh(refresh):
+        return {"access_token": "new", "expires_at": 9999999999}
+
+    monkeypatch.setattr("app.spotify.oauth.refresh_access_token", fake_refresh)
     tok = await oauth.ensure_token(tg)
     assert tok == "new"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_are_single_flight():
+    from app.spotify.refresh import TokenRefresher
+
+    store = {"1": {"access_token": "old", "refresh_token": "r", "expires_at": 1}}
+    calls = 0
+
+    async def refresh_fn(refresh):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"access_token": "new", "expires_in": 3600}
+
+    refresher = TokenRefresher(refresh_fn, store.get, store.__setitem__, lambda: store.items())
+    tokens = await asyncio.gather(*(refresher.get_access_token("1") for _ in range(10)))
+    assert tokens == ["new"] * 10
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_renews_tokens_before_expiry():
+    import time
+    from app.spotify.refresh import TokenRefresher
+
+    store = {
+        "soon": {"access_token": "a", "refresh_token": "r", "expires_at": time.time() + 60},
+        "later": {"access_token": "b", "refresh_token": "r", "expires_at": time.time() + 3000},
+    }
+
+    async def refresh_fn(refresh):
+        return {"access_token": "renewed", "expires_in": 3600}
+
+    store["idle"] = dict(store["soon"])
+    refresher = TokenRefresher(refresh_fn, store.get, store.__setitem__, lambda: store.items(), lead_time=300)
+    refresher.seen("soon")
+    refresher.seen("later")
+    assert refresher.due() == ["soon"]
+    await refresher.refresh_due()
+    assert store["soon"]["access_token"] == "renewed"
+    assert store["later"]["access_token"] == "b"
+    assert store["idle"]["access_token"] == "a"
+
+
+@pytest.mark.asyncio
+async def test_revoked_refresh_token_disconnects_and_stops_retrying(monkeypatch, fake_config):
+    from app.spotify.refresh import RefreshRevoked, TokenRefresher
+
+    revoked = FakeResp(400, {"error": "invalid_grant", "error_description": "Refresh token revoked"})
+    monkeypatch.setattr("app.spotify.oauth.get_session", lambda: FakeSession(lambda method, url, **kw: revoked))
+    store = {"1": {"access_token": "old", "refresh_token": "gone", "expires_at": 1}}
+    calls = []
+
+    async def refresh_fn(refresh):
+        calls.append(refresh)
+        return await oauth.refresh_access_token(refresh)
+
+    refresher = TokenRefresher(refresh_fn, store.get, store.__setitem__, lambda: list(store.items()), disconnect=store.pop)
+    with pytest.raises(RefreshRevoked):
+        await refresher.get_access_token("1")
+    assert "1" not in store
+    await refresher.refresh_due()
+    assert calls == ["gone"]
+
+
+@pytest.mark.asyncio
+async def test_callback_is_async_end_to_end(monkeypatch, fake_config):
+    from aiohttp.test_utils import TestClient, TestServer
+
+    def api(method, url, **kwargs):
+        assert url.endswith("/me")
+        return FakeResp(200, {"id": "spotify-user"})
+
+    class FakeOutbox:
+        def __init__(self):
+            self.sent = []
+
+        def notify(self, chat_id, text):
+            self.sent.append((chat_id, text))
+
+    connected = []
+
+    async def on_connected(tg, access_token):
+        connected.append((tg, access_token))
+
+    monkeypatch.setattr("app.spotify.oauth.get_session", token_session)
+    monkeypatch.setattr("app.spotify.client.get_session", lambda: FakeSession(api))
+    monkeypatch.setattr("app.spotify.oauth._on_connected", on_connected)
+    monkeypatch.setattr("app.spotify.oauth._config", None)
+    outbox = FakeOutbox()
+
+    async with TestClient(TestServer(oauth.create_oauth_app(fake_config, outbox))) as client:
+        resp = await client.get("/callback", params={"code": "c", "state": "4242"})
+        assert resp.status == 200
+
+    assert oauth.get_token("4242")["spotify_user_id"] == "spotify-user"
+    assert connected == [("4242", "a2")]
+    assert outbox.sent and outbox.sent[0][0] == 4242
+    oauth.USER_SPOTIFY.pop("4242", None)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import pytest
+
+from app.spotify import library as library_mod
+from app.spotify.library import LibraryIndex, LibraryTrack
+from app.spotify.pages import PageCache
+
+
+class FakePagesClient:
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+
+    async def get_saved_tracks(self, limit=20, offset=0):
+        self.calls.append(offset)
+        await asyncio.sleep(0)
+        items = [
+            {"added_at": "2024-01-01T00:00:00Z", "track": {"id": f"t{i}", "name": f"S{i}", "artists": [{"name": "A"}]}}
+            for i in range(offset, min(offset + limit, self.total))
+        ]
+        return {"items": items, "total": self.total}
+
+
+@pytest.mark.asyncio
+async def test_page_turns_hit_prefetched_pages():
+    client = FakePagesClient(100)
+    cache = PageCache(page_size=10)
+
+    first = await cache.get("1", client, 0)
+    assert [t["id"] for t in first.tracks][:2] == ["t0", "t1"]
+    assert first.pages == 10
+    await asyncio.sleep(0.01)
+    assert sorted(client.calls) == [0, 10]
+
+    second = await cache.get("1", client, 1)
+    assert second.offset == 10
+    await asyncio.sleep(0.01)
+    # Page 1 came from the prefetch; only page 2 was fetched in the background.
+    assert sorted(client.calls) == [0, 10, 20]
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_fetch():
+    client = FakePagesClient(30)
+    cache = PageCache(page_size=10, prefetch=0)
+    await asyncio.gather(*(cache.get("1", client, 2) for _ in range(5)))
+    assert client.calls == [20]
+
+
+@pytest.mark.asyncio
+async def test_fresh_library_serves_pages_without_requests(monkeypatch):
+    lib = LibraryIndex()
+    lib.add(LibraryTrack(f"t{i}", f"S{i}", "A", "2024-01-01T00:00:00Z") for i in range(25))
+    lib.loaded = True
+    lib.synced_at = time.monotonic()
+    monkeypatch.setitem(library_mod._LIBRARIES, "1", lib)
+
+    client = FakePagesClient(0)
+    cache = PageCache(page_size=10)
+    page = await cache.get("1", client, 5)
+    assert page.number == 2
+    assert [t["id"] for t in page.tracks] == [f"t{i}" for i in range(4, -1, -1)]
+    assert client.calls == []
+
+
+@pytest.mark.asyncio
+async def test_invalidate_drops_cached_pages():
+    client = FakePagesClient(5)
+    cache = PageCache(page_size=10, prefetch=0)
+    await cache.get("1", client, 0)
+    cache.invalidate("1")
+    await cache.get("1", client, 0)
+    assert client.calls == [0, 0]
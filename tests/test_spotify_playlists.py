@@ -0,0 +1,126 @@
+import pytest
+
+import app.spotify.client as sc
+from app.spotify.library import LibraryIndex, LibraryTrack
+from app.spotify.playlists import SyncFilter, parse_playlist_id, plan, sync_playlist
+from fakes import FakeResp
+
+PID = "p" * 22
+
+
+class FakePlaylistAPI:
+    """Session stand-in holding one playlist; every write bumps the snapshot."""
+
+    def __init__(self, ids=()):
+        self.ids = list(ids)
+        self.version = 0
+        self.calls = []
+
+    def request(self, method, url, headers=None, params=None, json=None):
+        self.calls.append((method, url.rsplit("/", 1)[-1], params, json))
+        if method == "GET" and url.endswith(PID):
+            return FakeResp(200, {"snapshot_id": f"s{self.version}"})
+        if method == "GET":
+            offset, limit = params["offset"], params["limit"]
+            items = [{"track": {"id": tid}} for tid in self.ids[offset:offset + limit]]
+            return FakeResp(200, {"items": items, "total": len(self.ids)})
+        if method == "POST":
+            new = [uri.rsplit(":", 1)[-1] for uri in json["uris"]]
+            pos = json.get("position", len(self.ids))
+            self.ids[pos:pos] = new
+        elif method == "DELETE":
+            gone = {t["uri"].rsplit(":", 1)[-1] for t in json["tracks"]}
+            self.ids = [tid for tid in self.ids if tid not in gone]
+        self.version += 1
+        return FakeResp(200, {"snapshot_id": f"s{self.version}"})
+
+
+def make_library(n):
+    lib = LibraryIndex()
+    lib.add(
+        LibraryTrack(
+            id=f"t{i}",
+            title=f"Track {i}",
+            artist="Muse" if i % 2 else "Queen",
+            added_at=f"2024-01-{1 + i % 28:02d}T00:00:00Z",
+            artist_names=("Muse" if i % 2 else "Queen",),
+        )
+        for i in range(n)
+    )
+    lib.loaded = True
+    return lib
+
+
+def test_parse_playlist_id_and_plan():
+    assert parse_playlist_id(f"https://open.spotify.com/playlist/{PID}?si=abc") == PID
+    assert parse_playlist_id(f"spotify:playlist:{PID}") == PID
+    assert parse_playlist_id("not a playlist") is None
+    assert plan(["a", "b", "b", "c"], ["d", "c", "a"]) == (["d"], ["b"])
+
+
+@pytest.mark.asyncio
+async def test_first_sync_fills_playlist_in_batches_of_100():
+    api = FakePlaylistAPI()
+    client = sc.SpotifyUserClient("token", session=api)
+    library = make_library(250)
+    state = {"playlist_id": PID}
+
+    result = await sync_playlist(client, library, state)
+
+    assert (result.added, result.removed, result.refetched) == (250, 0, True)
+    posts = [call for call in api.calls if call[0] == "POST"]
+    assert [len(call[3]["uris"]) for call in posts] == [100, 100, 50]
+    assert api.ids == [f"t{i}" for i in reversed(range(250))]
+    assert state["tracks"] == api.ids
+    assert state["snapshot_id"] == f"s{api.version}"
+
+
+@pytest.mark.asyncio
+async def test_unchanged_playlist_costs_one_request():
+    api = FakePlaylistAPI()
+    client = sc.SpotifyUserClient("token", session=api)
+    library = make_library(5000)
+    state = {"playlist_id": PID}
+    await sync_playlist(client, library, state)
+    api.calls.clear()
+
+    result = await sync_playlist(client, library, state)
+
+    assert not result.changed and not result.refetched
+    assert len(api.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_sync_applies_only_the_diff():
+    api = FakePlaylistAPI()
+    client = sc.SpotifyUserClient("token", session=api)
+    library = make_library(300)
+    state = {"playlist_id": PID}
+    await sync_playlist(client, library, state)
+
+    library.remove(["t10", "t20"])
+    library.add([LibraryTrack(id="new", title="New", artist="Muse", added_at="2024-02-01T00:00:00Z")])
+    api.ids.remove("t30")  # edited in the Spotify app
+    api.version += 1
+    api.calls.clear()
+
+    result = await sync_playlist(client, library, state)
+
+    assert (result.added, result.removed, result.refetched) == (2, 2, True)
+    writes = [(call[0], call[3]) for call in api.calls if call[0] != "GET"]
+    assert writes[0] == ("DELETE", {"tracks": [{"uri": "spotify:track:t20"}, {"uri": "spotify:track:t10"}], "snapshot_id": "s4"})
+    assert writes[1] == ("POST", {"uris": ["spotify:track:new", "spotify:track:t30"], "position": 0})
+    assert set(api.ids) == {t.id for t in library}
+
+
+@pytest.mark.asyncio
+async def test_filter_limits_playlist_to_matching_tracks():
+    api = FakePlaylistAPI()
+    client = sc.SpotifyUserClient("token", session=api)
+    state = {"playlist_id": PID, "filter": SyncFilter.from_args(["artist=muse", "until=2024-01-05"]).as_dict()}
+
+    await sync_playlist(client, make_library(60), state)
+
+    assert api.ids and all(int(tid[1:]) % 2 == 1 and 1 + int(tid[1:]) % 28 <= 5 for tid in api.ids)
+    with pytest.raises(ValueError):
+        SyncFilter.from_args(["since=yesterday"])
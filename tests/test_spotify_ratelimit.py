@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from app.utils.ratelimit import TokenBucket
+from app.spotify.ratelimit import RateLimitScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_burst_then_queue():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+    clock.now += 1.0
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_token_bucket_pause_until():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=10, capacity=10, clock=clock)
+    bucket.pause_until(clock.now + 3)
+    assert bucket.reserve() == pytest.approx(3.1)
+    clock.now += 4
+    assert bucket.available > 0
+
+
+def test_retry_delay_is_bounded():
+    sched = RateLimitScheduler(base_delay=1, max_delay=5)
+    for attempt in range(10):
+        assert 0 < sched.retry_delay(attempt) <= 5
+    assert 7 <= sched.retry_delay(0, retry_after=7) <= 8
+
+
+def test_user_buckets_are_pruned():
+    sched = RateLimitScheduler(max_user_buckets=3)
+    for i in range(10):
+        sched._user_bucket(str(i))
+    assert len(sched._users) <= 3
+
+
+@pytest.mark.asyncio
+async def test_throttle_delays_acquire_without_blocking_loop():
+    sched = RateLimitScheduler(app_rate=1000, app_burst=1000)
+    sched.throttle(0.2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await sched.acquire("u1")
+    elapsed = loop.time() - started
+    task.cancel()
+
+    assert elapsed >= 0.19
+    assert ticks > 5
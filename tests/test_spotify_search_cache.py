@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from app.spotify.search_cache import SearchCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_query_variants():
+    key = normalize_query("Artist - Track")
+    assert normalize_query("  artist — TRACK ") == key
+    assert normalize_query("Artist/Track") == key
+    assert normalize_query("Artist, Track!") == key
+    assert normalize_query("Кино — Группа крови") == "кино группа крови"
+
+
+@pytest.mark.asyncio
+async def test_hit_miss_and_ttl():
+    clock = FakeClock()
+    cache = SearchCache(ttl=10, clock=clock)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        return {"id": "t1", "available_markets": ["US"], "album": {"available_markets": ["US"]}}
+
+    first = await cache.get_or_fetch("Artist - Track", fetch)
+    second = await cache.get_or_fetch("artist  track", fetch)
+    assert calls == 1
+    assert first == second == {"id": "t1", "album": {}}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    clock.now = 11
+    await cache.get_or_fetch("Artist - Track", fetch)
+    assert calls == 2
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = SearchCache(max_entries=2)
+    cache.put("a", {"id": "a"})
+    cache.put("b", {"id": "b"})
+    cache.get("a")
+    cache.put("c", {"id": "c"})
+    assert cache.get("b") == (False, None)
+    assert cache.get("a")[0] and cache.get("c")[0]
+    assert cache.evictions == 1
+
+    small = SearchCache(max_bytes=50)
+    small.put("x", {"id": "x" * 20})
+    small.put("y", {"id": "y" * 20})
+    assert len(small) == 1 and small.bytes <= 50
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_are_coalesced():
+    cache = SearchCache()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "t"}
+
+    results = await asyncio.gather(*(cache.get_or_fetch("Same Query", fetch) for _ in range(5)))
+    assert calls == 1
+    assert all(r == {"id": "t"} for r in results)
+    assert cache.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached():
+    cache = SearchCache()
+
+    async def boom():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("q", boom)
+    assert len(cache) == 0
@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+from app.spotify.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call_and_its_error():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "v"
+
+    assert await asyncio.gather(*(flight.run("k", fetch) for _ in range(4))) == ["v"] * 4
+    assert (len(calls), flight.coalesced, len(flight)) == (1, 3, 0)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(*(flight.run("k", fail) for _ in range(2)), return_exceptions=True)
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_over_to_a_waiter():
+    flight = SingleFlight()
+    started = []
+    gate = asyncio.Event()
+
+    async def fetch():
+        started.append(1)
+        await gate.wait()
+        return len(started)
+
+    leader = asyncio.create_task(flight.run("k", fetch))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flight.run("k", fetch))
+    await asyncio.sleep(0)
+    leader.cancel()
+    await asyncio.sleep(0.01)
+    gate.set()
+
+    assert await waiter == 2
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+
+
+@pytest.mark.asyncio
+async def test_detached_call_outlives_its_callers():
+    flight = SingleFlight()
+    done = []
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        done.append(flight.leads("k"))
+        return "new"
+
+    caller = asyncio.create_task(flight.run("k", fetch, detach=True))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.sleep(0.02)
+    assert done == [True] and not flight
+
+
+@pytest.mark.asyncio
+async def test_discarded_key_is_no_longer_led():
+    flight = SingleFlight()
+    seen = []
+
+    async def fetch():
+        await asyncio.sleep(0)
+        flight.discard("k")
+        seen.append(flight.leads("k"))
+        return 1
+
+    await flight.run("k", fetch)
+    assert seen == [False]
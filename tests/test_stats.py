@@ -0,0 +1,82 @@
+import numpy as np
+
+from app.spotify.library import LibraryIndex, LibraryTrack
+from app.stats import LibraryColumns, StatsEngine, compute_stats
+from app.stats.engine import parse_added_at
+
+
+def make_track(i, artists=(("a1", "Alpha"),), added_at=None, duration_ms=1000):
+    return LibraryTrack(
+        id=f"t{i}",
+        title=f"Song {i}",
+        artist=", ".join(name for _, name in artists),
+        added_at=added_at or f"2024-01-{i % 28 + 1:02d}T10:00:00Z",
+        artist_ids=tuple(aid for aid, _ in artists),
+        duration_ms=duration_ms,
+        artist_names=tuple(name for _, name in artists),
+    )
+
+
+def test_parse_added_at():
+    assert parse_added_at(["1970-01-02T00:00:00Z"]).tolist() == [86400]
+
+
+def test_top_artists_and_periods():
+    lib = LibraryIndex()
+    lib.add([
+        make_track(1, added_at="2024-01-01T10:00:00Z"),
+        make_track(2, artists=(("a1", "Alpha"), ("b2", "Beta")), added_at="2024-01-01T12:00:00Z"),
+        make_track(3, artists=(("b2", "Beta"),), added_at="2024-01-08T10:00:00Z"),
+        make_track(4, artists=(("c3", "Gamma"),), added_at="2024-02-03T10:00:00Z", duration_ms=500),
+        make_track(5, artists=(("b2", "Beta"),), added_at="2024-02-04T10:00:00Z"),
+    ])
+    columns = LibraryColumns()
+    columns.update(lib)
+    stats = compute_stats(columns, top=2)
+
+    assert stats.total == 5
+    assert stats.duration_ms == 4500
+    assert stats.top_artists == [("Beta", 3), ("Alpha", 2)]
+    assert sum(stats.per_day.values()) == 5
+    assert stats.per_day[int(np.datetime64("2024-01-01", "s").astype(np.int64))] == 2
+    # 2024-01-01 is a Monday: the first two tracks share a week, the third starts the next one.
+    assert list(stats.per_week.values())[:2] == [2, 1]
+    assert list(stats.per_month.values()) == [3, 2]
+    assert [total for _, total in stats.growth("month")] == [3, 5]
+
+
+def test_engine_appends_incrementally_and_rebuilds_on_removal():
+    lib = LibraryIndex()
+    lib.add(make_track(i) for i in range(100))
+    engine = StatsEngine()
+    first = engine.stats("1", lib)
+    assert first.total == 100
+    assert engine.stats("1", lib) is first
+
+    columns = engine._columns["1"]
+    appended = []
+    columns.append = lambda tracks, real=columns.append: appended.append(len(tracks)) or real(tracks)
+    lib.add([make_track(100, artists=(("z", "Zeta"),))])
+    second = engine.stats("1", lib)
+    assert second.total == 101
+    assert appended == [1]  # only the new track was converted
+    assert ("Zeta", 1) in second.top_artists
+
+    lib.remove(["t0", "t1"])
+    third = engine.stats("1", lib)
+    assert third.total == 99
+    assert engine._columns["1"].size == 99
+
+
+def test_engine_forgets_users_beyond_budget_and_with_their_library():
+    engine = StatsEngine(max_users=2)
+    libs = {}
+    for tg in ("1", "2", "3"):
+        libs[tg] = LibraryIndex()
+        libs[tg].add([make_track(1)])
+        engine.stats(tg, libs[tg])
+    assert list(engine._columns) == ["2", "3"]
+
+    del libs["3"]
+    assert list(engine._columns) == ["2"]
+    assert engine.stats("2", libs["2"]).total == 1
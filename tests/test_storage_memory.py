@@ -5,7 +5,6 @@ def test_storage_dicts_exist():
     assert isinstance(m.USER_SPOTIFY, dict)
     assert isinstance(m.LAST_SHOWN, dict)
     assert isinstance(m.STATS, dict)
-    assert isinstance(m.ARTIST_COUNTER, dict)
 
 def test_storage_write_read(tmp_path):
     m = importlib.import_module("app.storage.memory")
@@ -14,3 +13,24 @@ def test_storage_write_read(tmp_path):
     assert m.USER_SPOTIFY["42"]["access_token"] == "a"
     m.STATS[tg] = {"added": 1, "deleted": 0}
     assert m.STATS["42"]["added"] == 1
+
+def test_session_store_expires_and_evicts_by_size():
+    from app.storage.session import SessionStore, ShownTrack, resident_size
+
+    now = [0.0]
+    record = [ShownTrack(f"t{i}", "Title", "Artist") for i in range(15)]
+    size = resident_size(record)
+    store = SessionStore("shown", ttl=60, max_bytes=int(size * 2.5), clock=lambda: now[0])
+
+    store["1"] = record
+    store["2"] = list(record)
+    assert store.get("1") is record
+    store["3"] = list(record)
+    assert "2" not in store and "1" in store
+    assert store.stats()["evictions"] == 1
+    assert store.bytes == 2 * size
+
+    now[0] = 61
+    assert store.get("1") is None
+    assert store.pop("3", None) is None
+    assert store.stats() == {"entries": 0, "bytes": 0, "expired": 2, "evictions": 1}
@@ -0,0 +1,151 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from app.storage import create_backend
+from app.storage.base import Table
+from app.storage.memory import MemoryBackend
+from app.storage.sqlite import SqliteBackend
+
+
+def make_tables():
+    return {
+        "users": Table("users"),
+        "stats": Table("stats"),
+        "shown": Table("shown", persistent=False),
+    }
+
+
+@pytest.mark.asyncio
+async def test_sqlite_roundtrip_survives_restart(tmp_path):
+    path = str(tmp_path / "state" / "bot.sqlite3")
+    tables = make_tables()
+    backend = SqliteBackend(path, flush_interval=0.01)
+    await backend.open(tables)
+
+    tables["users"]["1"] = {"access_token": "a", "refresh_token": "r"}
+    tables["users"]["2"] = {"access_token": "b"}
+    stats = tables["stats"].setdefault("1", {"added": 0, "first_add": None})
+    stats["added"] += 1
+    stats["first_add"] = datetime(2024, 5, 1, 12, 0, 0)
+    tables["stats"].touch("1")
+    del tables["users"]["2"]
+    tables["shown"]["1"] = [{"id": "x"}]
+    await backend.close()
+
+    fresh = make_tables()
+    backend = SqliteBackend(path)
+    await backend.open(fresh)
+    assert fresh["users"] == {"1": {"access_token": "a", "refresh_token": "r"}}
+    assert fresh["stats"]["1"]["added"] == 1
+    assert fresh["stats"]["1"]["first_add"] == datetime(2024, 5, 1, 12, 0, 0)
+    assert fresh["shown"] == {}
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_writes_are_batched(tmp_path):
+    tables = make_tables()
+    backend = SqliteBackend(str(tmp_path / "bot.sqlite3"), flush_interval=60)
+    await backend.open(tables)
+
+    for i in range(100):
+        tables["users"][str(i)] = {"n": i}
+    tables["users"]["0"] = {"n": -1}
+    assert backend.pending == 100
+    assert backend.batches == 0
+
+    await backend.flush()
+    assert backend.pending == 0
+    assert backend.batches == 1
+    mode = backend._conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode.lower() == "wal"
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_keeps_plain_dict_behaviour():
+    tables = make_tables()
+    await MemoryBackend().open(tables)
+    tables["users"]["1"] = {"a": 1}
+    assert tables["users"].pop("1") == {"a": 1}
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    with pytest.raises(RuntimeError):
+        create_backend("nope")
+
+
+@pytest.mark.asyncio
+async def test_paged_table_loads_on_demand_and_evicts_clean_rows(tmp_path):
+    path = str(tmp_path / "bot.sqlite3")
+    backend = SqliteBackend(path, flush_interval=60)
+    await backend.open({"stats": Table("stats")})
+    for i in range(10):
+        backend._tables["stats"][str(i)] = {"added": i}
+    await backend.close()
+
+    stats = Table("stats", max_resident=3)
+    backend = SqliteBackend(path, flush_interval=60)
+    await backend.open({"stats": stats})
+    assert len(stats) == 0
+
+    for key in ("1", "2", "3"):
+        await stats.ensure(key)
+    stats["3"]["added"] += 100
+    stats.touch("3")
+    await stats.ensure("4")
+    await stats.ensure("5")
+    await stats.ensure("missing")
+
+    # "3" is dirty and stays; the oldest clean rows made room.
+    assert set(stats) == {"3", "4", "5"}
+    assert stats.evictions == 2
+
+    stale = stats["4"]
+    await backend.flush()
+    await stats.ensure("6")
+    await stats.ensure("7")
+    assert "4" not in stats
+    stale["added"] = -1
+    stats.touch("4")  # a late write through a paged-out row must not delete it
+    assert backend.pending == 0
+
+    await stats.ensure("3")
+    assert stats["3"] == {"added": 103}
+    await backend.close()
+
+
+def test_startup_reads_only_eager_tables(tmp_path):
+    backend = SqliteBackend(str(tmp_path / "bot.sqlite3"))
+    backend._conn = sqlite3.connect(":memory:")
+    backend._conn.execute("CREATE TABLE kv (tbl TEXT, key TEXT, value TEXT)")
+    backend._conn.executemany("INSERT INTO kv VALUES (?, ?, ?)", [("a", "1", "x"), ("b", "1", "y"), ("c", "1", "z")])
+    assert sorted(backend._read_all(["a", "c"])) == [("a", "1", "x"), ("c", "1", "z")]
+    assert backend._read_all([]) == []
+
+
+@pytest.mark.asyncio
+async def test_row_is_not_evicted_while_its_failed_write_is_running(tmp_path):
+    stats = Table("stats", max_resident=1)
+    backend = SqliteBackend(str(tmp_path / "bot.sqlite3"), flush_interval=60)
+    await backend.open({"stats": stats})
+    write_batch = backend._write_batch
+
+    async def failing(upserts, deletes):
+        # Another row comes in while the write is in flight.
+        await stats.ensure("2")
+        stats["2"] = {"added": 2}
+        raise OSError("disk full")
+
+    await stats.ensure("1")
+    stats["1"] = {"added": 1}
+    backend._write_batch = failing
+    with pytest.raises(OSError):
+        await backend.flush()
+    assert stats["1"] == {"added": 1}
+
+    backend._write_batch = write_batch
+    await backend.flush()
+    assert backend.pending == 0
+    assert backend._read_one("stats", "1") is not None
+    await backend.close()
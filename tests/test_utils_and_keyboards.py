@@ -13,3 +13,28 @@ def test_main_kb_structure():
     kb = main_kb()
     assert hasattr(kb, "keyboard")
     assert len(kb.keyboard) >= 1
+
+def test_split_message_respects_limit():
+    from app.utils.text import split_message
+
+    lines = [f"{i}. " + "x" * 50 for i in range(300)]
+    chunks = split_message(lines, header="H\n", limit=4096)
+    assert len(chunks) > 1
+    assert all(len(c) <= 4096 for c in chunks)
+    assert chunks[0].startswith("H\n")
+    assert "".join(chunks).count("\n") == 301
+    assert split_message(["y" * 10], limit=4) == ["yyyy", "yyyy", "yy\n"]
+
+def test_tracks_page_kb_clamps_targets():
+    from app.bot.keyboards import TracksPage, tracks_page_kb
+
+    kb = tracks_page_kb(0, 30)
+    targets = [TracksPage.unpack(b.callback_data).page for row in kb.inline_keyboard for b in row]
+    assert targets == [0, 0, 0, 1, 29, 0, 10]
+
+def test_clip_html_never_splits_an_entity():
+    from app.utils.text import clip_html
+
+    assert clip_html("a & b", 20) == "a &amp; b"
+    assert clip_html("&&&&", 12) == "&amp;&amp;…"
+    assert len(clip_html("<" * 100, 50)) <= 50
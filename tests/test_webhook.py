@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from app.bot.webhook import SECRET_HEADER, WebhookReceiver, update_user_id
+
+
+class FakeDispatcher:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.seen = []
+
+    async def feed_raw_update(self, bot, update):
+        await asyncio.sleep(self.delay)
+        self.seen.append(update["update_id"])
+
+
+def make_update(update_id, user_id):
+    return {"update_id": update_id, "message": {"from": {"id": user_id}, "chat": {"id": user_id}, "text": "hi"}}
+
+
+def test_update_user_id():
+    assert update_user_id(make_update(1, 42)) == 42
+    assert update_user_id({"update_id": 1, "callback_query": {"from": {"id": 7}}}) == 7
+    assert update_user_id({"update_id": 1}) is None
+
+
+@pytest.mark.asyncio
+async def test_webhook_acks_fast_and_checks_secret():
+    dp = FakeDispatcher(delay=0.2)
+    receiver = WebhookReceiver(dp, bot=None, secret_token="s3cret")
+    app = web.Application()
+    receiver.register(app, "/tg")
+    receiver.start()
+
+    async with TestClient(TestServer(app)) as client:
+        bad = await client.post("/tg", json=make_update(1, 1), headers={SECRET_HEADER: "wrong"})
+        assert bad.status == 401
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        ok = await client.post("/tg", json=make_update(2, 1), headers={SECRET_HEADER: "s3cret"})
+        assert ok.status == 200
+        assert loop.time() - started < 0.2
+
+        await receiver.drain()
+
+    await receiver.stop()
+    assert dp.seen == [2]
+    assert receiver.rejected == 1
+
+
+@pytest.mark.asyncio
+async def test_updates_of_one_user_stay_ordered():
+    dp = FakeDispatcher(delay=0.001)
+    receiver = WebhookReceiver(dp, bot=None, secret_token="s")
+    for i in range(20):
+        assert receiver.submit(make_update(i, 99))
+    receiver.start()
+    await receiver.drain()
+    await receiver.stop()
+    assert dp.seen == list(range(20))
+
+
+@pytest.mark.asyncio
+async def test_a_slow_handler_holds_up_only_its_own_user():
+    release = asyncio.Event()
+
+    class BlockingDispatcher(FakeDispatcher):
+        async def feed_raw_update(self, bot, update):
+            if update["message"]["from"]["id"] == 1:
+                await release.wait()
+            self.seen.append(update["update_id"])
+
+    dp = BlockingDispatcher()
+    receiver = WebhookReceiver(dp, bot=None, secret_token="s", concurrency=2)
+    receiver.start()
+    receiver.submit(make_update(1, 1))
+    receiver.submit(make_update(2, 1))
+    # User 9 would have shared user 1's lane under the old 8-way sharding.
+    for i in range(3, 6):
+        receiver.submit(make_update(i, 9))
+    await asyncio.sleep(0.05)
+    assert dp.seen == [3, 4, 5]
+    assert receiver.depth == 1
+
+    release.set()
+    await receiver.drain()
+    await receiver.stop()
+    assert dp.seen == [3, 4, 5, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_full_receiver_pushes_back():
+    receiver = WebhookReceiver(FakeDispatcher(), bot=None, secret_token="s", max_queue=2)
+    assert receiver.submit(make_update(1, 1))
+    assert receiver.submit(make_update(2, 2))
+    assert not receiver.submit(make_update(3, 3))
+    waiting = asyncio.ensure_future(receiver.wait_for_room())
+    await asyncio.sleep(0)
+    assert not waiting.done()
+    receiver.start()
+    await asyncio.wait_for(waiting, 1)
+    await receiver.drain()
+    await receiver.stop()
+    assert receiver.submit(make_update(4, 4))